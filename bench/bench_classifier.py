@@ -0,0 +1,51 @@
+# pylint: disable=missing-module-docstring
+
+import os
+import sys
+import tempfile
+import timeit
+
+from bench.synthetic import write_libretto
+from src.libretto import LibrettoLoader
+from test.helpers import flatten
+
+BIN = None
+
+def load(filename, use_classifier):
+    # pylint: disable=missing-function-docstring
+    loader = LibrettoLoader(use_classifier=use_classifier)
+    return loader.load(filename)
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    tracks = int(argv[0]) if len(argv) > 0 else 2000
+    repeat = int(argv[1]) if len(argv) > 1 else 5
+
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    os.close(handle)
+
+    try:
+        write_libretto(filename, tracks)
+        size = os.path.getsize(filename)
+
+        if flatten(load(filename, False)) != flatten(load(filename, True)):
+            print("classifier output differs from search cascade")
+            return 1
+
+        searched = min(timeit.repeat(lambda: load(filename, False),
+            number=1, repeat=repeat))
+        classified = min(timeit.repeat(lambda: load(filename, True),
+            number=1, repeat=repeat))
+    finally:
+        os.remove(filename)
+
+    print(f"{tracks} tracks, {size} bytes")
+    print(f"search cascade: {searched:.4f}s")
+    print(f"classifier:     {classified:.4f}s")
+    print(f"speedup:        {searched / classified:.2f}x")
+
+    return 0
+
+if __name__ == '__main__':
+    BIN = os.path.basename(sys.argv[0])
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,45 @@
+# pylint: disable=missing-module-docstring
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from bench.synthetic import write_libretto
+from src.libretto import LibrettoLoader
+
+BIN = None
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    tracks = int(argv[0]) if len(argv) > 0 else 2000
+
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    os.close(handle)
+
+    try:
+        write_libretto(filename, tracks)
+        size = os.path.getsize(filename)
+
+        tracemalloc.start()
+        libretto = LibrettoLoader().load(filename)
+        gc.collect()
+        loaded, _ = tracemalloc.get_traced_memory()
+
+        libretto.compact()
+        gc.collect()
+        compacted, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.remove(filename)
+
+    print(f"{tracks} tracks, {size} bytes")
+    print(f"line objects: {loaded / 1024 / 1024:.2f} MiB")
+    print(f"compacted:    {compacted / 1024 / 1024:.2f} MiB")
+
+    return 0
+
+if __name__ == '__main__':
+    BIN = os.path.basename(sys.argv[0])
+    sys.exit(main(sys.argv[1:]))
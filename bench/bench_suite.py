@@ -0,0 +1,249 @@
+# pylint: disable=missing-module-docstring
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from bench.synthetic import write_libretto_size
+from src.libretto import LibrettoLoader
+from src.lib2html import Libretto2Html
+from src.output_sink import OutputSink
+
+BIN = None
+
+FORMAT_VERSION = 1
+
+SIZES = ["1K", "10K", "100K", "1M", "10M", "100M"]
+DEFAULT_SIZES = SIZES[:-1]
+
+UNITS = {"K": 1024, "M": 1024 * 1024}
+
+TIMES = ("parse_seconds", "render_seconds")
+MEMORY = ("parse_peak_bytes", "retained_bytes", "retained_blocks",
+    "render_peak_bytes")
+
+def parse_size(text):
+    # pylint: disable=missing-function-docstring
+    text = text.strip().upper()
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+
+    return int(text)
+
+def load(filename):
+    # pylint: disable=missing-function-docstring
+    return LibrettoLoader().load(filename)
+
+def render(filename, libretto):
+    # pylint: disable=missing-function-docstring
+    with open(os.devnull, "w") as opened_file:
+        Libretto2Html(filename, OutputSink(opened_file)).print(libretto)
+
+def measure_memory(function):
+    # pylint: disable=missing-function-docstring
+    # traced separately from the timings, since tracing slows everything
+    # down. blocks are counted outside of tracing, so they only include
+    # what the result holds on to.
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+
+    return result, peak, retained, blocks
+
+def best_time(function, repeat):
+    # pylint: disable=missing-function-docstring
+    # small libretti are run enough times to be timed reliably, and the
+    # result is per run
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def measure(filename, repeat):
+    # pylint: disable=missing-function-docstring
+    libretto, parse_peak, retained, blocks = measure_memory(
+        lambda: load(filename))
+    _, render_peak, _, _ = measure_memory(lambda: render(filename, libretto))
+
+    parse_seconds = best_time(lambda: load(filename), repeat)
+    render_seconds = best_time(lambda: render(filename, libretto), repeat)
+
+    return {
+        "parse_seconds": parse_seconds,
+        "render_seconds": render_seconds,
+        "parse_peak_bytes": parse_peak,
+        "retained_bytes": retained,
+        "retained_blocks": blocks,
+        "render_peak_bytes": render_peak,
+    }
+
+def run_size(size, repeat, seed):
+    # pylint: disable=missing-function-docstring
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    os.close(handle)
+
+    try:
+        tracks = write_libretto_size(filename, parse_size(size), seed)
+        result = {
+            "size": size,
+            "bytes": os.path.getsize(filename),
+            "tracks": tracks,
+        }
+        result.update(measure(filename, repeat))
+    finally:
+        os.remove(filename)
+
+    return result
+
+def current_commit():
+    # pylint: disable=missing-function-docstring
+    try:
+        completed = subprocess.run(["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return completed.stdout.strip()
+
+def run_suite(sizes, repeat, seed):
+    # pylint: disable=missing-function-docstring
+    results = []
+    for size in sizes:
+        result = run_size(size, repeat, seed)
+        print_result(result)
+        results.append(result)
+
+    return {
+        "version": FORMAT_VERSION,
+        "commit": current_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+def print_result(result):
+    # pylint: disable=missing-function-docstring
+    mib = 1024 * 1024
+    print(f"{result['size']:>5} {result['bytes']:>11} bytes "
+        f"{result['tracks']:>7} tracks  "
+        f"parse {result['parse_seconds']:8.4f}s "
+        f"{result['parse_peak_bytes'] / mib:8.2f} MiB peak  "
+        f"render {result['render_seconds']:8.4f}s "
+        f"{result['render_peak_bytes'] / mib:8.2f} MiB peak  "
+        f"retained {result['retained_bytes'] / mib:8.2f} MiB "
+        f"{result['retained_blocks']:>9} blocks")
+
+def compare(baseline, current, time_threshold, memory_threshold):
+    # pylint: disable=missing-function-docstring
+    # sizes are matched by name, and any that only one run has are skipped.
+    # memory is repeatable, so it gets a tighter threshold than time.
+    regressions = 0
+    previous = {result["size"]: result for result in baseline["results"]}
+
+    print(f"compared with {baseline.get('commit') or 'baseline'}")
+    for result in current["results"]:
+        old = previous.get(result["size"])
+        if old is None:
+            continue
+
+        ratios = []
+        for key in TIMES + MEMORY:
+            if not old[key]:
+                continue
+
+            ratio = result[key] / old[key]
+            threshold = time_threshold if key in TIMES else memory_threshold
+            flag = ""
+            if ratio > threshold:
+                flag = " !"
+                regressions += 1
+            ratios.append(f"{key} {ratio:.2f}x{flag}")
+
+        print(f"{result['size']:>5} " + ", ".join(ratios))
+
+    return regressions
+
+def parse_args(argv):
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(prog=BIN,
+        description="Time and measure parsing and rendering synthetic "
+            "libretti of increasing size.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+        help="comma separated libretto sizes, in bytes or with a K or M "
+            f"suffix (default: {','.join(DEFAULT_SIZES)}; the full suite is "
+            f"{','.join(SIZES)})")
+    parser.add_argument("--repeat", type=int, default=3,
+        help="timing runs per size, of which the fastest is kept "
+            "(default: 3)")
+    parser.add_argument("--seed", type=int, default=0,
+        help="seed for the synthetic libretti (default: 0)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+        help="write the results to this file as json")
+    parser.add_argument("--compare", metavar="FILE",
+        help="compare the results with an earlier json results file")
+    parser.add_argument("--time-threshold", type=float, default=1.25,
+        help="with --compare, the ratio to the earlier time above which it "
+            "counts as a regression (default: 1.25)")
+    parser.add_argument("--memory-threshold", type=float, default=1.05,
+        help="with --compare, the ratio to the earlier memory use above "
+            "which it counts as a regression (default: 1.05)")
+
+    args = parser.parse_args(argv)
+
+    args.sizes = [size.strip() for size in args.sizes.split(",")
+        if size.strip()]
+    for size in args.sizes:
+        try:
+            parse_size(size)
+        except ValueError:
+            parser.error(f"invalid size in --sizes: {size}")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    return args
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    args = parse_args(argv)
+
+    # read first, so a bad baseline fails before the suite is run
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as opened_file:
+            baseline = json.load(opened_file)
+
+    results = run_suite(args.sizes, args.repeat, args.seed)
+
+    if args.output is not None:
+        with open(args.output, "w") as opened_file:
+            json.dump(results, opened_file, indent=2)
+            opened_file.write("\n")
+
+    if baseline is not None:
+        return 1 if compare(baseline, results, args.time_threshold,
+            args.memory_threshold) > 0 else 0
+
+    return 0
+
+if __name__ == '__main__':
+    BIN = os.path.basename(sys.argv[0])
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+# pylint: disable=missing-module-docstring
+
+import random
+
+CHARACTERS = ["Steve", "Laurene", "Chrisann", "Woz", "Kobun"]
+
+WORDS = ["all", "we", "are", "is", "the", "one", "thing", "that", "matters",
+    "light", "circuit", "garden", "apple", "never", "again", "simple", "time",
+    "road", "calligraphy", "minds", "forever", "stay", "hungry", "foolish"]
+
+def words(rand, count):
+    # pylint: disable=missing-function-docstring
+    return " ".join(rand.choice(WORDS) for _ in range(count))
+
+def generate_track(rand, track_number):
+    # pylint: disable=missing-function-docstring
+    minutes = rand.randint(2, 9)
+    fraction = ".5" if rand.random() < 0.1 else ""
+    lines = [f"[{track_number},{minutes}:{rand.randint(0, 59):02}{fraction}]"]
+
+    if track_number % 4 == 1:
+        lines.append(f"SCENE {track_number}: {words(rand, 3)}")
+        lines.append(words(rand, 4).capitalize())
+        lines.append("")
+        lines.append(words(rand, 12).capitalize() + ".")
+        lines.append("")
+
+    subtracks = rand.randint(0, 2)
+    for subtrack in range(subtracks + 1):
+        offset = subtrack * minutes * 60 // (subtracks + 1)
+        if subtrack > 0:
+            lines.append(f"[{offset // 60:02}:{offset % 60:02}]")
+
+        for verse in range(rand.randint(1, 3)):
+            character = rand.choice(CHARACTERS)
+            if verse % 3 == 2:
+                lines.append(f"{character}: [with above]")
+            elif rand.random() < 0.25:
+                lines.append(f"{character}: [{words(rand, 2)}]")
+            else:
+                lines.append(f"{character}:")
+
+            # some verses are pinned to a time within their subtrack
+            cue = ""
+            if rand.random() < 0.1:
+                seconds = offset + verse * 10
+                cue = f"{{{seconds // 60}:{seconds % 60:02}}} "
+
+            for _ in range(rand.randint(1, 5)):
+                lines.append(cue + words(rand, rand.randint(2, 6)))
+                cue = ""
+                if rand.random() < 0.1:
+                    lines.append(f"[{words(rand, 2)}]")
+
+            lines.append("")
+
+    return lines
+
+def generate_libretto(tracks, seed=0):
+    # pylint: disable=missing-function-docstring
+    rand = random.Random(seed)
+
+    lines = []
+    for track_number in range(1, tracks + 1):
+        lines.extend(generate_track(rand, track_number))
+
+    return "\n".join(lines) + "\n"
+
+def write_libretto_size(filename, size, seed=0):
+    # pylint: disable=missing-function-docstring
+    # tracks are written one at a time until the file is at least the
+    # requested size, so even the largest sizes never sit in memory
+    rand = random.Random(seed)
+
+    written = 0
+    track_number = 0
+    with open(filename, "w") as opened_file:
+        while written < size:
+            track_number += 1
+            text = "\n".join(generate_track(rand, track_number)) + "\n"
+            opened_file.write(text)
+            written += len(text.encode("utf-8"))
+
+    return track_number
+
+def write_libretto(filename, tracks, seed=0):
+    # pylint: disable=missing-function-docstring
+    with open(filename, "w") as opened_file:
+        opened_file.write(generate_libretto(tracks, seed))
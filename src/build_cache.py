@@ -0,0 +1,100 @@
+# pylint: disable=missing-module-docstring
+
+import hashlib
+import json
+import os
+
+class BuildCache:
+    # pylint: disable=missing-class-docstring
+    SUFFIX = ".cache"
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, generator_files, force=False):
+        self.force = force
+        self.fingerprint = self.hash_files(generator_files)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def hash_files(cls, files):
+        # pylint: disable=missing-function-docstring
+        digest = hashlib.sha256()
+        for file in files:
+            cls._update_digest(digest, file)
+
+        return digest.hexdigest()
+
+    @classmethod
+    def hash_file(cls, file):
+        # pylint: disable=missing-function-docstring
+        digest = hashlib.sha256()
+        cls._update_digest(digest, file)
+
+        return digest.hexdigest()
+
+    @classmethod
+    def _update_digest(cls, digest, file):
+        with open(file, "rb") as opened_file:
+            for block in iter(lambda: opened_file.read(cls.BLOCK_SIZE), b""):
+                digest.update(block)
+
+    def record_path(self, output):
+        # pylint: disable=missing-function-docstring
+        return output + self.SUFFIX
+
+    def make_record(self, source, source_hash, options=None):
+        # pylint: disable=missing-function-docstring
+        # the source name is part of the output (it keys saved positions),
+        # so a renamed source is rebuilt even if its content is unchanged
+        return {
+            "source": source,
+            "source_hash": source_hash,
+            "generator": self.fingerprint,
+            "options": options,
+        }
+
+    def is_current(self, source, output, source_hash, options=None):
+        # pylint: disable=missing-function-docstring
+        if self.force or not os.path.exists(output):
+            return False
+
+        try:
+            with open(self.record_path(output)) as opened_file:
+                record = json.load(opened_file)
+            files = record.pop("files", [])
+        except (OSError, ValueError, AttributeError):
+            return False
+
+        if record != self.make_record(source, source_hash, options):
+            return False
+
+        # chunks, compressed copies and the like can go missing on their own
+        directory = os.path.dirname(output)
+        return all(os.path.exists(os.path.join(directory, file))
+            for file in files)
+
+    def store(self, source, output, source_hash, options=None, files=None):
+        # pylint: disable=missing-function-docstring
+        # other files the build wrote are recorded next to the output, so
+        # they're checked along with it
+        directory = os.path.dirname(output)
+        record = self.make_record(source, source_hash, options)
+        record["files"] = sorted(os.path.relpath(file, directory or os.curdir)
+            for file in files or [])
+
+        with open(self.record_path(output), "w") as opened_file:
+            json.dump(record, opened_file)
+
+    def invalidate(self, output):
+        # pylint: disable=missing-function-docstring
+        try:
+            os.remove(self.record_path(output))
+        except FileNotFoundError:
+            pass
+
+    def count(self, cached):
+        # pylint: disable=missing-function-docstring
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
@@ -1,13 +1,44 @@
 # pylint: disable=missing-module-docstring, too-many-lines
 
-import datetime
+import argparse
+import base64
+import concurrent.futures
+import contextlib
+import cProfile
+import glob
+import gzip
+import hashlib
+import html
+import json
+import inspect
 import sys
 import os
+import pstats
 import re
+import time
 
+from src.build_cache import BuildCache
+from src.minify import Minifier
+from src.minify import MinifyingSink
+from src.libretto import IncrementalLibrettoLoader
 from src.libretto import LibrettoLoader
 from src.libretto import LineType
 from src.libretto import Track
+from src.libretto import load_tracks
+from src.libretto import make_loader
+from src.libretto import open_source
+from src.output_sink import OutputSink
+from src.stats import ConversionHooks
+from src.stats import ConversionStats
+from src.stats import StatsReporter
+from src.stats import TimingSink
+from src.stats import timed
+from src.watch import SourceWatcher
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 BIN=None
 
@@ -18,28 +49,33 @@ class SideBySideMode:
     END = 2
     MIDDLE = 3
 
-class Duration:
+class OutputOptions:
     # pylint: disable=missing-class-docstring, too-few-public-methods
-    def __init__(self):
-        self.hour = 0
-        self.min = 0
-        self.sec = 0
-
-    @classmethod
-    def from_time_delta(cls, delta):
+    def __init__(self, virtual=False, external_assets=False, minify=False,
+        compress=False, audio=None, audio_offset=0, chunked=False,
+        live_reload=None, sync=None, asset_path=""):
+        # pylint: disable=too-many-arguments
+        self.virtual = virtual
+        self.external_assets = external_assets
+        self.minify = minify
+        self.compress = compress
+        self.audio = audio
+        self.audio_offset = audio_offset
+        self.chunked = chunked
+        self.live_reload = live_reload
+        self.sync = sync
+        self.asset_path = asset_path
+
+    def to_data(self):
         # pylint: disable=missing-function-docstring
-        dur = Duration()
-
-        dur.sec = int(delta) % 60
-        minute = int(delta / 60)
-        dur.min = minute % 60
-        dur.hour = int(minute / 60)
-
-        return dur
+        # recorded by the build cache, since the options change the output
+        return dict(vars(self))
 
 class Libretto2Html:
     # pylint: disable=missing-class-docstring
-    def __init__(self, source_file_name):
+    def __init__(self, source_file_name, sink=None, options=None,
+        chunks=None, stats=None):
+        # pylint: disable=too-many-arguments
         self.line_printer_table = {
             LineType.SCENE: self.print_scene,
             LineType.SDETAILS: self.print_sdetails,
@@ -54,25 +90,51 @@ class Libretto2Html:
         self.sbs_mode = SideBySideMode.NONE
         self.lines_since_blank = 9999
         self.source_file_name = source_file_name
+        self.track_start = 0
+        self.current_div = 0
+        self.div_count = 0
+        self.cues = []
+        self.options = options if options is not None else OutputOptions()
+        self.assets = (PageAssets(self.options.minify)
+            if self.options.external_assets else None)
+        self.stats = stats
+        self.sink = self.wrap_sink(
+            sink if sink is not None else OutputSink(sys.stdout))
+
+        # with chunks, track markup goes to the current chunk's sink, and
+        # the page only gets placeholders
+        self.page_sink = self.sink
+        self.chunks = chunks
+        self.chunk_starts = []
+
+    def wrap_sink(self, sink):
+        # pylint: disable=missing-function-docstring
+        if self.stats is not None:
+            sink = TimingSink(sink, self.stats)
+
+        if self.options.minify:
+            return MinifyingSink(sink)
+
+        return sink
 
     def print_scene(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<h1>{line.text}</h1>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<h1>{line.text}</h1>")
 
     def print_sdetails(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<h2>{line.text}</h2>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<h2>{line.text}</h2>")
 
     def print_blank(self, _line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print("<p class='blank'></p>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline("<p class='blank'></p>")
 
     def print_staging(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<p class='staging'>{line.text}</p>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<p class='staging'>{line.text}</p>")
 
     def print_character(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
+        # pylint: disable=missing-function-docstring
         subtext = line.subtext
         if subtext is not None:
             subtext = re.sub(r"^with above(, )?", "", subtext)
@@ -80,23 +142,23 @@ class Libretto2Html:
                 subtext = None
 
         if subtext is not None:
-            print(f"""<p><span class='character'>{line.text}:</span>
+            self.sink.writeline(f"""<p><span class='character'>{line.text}:</span>
                          <span class='emote'>[{subtext}]</span>
                       </p>""")
         else:
-            print(f"<p class='character'>{line.text}:</p>")
+            self.sink.writeline(f"<p class='character'>{line.text}:</p>")
 
     def print_lyric(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<p class='lyric'>{line.text}</p>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<p class='lyric'>{line.text}</p>")
 
     def print_emote(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<p class='emote'>[{line.text}]</p>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<p class='emote'>[{line.text}]</p>")
 
     def print_generic(self, line):
-        # pylint: disable=missing-function-docstring, no-self-use
-        print(f"<p>{line.text}</p>")
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline(f"<p>{line.text}</p>")
 
     def get_side_by_side_mode(self, line):
         # pylint: disable=missing-function-docstring, no-self-use
@@ -125,24 +187,24 @@ class Libretto2Html:
     def print_lines(self, lines):
         # pylint: disable=missing-function-docstring
         if self.sbs_mode == SideBySideMode.START:
-            print("""
+            self.sink.writeline("""
                 <div class="side-by-side">
                 <div>
             """)
         elif self.sbs_mode == SideBySideMode.MIDDLE:
-            print("<div>")
+            self.sink.writeline("<div>")
         elif self.sbs_mode == SideBySideMode.END:
-            print("<div>")
+            self.sink.writeline("<div>")
 
         for line in lines:
             self.print_line(line)
 
         if self.sbs_mode == SideBySideMode.START:
-            print("</div>")
+            self.sink.writeline("</div>")
         elif self.sbs_mode == SideBySideMode.MIDDLE:
-            print("</div>")
+            self.sink.writeline("</div>")
         elif self.sbs_mode == SideBySideMode.END:
-            print("""
+            self.sink.writeline("""
                 </div>
                 </div>
             """)
@@ -156,6 +218,14 @@ class Libretto2Html:
 
     def print_line(self, line):
         # pylint: disable=missing-function-docstring
+        # an empty marker takes no space, but the player can measure where
+        # the cued line starts from it
+        if line.cue is not None:
+            self.sink.writeline(f"<span class='cue' data-cue='{len(self.cues)}'>" +
+                "</span>")
+            self.cues.append((self.current_div,
+                self.track_start + line.cue))
+
         printer = self.line_printer_table.get(line.type, self.print_generic)
         printer(line)
 
@@ -165,72 +235,215 @@ class Libretto2Html:
 
     def generate_track_details(self, info, track):
         # pylint: disable=missing-function-docstring, no-self-use
-        time = track.length
-        track_id = track.track_number
-        dur = Duration.from_time_delta(time.seconds)
-        info.append(f"""new TrackInfo("{track_id}", """ +
-            f"new Duration({dur.hour}, {dur.min}, {dur.sec})),")
+        info.append((str(track.track_number), track.length.total_seconds()))
 
     def generate_div_details(self, info, track):
         # pylint: disable=missing-function-docstring, no-self-use
         time = track.length
-        total_seconds = time.seconds
+        total_seconds = time.total_seconds()
 
         # reinterpret durations as start times
         track_and_subtracks = [ Track(track.track_number) ]
         for subtrack in track.subtracks:
             track_and_subtracks.append(Track(subtrack.track_number,
-                seconds=subtrack.length.seconds))
+                seconds=subtrack.length.total_seconds()))
 
         # determine durations of track entry points
         for i in range(len(track_and_subtracks) - 1):
             current_track = track_and_subtracks[i]
-            current_start = current_track.length.seconds
+            current_start = current_track.length.total_seconds()
             track_id = current_track.track_number
             next_track = track_and_subtracks[i + 1]
-            next_start = next_track.length.seconds
+            next_start = next_track.length.total_seconds()
             seconds_delta = next_start - current_start
             total_seconds -= seconds_delta
-            dur = Duration.from_time_delta(seconds_delta)
 
-            info.append(f"""new TrackInfo("{track_id}", """ +
-                f"new Duration({dur.hour}, {dur.min}, {dur.sec})),")
+            info.append((str(track_id), seconds_delta))
 
         # this is the last track, so use whatever time is left for this track
         current_track = track_and_subtracks[len(track_and_subtracks) - 1]
         track_id = current_track.track_number
-        dur = Duration.from_time_delta(total_seconds)
-        info.append(f"""new TrackInfo("{track_id}", """ +
-            f"new Duration({dur.hour}, {dur.min}, {dur.sec})),")
+        info.append((str(track_id), total_seconds))
+
+    @classmethod
+    def timing_table(cls, info):
+        # pylint: disable=missing-function-docstring
+        # start times, with the end of the last entry appended, so every
+        # entry ends where the next one starts
+        starts = [0]
+        for _, seconds in info:
+            starts.append(starts[-1] + seconds)
+
+        return {
+            "ids": [track_id for track_id, _ in info],
+            "starts": [cls.json_seconds(start) for start in starts],
+        }
+
+    @classmethod
+    def cue_table(cls, cues):
+        # pylint: disable=missing-function-docstring
+        return {
+            "divs": [div for div, _ in cues],
+            "times": [cls.json_seconds(time) for _, time in cues],
+        }
+
+    @classmethod
+    def json_seconds(cls, seconds):
+        # pylint: disable=missing-function-docstring
+        # whole seconds stay integers, and fractions are kept to the
+        # millisecond
+        seconds = round(seconds, 3)
+        return int(seconds) if seconds == int(seconds) else seconds
 
     def print(self, libretto):
         # pylint: disable=missing-function-docstring
-        total_time = datetime.timedelta()
+        self.print_tracks(libretto.tracks)
 
-        # generate the track info to inject into the template
+    def print_tracks(self, tracks):
+        # pylint: disable=missing-function-docstring
+        with timed(self.stats, "header"):
+            self.print_header()
+
+        # generate the track info to inject after the libretto, so tracks
+        # can be written out as they arrive
         track_info = []
-        for track in libretto.tracks:
-            self.generate_track_details(track_info, track)
+        div_info = []
+        track_count = 0
 
-        info_str = "\n".join(track_info)
+        self.lines_since_blank = 9999
+        self.track_start = 0
+        self.div_count = 0
+        self.cues = []
+        self.chunk_starts = []
 
-        div_info = []
-        for track in libretto.tracks:
+        for track in tracks:
+            track_count += 1
+            self.generate_track_details(track_info, track)
             self.generate_div_details(div_info, track)
 
-        div_info_str = "\n".join(div_info)
+            if self.chunks is not None and \
+                (not self.chunk_starts or self.starts_scene(track)):
+                self.start_chunk()
+
+            with timed(self.stats, "tracks"):
+                self.print_track_lines(track)
+
+            # cues are timed from the start of their top level track
+            self.track_start += track.length.total_seconds()
+
+        if self.chunks is not None:
+            self.end_chunk()
+
+        with timed(self.stats, "footer"):
+            self.print_footer(track_count, track_info, div_info)
+        self.sink.flush()
+
+    @classmethod
+    def starts_scene(cls, track):
+        # pylint: disable=missing-function-docstring
+        # chunks are split between tracks, so a scene starting anywhere in
+        # a track (or its subtracks) starts the chunk at that track
+        for div in [track] + track.subtracks:
+            for line in div.lines:
+                if line.type == LineType.SCENE:
+                    return True
+
+        return False
+
+    def start_chunk(self):
+        # pylint: disable=missing-function-docstring
+        if self.chunk_starts:
+            self.sink.flush()
+
+        stream = self.chunks.start(len(self.chunk_starts))
+        self.chunk_starts.append(self.div_count)
+        self.sink = self.wrap_sink(OutputSink(stream))
+
+    def end_chunk(self):
+        # pylint: disable=missing-function-docstring
+        self.sink.flush()
+        self.chunks.close()
+        self.sink = self.page_sink
+
+    def chunk_table(self):
+        # pylint: disable=missing-function-docstring
+        if self.chunks is None:
+            return None
+
+        return {
+            "files": [self.chunks.name(index)
+                for index in range(len(self.chunk_starts))],
+            "starts": self.chunk_starts,
+        }
+
+    def print_header(self):
+        # pylint: disable=missing-function-docstring
+        self.sink.writeline("<html><head>")
+        self.sink.writeline(
+            '<meta http-equiv="Content-Type" content="text/html; charset=utf-8">')
+
+        # shared assets are named by their content, so they can be cached
+        # for as long as a browser cares to keep them
+        # they sit next to the page, unless a server says where
+        if self.assets is not None:
+            path = html.escape(self.options.asset_path)
+            self.sink.writeline('<script type="text/javascript" ' +
+                f'src="{path}{self.assets.script}"></script>')
+            self.sink.writeline('<link rel="stylesheet" type="text/css" ' +
+                f'href="{path}{self.assets.style}">')
+        else:
+            script = self.script_source()
+            style = self.style_source(PageAssets.image_data_urls())
+            if self.options.minify:
+                script = Minifier.script(script)
+                style = Minifier.style(style)
+
+            self.sink.writeline('<script type="text/javascript">\n<!--')
+            self.sink.writeline(script)
+            self.sink.writeline('-->\n</script>\n')
+            self.sink.writeline('                <style type="text/css">')
+            self.sink.write(style)
+            self.sink.writeline('                </style>')
 
-        print("<html><head>")
-        print(f"""
-<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
-<script type="text/javascript">
-<!--
+        self.sink.writeline(f"""                </head><body onload="onLoad();">
 
+<div id="top-fade"></div>
+<div id="bottom-fade"></div>
+
+<div id="transport">
+    <div class="controls">
+        <div class="nav">
+<a class="play">Play</a>
+<a class="pause">Pause</a>
+<a class="prev">Prev</a>
+<a class="next">Next</a>
+</div>
+<div class="sliderTrack">&nbsp;</div>
+<div class="slider">&nbsp;</div>
+<div class="status">
+Track:
+<span class="track">--</span>/<span class="tracks">--</span>
+Time:
+<span class="time">00:00</span>/<span class="totalTime">00:00</span>
+</div>
+</div>&nbsp;
+</div>
+
+<div class='libretto'>
+<div class="scroll-buffer">&nbsp;</div>
+                """)
+
+    @classmethod
+    def script_source(cls):
+        # pylint: disable=missing-function-docstring
+        # pylint: disable=f-string-without-interpolation
+        return f"""
 var scrollBuffer = 0;
 var body = null;
 var libretto = null;
 var buffers = null;
 var transport = null;
+var trackData = null;
 
 function ArrayUtil() {{
 }}
@@ -271,87 +484,82 @@ ArrayUtil.binarySearch = function(array, value, searchOp) {{
     return array[idx];
 }}
 
-function Duration(hh, mm, ss) {{
-    this.hour = hh;
-    this.min = mm;
-    this.sec = ss;
-}}
-
-Duration.prototype = {{
-    constructor: Duration,
-
-    copy: function() {{
-        return new Duration(this.hour, this.min, this.sec);
-    }},
-
-    toTicks: function() {{
-        var ticks = this.sec + this.min * 60 + this.hour * 60 * 60;
-        return ticks;
-    }},
-}};
-
-Duration.zero = function() {{
-    return new Duration(0, 0, 0);
+function TrackInfo(id, startTicks, endTicks) {{
+    this.id = id;
+    this.offsetHeight = 0;
+    this.startTicks = startTicks;
+    this.endTicks = endTicks;
+    this.cumulativeHeight = 0;
 }}
 
-Duration.sum = function(d1, d2) {{
-    sec = d1.sec + d2.sec;
-
-    min = Math.floor(sec / 60);
-    sec = Math.floor(sec) % 60;
-    min = min + d1.min + d2.min;
-    hour = Math.floor(min /60);
-    min = Math.floor(min) % 60;
+TrackInfo.fromTable = function(table) {{
+    // each entry ends where the next one starts
+    var infos = [];
+    for (var i = 0; i < table.ids.length; ++i) {{
+        infos.push(new TrackInfo(table.ids[i], table.starts[i],
+            table.starts[i + 1]));
+    }}
 
-    return new Duration(hour, min, sec);
+    return infos;
 }}
 
-Duration.fromTicks = function(ticks) {{
-    var sec = Math.floor(ticks) % 60;
-    var time = Math.floor(ticks / 60);
-    var min = time % 60;
-    var hour = Math.floor(time / 60);
+TrackInfo.indexById = function(infos) {{
+    // a repeated id finds its first entry, as a walk from the start would
+    var index = {{}};
+    for (var i = 0; i < infos.length; ++i) {{
+        if (index[infos[i].id] === undefined) {{
+            index[infos[i].id] = i;
+        }}
+    }}
 
-    return new Duration(hour, min, sec);
+    return index;
 }}
 
-Duration.compare = function(d1, d2) {{
-    // returns 0 if equal, -1 if d1 is LOWER, and 1 if d2 is LOWER
-
-    if (d1.hour < d2.hour) {{ return -1; }}
-    else if (d2.hour < d1.hour) {{ return 1; }}
-
-    if (d1.min < d2.min) {{ return -1; }}
-    else if (d2.min < d1.min) {{ return 1; }}
-
-    if (d1.sec < d2.sec) {{ return -1; }}
-    else if (d2.sec < d1.sec) {{ return 1; }}
+TrackInfo.compareTicks = function(ticks, info) {{
+    // shared search op, so lookups don't allocate a closure per call
+    if (ticks < info.startTicks) {{ return -1; }}
+    else if (ticks >= info.endTicks) {{ return 1; }}
     else {{ return 0; }}
 }}
 
-function TrackInfo(id, duration) {{
-    this.id = id;
-    this.duration = duration;
-    this.offsetHeight = 0;
-    this.startTicks = 0;
-    this.endTicks = 0;
-    this.cumulativeHeight = 0;
-}}
-
 function Transport() {{
         this.transport = null;
         this.controls = null;
         this.ticks = 0;
         this.track = "1"
-        this.tracks = { len(libretto.tracks) };
-        this.keyPrefix = "{ self.source_file_name }";
+        this.tracks = trackData.tracks;
+        this.keyPrefix = trackData.keyPrefix;
         this.playTimer = null;
-        this.trackTotal = null;
         this.ticksTotal = 0;
         this.targetOffset = 0;
         this.currentOffset = 0;
         this.lyricTimer = null;
-        this.divCache = null;
+        this.lyricFrame = null;
+        this.useAnimationFrame = false;
+        this.lastFrameTime = null;
+        this.frameInterval = 16;
+        this.ticksDirty = false;
+        this.saveTimer = null;
+        this.saveInterval = 5000;
+        this.useMonotonicClock = false;
+        this.playFrame = null;
+        this.clockTime = null;
+        this.renderedSecond = null;
+        this.audioEl = null;
+        this.audioOffset = 0;
+        this.mediaTime = 0;
+        this.mediaStamp = null;
+        this.clockRate = 1;
+        this.divIndex = null;
+        this.layoutObserver = null;
+        this.layoutReady = false;
+        this.viewportHeight = 0;
+        this.virtual = !! trackData.virtual;
+        this.materialized = [];
+        this.chunks = [];
+        this.measuredLines = 0;
+        this.measuredHeight = 0;
+        this.lineEstimate = null;
         this.targetTrack = null;
         this.supressSliderRefresh = false;
         this.dragEndHandler = null;
@@ -366,22 +574,14 @@ function Transport() {{
         this.cursorTimeout = 3000;
         this.events = {{}};
 
-        this.trackList = [
-        { info_str }
-        ];
-
-        this.allDivs = [
-        { div_info_str }
-        ];
+        this.trackList = TrackInfo.fromTable(trackData.trackList);
+        this.allDivs = TrackInfo.fromTable(trackData.allDivs);
+        this.trackIndex = TrackInfo.indexById(this.trackList);
 
-        trackTotal = new Duration(0, 0, 0);
-        for (var i = 0; i < this.trackList.length; ++i) {{
-            trackTotal = Duration.sum(trackTotal, this.trackList[i].duration);
-        }}
+        var starts = trackData.trackList.starts;
+        this.ticksTotal = starts[starts.length - 1];
 
-        this.trackTotal = trackTotal;
-        this.ticksTotal = trackTotal.toTicks();
-        //console.log(trackTotal);
+        this.initCues();
 
         this.init();
     }}
@@ -408,7 +608,9 @@ Transport.prototype = {{
         this.sliderEl = this.transportEl.getElementsByClassName("slider")[0];
         this.sliderTrackEl = this.transportEl.getElementsByClassName("sliderTrack")[0];
 
+        this.initLayout();
         this.initWakeLock();
+        this.initMedia();
 
         this.transportEl.addEventListener("mouseover", function(event) {{
             return self.onTransportOver(event);
@@ -441,6 +643,30 @@ Transport.prototype = {{
         document.addEventListener("mousemove", function(event) {{
             self.resetCursor();
         }});
+        document.addEventListener("visibilitychange", function(event) {{
+            self.onVisibilityChange();
+        }});
+        window.addEventListener("pagehide", function(event) {{
+            self.updateClock();
+            self.savePosition();
+        }});
+
+        // one frame callback for the life of the page, so scrolling doesn't
+        // allocate a closure per frame
+        this.useAnimationFrame = !! window.requestAnimationFrame;
+        this.lyricFrame = function(time) {{
+            self.lyricTimer = window.requestAnimationFrame(self.lyricFrame);
+            self.updateLyrics(time);
+        }};
+
+        // playback follows the monotonic clock where there is one, otherwise
+        // it falls back to adding up interval ticks
+        this.useMonotonicClock = this.useAnimationFrame &&
+            !! (window.performance && window.performance.now);
+        this.playFrame = function(time) {{
+            self.playTimer = window.requestAnimationFrame(self.playFrame);
+            self.updateClock();
+        }};
 
         this.reloadTicks();
         this.resetCursor();
@@ -448,6 +674,64 @@ Transport.prototype = {{
         this.render();
     }},
 
+    initMedia: function() {{
+        var self = this;
+
+        // with a recording on the page, its clock is the one to follow, and
+        // the transport just plays, pauses and seeks it
+        this.audioEl = document.getElementById("audio");
+        if (! this.audioEl) {{
+            return;
+        }}
+
+        this.audioOffset = trackData.audioOffset;
+
+        this.audioEl.addEventListener("play", function(event) {{
+            self.onMediaTime();
+            self.startClock();
+        }});
+        this.audioEl.addEventListener("pause", function(event) {{
+            self.stopClock();
+            self.savePosition();
+        }});
+        this.audioEl.addEventListener("timeupdate", function(event) {{
+            self.onMediaTime();
+        }});
+        this.audioEl.addEventListener("seeked", function(event) {{
+            self.onMediaTime();
+        }});
+    }},
+
+    onMediaTime: function() {{
+        // currentTime only moves a few times a second, so remember when it
+        // was read, and frames interpolate from there
+        this.mediaTime = this.audioEl.currentTime;
+        this.mediaStamp = this.now();
+
+        if (this.audioEl.paused) {{
+            this.updateMediaClock();
+        }}
+    }},
+
+    now: function() {{
+        if (window.performance && window.performance.now) {{
+            return window.performance.now();
+        }}
+
+        return Date.now();
+    }},
+
+    updateMediaClock: function() {{
+        var mediaTime = this.mediaTime;
+        if (! this.audioEl.paused && this.mediaStamp !== null) {{
+            var elapsed = (this.now() - this.mediaStamp) / 1000;
+            mediaTime += elapsed * this.audioEl.playbackRate;
+        }}
+
+        this.followClock(mediaTime - this.audioOffset);
+    }},
+
+
     initWakeLock: function() {{
         self = this;
         onerror = () => {{
@@ -476,6 +760,9 @@ Transport.prototype = {{
         if (ticks) {{
             this.setTicks(parseFloat(ticks));
             this.updateTrackFromTicks();
+
+            // no need to write back what was just read
+            this.cancelSave();
         }}
     }},
 
@@ -702,147 +989,511 @@ Transport.prototype = {{
         this.totalTimeEl.innerHTML = this.formatInterval(this.ticksTotal);
 
         this.refreshSlider();
+        this.renderedSecond = Math.floor(this.ticks);
 
         this.startLyricTimer();
     }},
 
     startLyricTimer: function() {{
-        if (!this.lyricTimer) {{
+        // nothing to scroll while the page can't be seen
+        if (this.lyricTimer || document.hidden) {{
+            return;
+        }}
+
+        if (this.useAnimationFrame) {{
+            this.lyricTimer = window.requestAnimationFrame(this.lyricFrame);
+        }}
+        else {{
             var self = this;
             this.lyricTimer = window.setInterval(function() {{
                 self.updateLyrics();
-            }}, 16);
+            }}, this.frameInterval);
         }}
     }},
 
     stopLyricTimer: function() {{
         if (this.lyricTimer) {{
-            window.clearInterval(this.lyricTimer);
+            if (this.useAnimationFrame) {{
+                window.cancelAnimationFrame(this.lyricTimer);
+            }}
+            else {{
+                window.clearInterval(this.lyricTimer);
+            }}
             this.lyricTimer = null;
         }}
+
+        this.lastFrameTime = null;
     }},
 
-    refreshTrackHeights: function() {{
-        var startTicks = 0;
-        var endTicks = 0;
-        var cumulativeHeight = 0;
+    onVisibilityChange: function() {{
+        if (document.hidden) {{
+            // frames stop while hidden, so catch the clock up before saving
+            this.updateClock();
+            this.stopLyricTimer();
+            this.savePosition();
+            return;
+        }}
 
-        for (var i = 0; i < this.allDivs.length; ++i)
-        {{
-            var track = this.allDivs[i];
-            var id = track.id;
+        // jump to where playback is now, rather than easing over everything
+        // that was missed while hidden
+        this.updateTargetOffset();
+        this.currentOffset = this.targetOffset;
+        this.applyOffsetToMarkup();
+    }},
 
-            var trackEl = document.getElementById(id.toString());
-            track.offsetHeight = trackEl.offsetHeight;
+    initCues: function() {{
+        // cues pin a line to a time, so the scroll is exact at each cue and
+        // only interpolated between them. a cue outside its track, or out
+        // of order, can't be followed, so it's left out.
+        var cues = trackData.cues;
+        this.cueTable = [];
 
-            // update cache fields
-            endTicks = startTicks + track.duration.toTicks();
-            track.startTicks = startTicks;
-            track.endTicks = endTicks;
-            track.cumulativeHeight = cumulativeHeight;
+        for (var i = 0; i < cues.times.length; ++i) {{
+            var track = this.allDivs[cues.divs[i]];
+            var cue = {{ ticks: cues.times[i], offset: null }};
+            this.cueTable.push(cue);
 
-            startTicks = endTicks;
-            cumulativeHeight += track.offsetHeight;
+            if (! track.cues) {{
+                track.cues = [];
+            }}
 
-            //console.log(track);
+            var last = track.cues[track.cues.length - 1];
+            if (cue.ticks >= track.startTicks && cue.ticks <= track.endTicks &&
+                (! last || cue.ticks >= last.ticks)) {{
+                track.cues.push(cue);
+            }}
         }}
     }},
 
-    updateLyrics: function() {{
-        this.updateTargetOffset();
-        this.updateCurrentOffset();
+    measureCues: function(track) {{
+        // tracks are positioned, so a marker's offset is from its track.
+        // unbuilt virtual tracks have no markers, and keep their offsets.
+        var markers = track.el.getElementsByClassName("cue");
+        for (var i = 0; i < markers.length; ++i) {{
+            var cue = this.cueTable[parseInt(markers[i].getAttribute("data-cue"))];
+            if (cue) {{
+                cue.offset = markers[i].offsetTop;
+            }}
+        }}
+    }},
 
-        // if the current offset is within 1px of the target, just jump to
-        // the location, and stop updating
+    initLayout: function() {{
+        var self = this;
 
-        if (Math.abs(this.currentOffset - this.targetOffset) < 1) {{
-            this.currentOffset = this.targetOffset;
-            this.stopLyricTimer();
+        // chunked pages fetch the templates for each run of tracks when
+        // playback nears it
+        var chunkStarts = [];
+        if (trackData.chunks) {{
+            chunkStarts = trackData.chunks.starts;
+            for (var i = 0; i < trackData.chunks.files.length; ++i) {{
+                this.chunks.push({{ url: trackData.chunks.files[i], state: null }});
+            }}
         }}
 
-        this.applyOffsetToMarkup();
-    }},
+        // the elements are looked up once
+        this.divIndex = {{}};
+        var chunk = -1;
+        for (var i = 0; i < this.allDivs.length; ++i) {{
+            var track = this.allDivs[i];
+            track.el = document.getElementById(track.id.toString());
+            track.offsetHeight = 0;
+            if (this.virtual) {{
+                track.template = track.el.getElementsByTagName("template")[0] || null;
+                track.lines = parseInt(track.el.style.getPropertyValue("--lines"));
+                track.materialized = false;
+                track.measured = false;
+            }}
+            while (chunk + 1 < chunkStarts.length && chunkStarts[chunk + 1] <= i) {{
+                ++chunk;
+            }}
+            track.chunk = chunk;
+            this.divIndex[track.id] = i;
+        }}
 
-    updateTargetOffset: function() {{
-        // are we still in the right target track?
-        var track = this.targetTrack;
+        // with an observer, heights are delivered as tracks change size
+        // (including once when first observed) instead of being read back
+        // from every track on each resize
+        if (window.ResizeObserver) {{
+            this.layoutObserver = new window.ResizeObserver(function(entries) {{
+                return self.onTracksResized(entries);
+            }});
+            for (var i = 0; i < this.allDivs.length; ++i) {{
+                this.layoutObserver.observe(this.allDivs[i].el);
+            }}
+        }}
+    }},
 
-        // only lookup a new track if we've moved outside the bounds
-        if (track == null || this.ticks < track.startTicks ||
-            this.ticks > track.endTicks) {{
+    refreshTrackHeights: function(viewportHeight) {{
+        if (viewportHeight !== undefined) {{
+            this.viewportHeight = viewportHeight;
+        }}
 
-            track = ArrayUtil.binarySearch(this.allDivs, this.ticks,
-                function(a, b) {{
-                    if (a < b.startTicks) {{ return -1; }}
-                    else if (a >= b.endTicks) {{ return 1; }}
-                    else {{ return 0; }}
-                }});
+        if (this.layoutObserver) {{
+            return;
+        }}
 
-            if (track == null) {{
-                track = this.allDivs[this.allDivs.length - 1];
+        // read every height before anything is written back to the page
+        for (var i = 0; i < this.allDivs.length; ++i) {{
+            var track = this.allDivs[i];
+            this.setTrackHeight(track, track.el.offsetHeight);
+            if (track.cues) {{
+                this.measureCues(track);
             }}
-
-            this.targetTrack = track;
         }}
 
-        var wholeTrackTicks = track.startTicks;
-        var wholeTrackHeights = track.cumulativeHeight;
+        this.updateCumulativeHeights(0);
+        this.layoutReady = true;
+    }},
 
-        // get the offsets up to the current track, then add on the partial
-        var tickRemainder = this.ticks - wholeTrackTicks;
-        var tickPercent = tickRemainder / track.duration.toTicks();
+    setTrackHeight: function(track, height) {{
+        if (track.offsetHeight == height) {{
+            return false;
+        }}
 
-        // offset for the current track
-        var partialHeight = track.offsetHeight * tickPercent;
-        var offsetHeight = wholeTrackHeights + partialHeight;
+        track.offsetHeight = height;
 
-        this.targetOffset = offsetHeight;
-    }},
+        // materialized tracks show how tall a line really is, which is
+        // used to size the placeholders of the rest
+        if (track.materialized && ! track.measured) {{
+            track.measured = true;
+            this.measuredLines += track.lines;
+            this.measuredHeight += height;
+        }}
 
-    updateCurrentOffset: function() {{
-        var dist = this.targetOffset - this.currentOffset;
-        var delta = dist / 10;
-        this.currentOffset += delta;
+        return true;
     }},
 
-    applyOffsetToMarkup: function() {{
-        var body = document.getElementsByTagName("body")[0];
-        body.scrollTop = this.currentOffset;
-    }},
+    onTracksResized: function(entries) {{
+        var first = this.allDivs.length;
 
-    format2Digits: function(value) {{
-        if (value > 9) {{
-            return value.toString();
+        for (var i = 0; i < entries.length; ++i) {{
+            var entry = entries[i];
+            var idx = this.divIndex[entry.target.id];
+            if (idx === undefined) {{
+                continue;
+            }}
+
+            var height = (entry.borderBoxSize && entry.borderBoxSize[0])
+                ? entry.borderBoxSize[0].blockSize
+                : entry.target.offsetHeight;
+
+            var track = this.allDivs[idx];
+            if (this.setTrackHeight(track, height)) {{
+                first = Math.min(first, idx);
+                if (track.cues) {{
+                    this.measureCues(track);
+                }}
+            }}
         }}
-        else
-        {{
-            return "0" + value.toString();
+
+        this.layoutReady = true;
+
+        if (first < this.allDivs.length) {{
+            this.updateCumulativeHeights(first);
+
+            if (this.virtual) {{
+                this.updateLineEstimate();
+                if (this.targetTrack) {{
+                    this.materializeAround(this.targetTrack);
+                }}
+            }}
+
+            this.startLyricTimer();
         }}
     }},
 
-    formatInterval: function(interval) {{
-        var sec = Math.floor(interval) % 60;
-        var time = Math.floor(interval / 60);
-        var min = time % 60;
-        var hour = Math.floor(time / 60);
+    updateLineEstimate: function() {{
+        if (this.measuredLines == 0) {{
+            return;
+        }}
 
-        var hourStr = null;
-        if (hour > 0) {{
-            hourStr = hour.toString();
+        // a single custom property sizes every placeholder, and the
+        // observer reports the new heights back
+        var estimate = this.measuredHeight / this.measuredLines;
+        if (this.lineEstimate === null ||
+            Math.abs(estimate - this.lineEstimate) >= 0.5) {{
+            this.lineEstimate = estimate;
+            this.body.style.setProperty("--line-estimate", estimate + "px");
         }}
+    }},
 
-        var minStr = null;
-        if (hourStr) {{
-            minStr = min.toString();
+    materializeAround: function(track) {{
+        if (! this.layoutReady) {{
+            return;
         }}
-        else
-        {{
-            minStr = this.format2Digits(min);
+
+        // build the tracks that could be on screen while the target is
+        // centered, and drop any that are well out of view. the slack
+        // between the two keeps tracks near the edge from churning.
+        var reach = this.viewportHeight;
+        var top = track.cumulativeHeight - reach;
+        var bottom = track.cumulativeHeight + track.offsetHeight + reach;
+
+        var kept = [];
+        for (var i = 0; i < this.materialized.length; ++i) {{
+            var other = this.materialized[i];
+            if (other.cumulativeHeight + other.offsetHeight < top - reach ||
+                other.cumulativeHeight > bottom + reach) {{
+                this.dematerialize(other);
+            }}
+            else {{
+                kept.push(other);
+            }}
         }}
+        this.materialized = kept;
 
-        var secStr = this.format2Digits(sec);
+        var idx = this.divIndex[track.id];
+        var first = idx;
+        while (first > 0 && this.allDivs[first - 1].cumulativeHeight +
+            this.allDivs[first - 1].offsetHeight > top) {{
+            --first;
+        }}
 
-        if (hourStr) {{
+        var last = idx;
+        while (last < this.allDivs.length - 1 &&
+            this.allDivs[last + 1].cumulativeHeight < bottom) {{
+            ++last;
+        }}
+
+        var changed = false;
+        for (var i = first; i <= last; ++i) {{
+            changed = this.materialize(this.allDivs[i]) || changed;
+        }}
+
+        // fetch the next chunk before playback reaches it
+        if (this.chunks.length) {{
+            this.loadChunk(this.allDivs[last].chunk + 1);
+        }}
+
+        // without an observer, nothing reports the new heights
+        if (changed) {{
+            this.refreshTrackHeights();
+        }}
+    }},
+
+    materialize: function(track) {{
+        if (track.materialized) {{
+            return false;
+        }}
+
+        // the track's chunk hasn't arrived yet
+        if (! track.template) {{
+            this.loadChunk(track.chunk);
+            return false;
+        }}
+
+        track.el.appendChild(track.template.content.cloneNode(true));
+        track.el.style.height = "";
+        track.el.classList.add("materialized");
+        track.materialized = true;
+        this.materialized.push(track);
+
+        return true;
+    }},
+
+    dematerialize: function(track) {{
+        // hold the measured height, so nothing around the track moves
+        track.el.style.height = track.offsetHeight + "px";
+        while (track.el.lastChild !== track.template) {{
+            track.el.removeChild(track.el.lastChild);
+        }}
+        track.el.classList.remove("materialized");
+        track.materialized = false;
+    }},
+
+    loadChunk: function(index) {{
+        var self = this;
+
+        var chunk = this.chunks[index];
+        if (! chunk || chunk.state !== null) {{
+            return;
+        }}
+
+        chunk.state = "loading";
+        window.fetch(chunk.url)
+            .then(function(response) {{
+                if (! response.ok) {{
+                    throw new Error(response.status + " " + response.statusText);
+                }}
+                return response.text();
+            }})
+            .then(function(text) {{
+                self.installChunk(chunk, text);
+            }})
+            .catch(function(error) {{
+                // it's tried again the next time it's needed
+                console.log("failed to load " + chunk.url + ": " + error);
+                chunk.state = null;
+            }});
+    }},
+
+    installChunk: function(chunk, text) {{
+        // the chunk is parsed inert, and each track's template moves into
+        // its placeholder
+        var holder = document.createElement("template");
+        holder.innerHTML = text;
+
+        var templates = holder.content.querySelectorAll("template[data-track]");
+        for (var i = 0; i < templates.length; ++i) {{
+            var idx = this.divIndex[templates[i].getAttribute("data-track")];
+            if (idx === undefined) {{
+                continue;
+            }}
+
+            var track = this.allDivs[idx];
+            track.template = templates[i];
+            track.el.insertBefore(track.template, track.el.firstChild);
+        }}
+
+        chunk.state = "loaded";
+
+        if (this.targetTrack) {{
+            this.materializeAround(this.targetTrack);
+        }}
+    }},
+
+    updateCumulativeHeights: function(first) {{
+        // only the tracks from the first changed one onwards can move
+        var cumulativeHeight = 0;
+        if (first > 0) {{
+            var prev = this.allDivs[first - 1];
+            cumulativeHeight = prev.cumulativeHeight + prev.offsetHeight;
+        }}
+
+        for (var i = first; i < this.allDivs.length; ++i) {{
+            var track = this.allDivs[i];
+            track.cumulativeHeight = cumulativeHeight;
+            cumulativeHeight += track.offsetHeight;
+        }}
+    }},
+
+    updateLyrics: function(time) {{
+        // interval timers don't pass a time, so assume a nominal frame
+        var elapsed = this.frameInterval;
+        if (time !== undefined) {{
+            if (this.lastFrameTime !== null) {{
+                elapsed = Math.max(0, time - this.lastFrameTime);
+            }}
+            this.lastFrameTime = time;
+        }}
+
+        this.updateTargetOffset();
+        this.updateCurrentOffset(elapsed);
+
+        // if the current offset is within 1px of the target, just jump to
+        // the location, and stop updating
+
+        if (Math.abs(this.currentOffset - this.targetOffset) < 1) {{
+            this.currentOffset = this.targetOffset;
+            this.stopLyricTimer();
+        }}
+
+        this.applyOffsetToMarkup();
+    }},
+
+    updateTargetOffset: function() {{
+        // are we still in the right target track?
+        var track = this.targetTrack;
+
+        // only lookup a new track if we've moved outside the bounds
+        if (track == null || this.ticks < track.startTicks ||
+            this.ticks > track.endTicks) {{
+
+            track = ArrayUtil.binarySearch(this.allDivs, this.ticks,
+                TrackInfo.compareTicks);
+
+            if (track == null) {{
+                track = this.allDivs[this.allDivs.length - 1];
+            }}
+
+            this.targetTrack = track;
+
+            if (this.virtual) {{
+                this.materializeAround(track);
+            }}
+        }}
+
+        // interpolate between the nearest measured cues around the current
+        // time, or the ends of the track when there are none
+        var fromTicks = track.startTicks;
+        var fromOffset = 0;
+        var toTicks = track.endTicks;
+        var toOffset = track.offsetHeight;
+
+        var cues = track.cues;
+        if (cues) {{
+            for (var i = 0; i < cues.length; ++i) {{
+                var cue = cues[i];
+                if (cue.offset === null) {{
+                    continue;
+                }}
+
+                if (cue.ticks <= this.ticks) {{
+                    fromTicks = cue.ticks;
+                    fromOffset = cue.offset;
+                }}
+                else {{
+                    toTicks = cue.ticks;
+                    toOffset = cue.offset;
+                    break;
+                }}
+            }}
+        }}
+
+        // get the offsets up to the current track, then add on the partial
+        var spanTicks = toTicks - fromTicks;
+        var tickPercent = spanTicks > 0 ? (this.ticks - fromTicks) / spanTicks : 0;
+        var partialHeight = fromOffset + (toOffset - fromOffset) * tickPercent;
+
+        this.targetOffset = track.cumulativeHeight + partialHeight;
+    }},
+
+    updateCurrentOffset: function(elapsed) {{
+        // close a tenth of the distance per nominal frame, scaled by the
+        // time that actually passed, so the ease is the same at any frame rate
+        var dist = this.targetOffset - this.currentOffset;
+        var remaining = Math.pow(0.9, elapsed / this.frameInterval);
+        this.currentOffset += dist * (1 - remaining);
+    }},
+
+    applyOffsetToMarkup: function() {{
+        // the body is looked up once in init
+        this.body.scrollTop = this.currentOffset;
+    }},
+
+    format2Digits: function(value) {{
+        if (value > 9) {{
+            return value.toString();
+        }}
+        else
+        {{
+            return "0" + value.toString();
+        }}
+    }},
+
+    formatInterval: function(interval) {{
+        var sec = Math.floor(interval) % 60;
+        var time = Math.floor(interval / 60);
+        var min = time % 60;
+        var hour = Math.floor(time / 60);
+
+        var hourStr = null;
+        if (hour > 0) {{
+            hourStr = hour.toString();
+        }}
+
+        var minStr = null;
+        if (hourStr) {{
+            minStr = min.toString();
+        }}
+        else
+        {{
+            minStr = this.format2Digits(min);
+        }}
+
+        var secStr = this.format2Digits(sec);
+
+        if (hourStr) {{
             return hourStr + ":" + minStr + ":" + secStr;
         }}
         else {{
@@ -873,53 +1524,138 @@ Transport.prototype = {{
     }},
 
     play: function() {{
+        console.log("play");
+
+        // the media's play event starts the clock once it really plays
+        if (this.audioEl) {{
+            if (this.audioEl.paused) {{
+                this.audioEl.play();
+            }}
+            return;
+        }}
+
+        this.startClock();
+    }},
+
+    startClock: function() {{
         var self = this;
 
-        console.log("play");
         if (! this.playTimer) {{
 
             self.shouldLock = true;
             self.getNewLockRequest();
 
-            this.playTimer = window.setInterval(function(){{
-                self.tick(.1);
-            }}, 100);
+            if (this.useMonotonicClock) {{
+                this.clockTime = window.performance.now();
+                this.playTimer = window.requestAnimationFrame(this.playFrame);
+            }}
+            else {{
+                this.playTimer = window.setInterval(function(){{
+                    if (self.audioEl) {{
+                        self.updateMediaClock();
+                    }}
+                    else {{
+                        self.tick(.1 * self.clockRate);
+                    }}
+                }}, 100);
+            }}
         }}
     }},
 
     pause: function() {{
         console.log("pause");
+
+        // the media's pause event stops the clock and saves
+        if (this.audioEl && ! this.audioEl.paused) {{
+            this.audioEl.pause();
+            return;
+        }}
+
+        this.stopClock();
+        this.savePosition();
+    }},
+
+    stopClock: function() {{
         if (this.playTimer) {{
 
             this.cancelLockRequest();
             this.shouldLock = false;
 
-            window.clearInterval(this.playTimer);
+            if (this.useMonotonicClock) {{
+                window.cancelAnimationFrame(this.playTimer);
+                this.clockTime = null;
+            }}
+            else {{
+                window.clearInterval(this.playTimer);
+            }}
             this.playTimer = null;
         }}
     }},
 
-    updateTrackFromTicks: function() {{
-        var current = Duration.fromTicks(this.ticks);
+    updateClock: function() {{
+        if (this.audioEl) {{
+            this.updateMediaClock();
+            return;
+        }}
+
+        if (this.clockTime === null) {{
+            return;
+        }}
+
+        // advance by the time that really passed since the last sample, so
+        // late or throttled frames never add up to drift
+        var now = window.performance.now();
+        var elapsed = (now - this.clockTime) / 1000;
+        this.clockTime = now;
+
+        this.followClock(this.ticks + elapsed * this.clockRate);
+    }},
+
+    setClockRate: function(rate) {{
+        // lets a follower catch up with, or wait for, a shared clock
+        // without a visible jump
+        this.clockRate = rate;
+        if (this.audioEl) {{
+            this.audioEl.playbackRate = rate;
+        }}
+    }},
+
+    isPlaying: function() {{
+        return !! this.playTimer;
+    }},
+
+    seek: function(ticks) {{
+        this.setTicks(ticks);
+        this.updateTrackFromTicks();
+        this.render();
+    }},
+
+    followClock: function(ticks) {{
+        var track = this.track;
+        this.setTicks(ticks, true);
+        this.updateTrackFromTicks();
 
-        if (Duration.compare(current, this.trackTotal) == 1) {{
-            current = this.trackTotal.copy();
+        // the transport only shows whole seconds, so only touch the display
+        // when one of them changes
+        if (this.track != track ||
+            Math.floor(this.ticks) != this.renderedSecond) {{
+            this.render();
+        }}
+        else {{
+            this.startLyricTimer();
         }}
+    }},
 
-        // advance through tracks until we find a total duration exceeding
-        // the duration
+    updateTrackFromTicks: function() {{
+        var idx = ArrayUtil.binaryIndexSearch(this.trackList, this.ticks,
+            TrackInfo.compareTicks);
 
-        var total = Duration.zero();
-        var i = 0;
-        var info = null;
-        var tracks = this.trackList.length;
-        do {{
-            info = this.trackList[i++];
-            total = Duration.sum(total, info.duration);
-        }} while (i < tracks && Duration.compare(total, current) <= 0);
+        // at (or past) the end of the last track, stay on the last track
+        if (idx == -1) {{
+            idx = this.trackList.length - 1;
+        }}
 
-        // info contains the track containing the current duration
-        this.track = info.id;
+        this.track = this.trackList[idx].id;
     }},
 
     tick: function(ticks) {{
@@ -932,24 +1668,70 @@ Transport.prototype = {{
         this.render();
     }},
 
-    setTicks: function(ticks) {{
+    setTicks: function(ticks, fromClock) {{
         var newTicks = ticks;
 
         //console.log("ticks: " + this.ticks);
         //console.log("ticksTotal: " + this.ticksTotal);
 
+        // a recording can run on either side of the libretto, so following
+        // it only holds the position at the ends
+        var followingMedia = fromClock && this.audioEl;
+
         if (newTicks > this.ticksTotal) {{
             newTicks = this.ticksTotal;
-            this.pause();
+            if (! followingMedia) {{
+                this.pause();
+            }}
         }}
 
         if (newTicks < 0) {{
             newTicks = 0;
-            this.pause();
+            if (! followingMedia) {{
+                this.pause();
+            }}
+        }}
+
+        // anything but the clock itself moves the recording along with it
+        if (this.audioEl && ! fromClock) {{
+            this.mediaTime = newTicks + this.audioOffset;
+            this.mediaStamp = this.now();
+            this.audioEl.currentTime = this.mediaTime;
         }}
 
         this.ticks = newTicks;
-        this.setCookie("ticks", this.ticks);
+        this.scheduleSave();
+    }},
+
+    scheduleSave: function() {{
+        // ticks change ten times a second while playing, so only write the
+        // latest position once per save interval
+        this.ticksDirty = true;
+
+        if (! this.saveTimer) {{
+            var self = this;
+            this.saveTimer = window.setTimeout(function() {{
+                self.saveTimer = null;
+                self.savePosition();
+            }}, this.saveInterval);
+        }}
+    }},
+
+    cancelSave: function() {{
+        if (this.saveTimer) {{
+            window.clearTimeout(this.saveTimer);
+            this.saveTimer = null;
+        }}
+
+        this.ticksDirty = false;
+    }},
+
+    savePosition: function() {{
+        if (this.ticksDirty) {{
+            var ticks = this.ticks;
+            this.cancelSave();
+            this.setCookie("ticks", ticks);
+        }}
     }},
 
     setCookie: function(key, value) {{
@@ -961,16 +1743,15 @@ Transport.prototype = {{
     }},
 
     updateTicksFromTrack: function() {{
-        var duration = Duration.zero();
-
         var currIdx = this.findIdxFromId(this.track);
 
-        // sum duration up to previous track, then get the ticks
-        for (var i = 0; i < currIdx; ++i) {{
-            duration = Duration.sum(duration, this.trackList[i].duration);
+        // an unknown track starts where the last one ends
+        if (currIdx < this.trackList.length) {{
+            this.setTicks(this.trackList[currIdx].startTicks);
+        }}
+        else {{
+            this.setTicks(this.ticksTotal);
         }}
-
-        this.setTicks(duration.toTicks());
     }},
 
     previousTrack: function() {{
@@ -1008,21 +1789,14 @@ Transport.prototype = {{
     }},
 
     findIdxFromId: function(id) {{
-        var idx = 0;
-        for ( ; idx < this.trackList.length; ++idx) {{
-            if (this.trackList[idx].id == id) {{
-                break;
-            }}
+        var idx = this.trackIndex[id];
+        if (idx === undefined) {{
+            return this.trackList.length;
         }}
 
         return idx;
     }},
 
-    onResize: function() {{
-        transport.refreshTrackHeights();
-        this.render();
-    }},
-
     refreshSlider: function() {{
         if (this.supressSliderRefresh) {{
             return;
@@ -1054,6 +1828,172 @@ Transport.prototype = {{
 
 }};
 
+function SyncClient(url, transport) {{
+    this.url = url.replace(/\\/+$/, "");
+    this.transport = transport;
+    this.conducting = /\\bconduct\\b/.test(window.location.hash);
+    this.offset = null;
+    this.roundTrip = null;
+    this.state = null;
+    this.sent = null;
+    this.clockSamples = 5;
+    this.clockInterval = 30000;
+    this.checkInterval = 250;
+    this.heartbeat = 2000;
+    this.tolerance = 0.02;
+    this.jumpSeconds = 1;
+    this.correctionSeconds = 2;
+    this.maxCorrection = 0.1;
+
+    this.init();
+}}
+
+SyncClient.prototype = {{
+    constructor: SyncClient,
+
+    init: function() {{
+        var self = this;
+
+        this.syncClock(this.clockSamples);
+        window.setInterval(function() {{
+            self.syncClock(self.clockSamples);
+        }}, this.clockInterval);
+
+        // the conductor reports its own transport, and everyone else
+        // follows what it reported
+        if (this.conducting) {{
+            window.setInterval(function() {{
+                self.conduct();
+            }}, this.checkInterval);
+            return;
+        }}
+
+        var events = new window.EventSource(this.url + "/events");
+        events.addEventListener("state", function(event) {{
+            self.state = JSON.parse(event.data);
+            self.follow();
+        }});
+        window.setInterval(function() {{
+            self.follow();
+        }}, this.checkInterval);
+    }},
+
+    syncClock: function(samples) {{
+        // the hub's clock is estimated from the quickest of a few round
+        // trips, since a slow one says little about when the hub answered
+        var self = this;
+        var best = null;
+
+        var sample = function(remaining) {{
+            var sent = self.transport.now();
+            window.fetch(self.url + "/time", {{ cache: "no-store" }})
+            .then(function(response) {{
+                return response.json();
+            }})
+            .then(function(data) {{
+                var received = self.transport.now();
+                var roundTrip = received - sent;
+                if (best === null || roundTrip < best) {{
+                    best = roundTrip;
+                    self.roundTrip = roundTrip;
+                    self.offset = data.now - (sent + received) / 2;
+                }}
+
+                if (remaining > 1) {{
+                    sample(remaining - 1);
+                }}
+            }})
+            .catch(function(error) {{
+                console.log("sync clock failed: " + error);
+            }});
+        }};
+
+        sample(samples);
+    }},
+
+    hubNow: function() {{
+        return this.transport.now() + this.offset;
+    }},
+
+    expectedTicks: function(state, now) {{
+        var ticks = state.ticks;
+        if (state.playing) {{
+            ticks += (now - state.at) / 1000;
+        }}
+
+        return Math.max(0, Math.min(ticks, this.transport.ticksTotal));
+    }},
+
+    conduct: function() {{
+        if (this.offset === null) {{
+            return;
+        }}
+
+        // followers extrapolate from the last state, so only a seek, a
+        // change of play state or the heartbeat needs a new one
+        var transport = this.transport;
+        var now = this.hubNow();
+        var playing = transport.isPlaying();
+        var sent = this.sent;
+        if (sent && sent.playing == playing &&
+            now - sent.at < this.heartbeat &&
+            Math.abs(this.expectedTicks(sent, now) - transport.ticks) <
+                this.tolerance * 2) {{
+            return;
+        }}
+
+        this.sent = {{ ticks: transport.ticks, playing: playing, at: now }};
+        window.fetch(this.url, {{
+            method: "POST",
+            body: JSON.stringify(this.sent),
+        }})
+        .catch(function(error) {{
+            console.log("sync conduct failed: " + error);
+        }});
+    }},
+
+    follow: function() {{
+        var state = this.state;
+        if (state === null || this.offset === null) {{
+            return;
+        }}
+
+        var transport = this.transport;
+        var target = this.expectedTicks(state, this.hubNow());
+        var error = target - transport.ticks;
+
+        if (! state.playing) {{
+            transport.setClockRate(1);
+            if (transport.isPlaying()) {{
+                transport.pause();
+            }}
+            if (Math.abs(error) > this.tolerance) {{
+                transport.seek(target);
+            }}
+            return;
+        }}
+
+        // only a large difference jumps, anything smaller is made up by
+        // running a little fast or slow until the clocks agree
+        if (Math.abs(error) > this.jumpSeconds) {{
+            transport.seek(target);
+            error = 0;
+        }}
+
+        var rate = 1;
+        if (Math.abs(error) > this.tolerance) {{
+            var correction = error / this.correctionSeconds;
+            rate += Math.max(-this.maxCorrection,
+                Math.min(this.maxCorrection, correction));
+        }}
+        transport.setClockRate(rate);
+
+        if (! transport.isPlaying()) {{
+            transport.play();
+        }}
+    }},
+}};
+
 function onLoad(event) {{
     body = document.getElementsByTagName("body")[0];
     window.addEventListener("resize", onResize);
@@ -1061,9 +2001,28 @@ function onLoad(event) {{
     buffers = document.getElementsByClassName("scroll-buffer");
     //console.log(buffers.length);
 
+    // the timing tables ship as data, parsed once here
+    trackData = JSON.parse(document.getElementById("track-data").textContent);
+
     transport = new Transport();
     transport.addEventListener("resize", onResize);
 
+    // a preview server says when the source changes, and the position is
+    // saved so the new page picks up where this one was
+    if (trackData.reloadUrl && window.EventSource) {{
+        var events = new window.EventSource(trackData.reloadUrl);
+        events.addEventListener("reload", function(event) {{
+            transport.ticksDirty = true;
+            transport.savePosition();
+            window.location.reload();
+        }});
+    }}
+
+    // a sync hub shares one position between every page in a room
+    if (trackData.syncUrl && window.EventSource && window.fetch) {{
+        new SyncClient(trackData.syncUrl, transport);
+    }}
+
     onResize();
 
     //testArraySearch();
@@ -1071,24 +2030,32 @@ function onLoad(event) {{
 
 function onResize() {{
     //console.log("global onresize");
-    updateBuffers();
-    transport.onResize();
+    // do all the layout reads before any writes, so the page is only laid
+    // out once per resize
+    var viewportHeight = body.clientHeight;
+    transport.refreshTrackHeights(viewportHeight);
+    updateBuffers(viewportHeight / 2);
+    transport.render();
 }}
 
-function updateBuffers() {{
-    scrollBuffer = body.clientHeight / 2;
+function updateBuffers(bufferHeight) {{
+    if (bufferHeight == scrollBuffer) {{
+        return;
+    }}
+
+    scrollBuffer = bufferHeight;
     console.log("scrollBuffer: " + scrollBuffer);
     for (var i = 0; i < buffers.length; ++i) {{
         b = buffers[i];
         b.style.height = scrollBuffer + "px";
     }}
 }}
+"""
 
--->
-</script>
-
-                <style type="text/css">
-                    * {{
+    @classmethod
+    def style_source(cls, images):
+        # pylint: disable=missing-function-docstring
+        return f"""                    * {{
                         margin: 0;
                         padding: 0;
                     }}
@@ -1149,6 +2116,17 @@ function updateBuffers() {{
 
                     .libretto .track {{
                         border: solid 1px black;
+                        position: relative;
+                    }}
+
+                    /* unbuilt virtual tracks are sized from their lines */
+                    .libretto .track.virtual {{
+                        box-sizing: border-box;
+                    }}
+
+                    .libretto .track.virtual:not(.materialized) {{
+                        height: calc(var(--lines) * var(--line-estimate, 1.5em));
+                        overflow: hidden;
                     }}
 
                     /* rules for side-by-side */
@@ -1236,7 +2214,7 @@ function updateBuffers() {{
                         position: fixed;
                         width: 100%;
                         height: 52px;
-                        background-image: url(data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAA0CAYAAABLolKXAAAC93pUWHRSYXcgcHJvZmlsZSB0eXBlIGV4aWYAAHjarZVbsuwmDEX/GUWGgCSExHAwj6rMIMPPBtOvczu3KqmYtsFqIcRegMP4688Z/lhX8RiSmueSc8SVSipc0fB4X3dNMe1nPG+P+sMeJJ0/GCZBLfdrHse/wq6vDnb86fq0B2snjp9AjxFPQFkjMxrHz08g4dtO5z2U06+mt+mcO7e4p0z9ZPnjPRnE6Ip4woGHkEQ8fY0iyECKVNQJT5YMpyi224Snbim+aBdi+i7es/VDu1iPXT6lCHeyK+8fGh076XfttkLvGdFr5I8/rrElfl1v2s3Zfc5xz66mDKVyOJN6TGW34HhBStndMorhVrRtl4LimGIDsQ6aF0oLVIih9qREnSpNGrtu1JBi4sGGmrlB62VzMS7cNpS0Ck024OlBHDwaqAnM/MyF9rhlj9fIMXIneDIhGKHHLyV8M/6X8gw051q6RNGPYmkB5iU40ljk1hNeAELzaKpb313C27qJb2AFgXTL7Jhgjdcd4lJ6rS3ZnAV+GtNjQZL1EwC5YGxFMiQgEDOJUqZozEYEHR18KjJnSXyBAKlypzDBRrATjJ3X2OhjtH1Z+TbjaAEIlYyt4msDAVZKivVjybGGqoqmoKpZTV2L1iw5Zc05W15nVDWxZGrZzNyKVRdPrp7d3L14LVwER5iWXCwUL6XUikErQlf0rvCo9eJLrnTplS+7/CpXbVg+LTVtuVnzVlrt3KVj+/fcLXTvpddBA0tppKEjDxs+yqgTa23KTFNnnjZ9llmf1Ohs2w9q9IPc76nRobaIpe1nL2owmz1C0DpOdDEDMU4E4rYIYEHzYhadUuJFbjGLhbEplEGNdMHptIiBYBrEOunJ7kXut9yCpn/Fjf+JXFjo/g9yYaE75H7l9oVar/uLIhvQ2oVL0ygTBxsc5vqsKH4fNXQDCeTK3nYzZ0cbkXDkKC07YsJ92cP6omE667OGhtxB/Nn3uN19+WEqd5AV9VGHN4Mg8RL+Bj2IvKc3lp8IAAAMSWlDQ1BJQ0MgUFJPRklMRQAAeJyVVwdYU8kWnltSSWiBCEgJvYlSpEsJoUUQkCrYCEkgocSQEETsyrIKrl1EQF3RVREXd3UFZK2oa2MR7K7loYiKsi4WbKi8SQFd93vvfe9839z758w5/ymZe+8MADo1PKk0F9UFIE9SIIuPCGFNSU1jkboBAswAGRgDHR5fLmXHxUUDKMP3v8vra9AaymUXJdc/5/+r6AmEcj4ASBzEGQI5Pw/iXwDAS/hSWQEARB+ot55dIFXiaRAbyGCCEEuVOEuNS5Q4Q40rVTaJ8RyI9wJApvF4siwAtJuhnlXIz4I82jcgdpUIxBIAdMgQB/JFPAHEkRCPycubpcTQDjhkfMGT9TfOjBFOHi9rBKtrUQk5VCyX5vLm/J/t+N+Sl6sYjmEHB00ki4xX1gz7diNnVpQS0yDuk2TExEKsD/FbsUBlDzFKFSkik9T2qClfzoE9A0yIXQW80CiITSEOl+TGRGv0GZnicC7EcIWgReICbqLGd5lQHpag4ayRzYqPHcaZMg5b49vAk6niKu1PKXKS2Br+GyIhd5j/VbEoMUWdM0YtFCfHQKwNMVOekxCltsFsikWcmGEbmSJemb8NxH5CSUSImh+bkSkLj9fYy/Lkw/Viy0RibowGVxWIEiM1PHv5PFX+RhA3CyXspGEeoXxK9HAtAmFomLp2rEMoSdLUi3VJC0LiNb4vpLlxGnucKsyNUOqtIDaVFyZofPHAArgg1fx4jLQgLlGdJ56RzZsYp84HLwLRgANCAQso4MgAs0A2ELf3NfXBX+qZcMADMpAFhMBFoxn2SFHNSOA1ARSDPyESAvmIX4hqVggKof7jiFZ9dQGZqtlClUcOeAhxHogCufC3QuUlGYmWDB5Ajfgf0fkw11w4lHP/1LGhJlqjUQzzsnSGLYlhxFBiJDGc6Iib4IG4Px4Nr8FwuOM+uO9wtp/tCQ8JnYT7hKuELsLNmeIlsq/qYYFJoAtGCNfUnPFlzbgdZPXEQ/AAyA+5cSZuAlzw8TASGw+CsT2hlqPJXFn919x/q+GLrmvsKK4UlDKKEkxx+NpT20nbc4RF2dMvO6TONWOkr5yRma/jc77otADeo762xJZhB7Az2AnsHHYYawIs7BjWjLVhR5R4ZBU9UK2i4WjxqnxyII/4H/F4mpjKTspd6117XT+o5wqERcr3I+DMks6RibNEBSw2fPMLWVwJf+wYlrurmy8Ayu+I+jX1kqn6PiDM8591+ccB8C2DyqzPOp41AIceAsB4/Vln/QI+HqsBONLBV8gK1TpceSEAKtCBT5QxMAfWwAHW4w68gD8IBmFgIogFiSAVzIBdFsH1LAOzwTywGJSCcrAabABVYCvYDnaDH8F+0AQOgxPgN3ABdICr4BZcPT3gKegHr8EggiAkhI4wEGPEArFFnBF3xAcJRMKQaCQeSUXSkSxEgiiQechSpBxZi1Qh25A65GfkEHICOYd0IjeRe0gv8gJ5j2IoDTVAzVA7dBzqg7LRKDQRnY5mofloMVqCrkQr0Vp0L9qInkAvoFfRLvQpOoABTAtjYpaYC+aDcbBYLA3LxGTYAqwMq8BqsQasBf7Pl7EurA97hxNxBs7CXeAKjsSTcD6ejy/AV+BV+G68ET+FX8bv4f34JwKdYEpwJvgRuIQphCzCbEIpoYKwk3CQcBo+TT2E10QikUm0J3rDpzGVmE2cS1xB3EzcRzxO7CR2EwdIJJIxyZkUQIol8UgFpFLSJtJe0jHSJVIP6S1Zi2xBdieHk9PIEvIScgV5D/ko+RL5EXmQokuxpfhRYikCyhzKKsoOSgvlIqWHMkjVo9pTA6iJ1GzqYmoltYF6mnqb+lJLS8tKy1drspZYa5FWpdZPWme17mm9o+nTnGgc2jSagraStot2nHaT9pJOp9vRg+lp9AL6Snod/ST9Lv2tNkN7rDZXW6C9ULtau1H7kvYzHYqOrQ5bZ4ZOsU6FzgGdizp9uhRdO12OLk93gW617iHd67oDegw9N71YvTy9FXp79M7pPdYn6dvph+kL9Ev0t+uf1O9mYAxrBofBZyxl7GCcZvQYEA3sDbgG2QblBj8atBv0G+objjdMNiwyrDY8YtjFxJh2TC4zl7mKuZ95jfl+lNko9ijhqOWjGkZdGvXGaLRRsJHQqMxon9FVo/fGLOMw4xzjNcZNxndMcBMnk8kms022mJw26RttMNp/NH902ej9o/8wRU2dTONN55puN20zHTAzN4swk5ptMjtp1mfONA82zzZfb37UvNeCYRFoIbZYb3HM4gnLkMVm5bIqWadY/ZamlpGWCsttlu2Wg1b2VklWS6z2Wd2xplr7WGdar7dute63sbCZZDPPpt7mD1uKrY+tyHaj7RnbN3b2dil239o12T22N7Ln2hfb19vfdqA7BDnkO9Q6XHEkOvo45jhuduxwQp08nURO1U4XnVFnL2ex82bnzjGEMb5jJGNqx1x3obmwXQpd6l3ujWWOjR67ZGzT2GfjbMaljVsz7sy4T66errmuO1xvuem7TXRb4tbi9sLdyZ3vXu1+xYPuEe6x0KPZ4/l45/HC8VvG3/BkeE7y/Naz1fOjl7eXzKvBq9fbxjvdu8b7uo+BT5zPCp+zvgTfEN+Fvod93/l5+RX47ff7y9/FP8d/j//jCfYThBN2TOgOsArgBWwL6ApkBaYHfh/YFWQZxAuqDbofbB0sCN4Z/IjtyM5m72U/C3ENkYUcDHnD8ePM5xwPxUIjQstC28P0w5LCqsLuhluFZ4XXh/dHeEbMjTgeSYiMilwTeZ1rxuVz67j9E70nzp94KooWlRBVFXU/2ilaFt0yCZ00cdK6SbdjbGMkMU2xIJYbuy72Tpx9XH7cr5OJk+MmV09+GO8WPy/+TAIjYWbCnoTXiSGJqxJvJTkkKZJak3WSpyXXJb9JCU1Zm9I1ZdyU+VMupJqkilOb00hpyWk70wamhk3dMLVnmue00mnXpttPL5p+bobJjNwZR2bqzOTNPJBOSE9J35P+gRfLq+UNZHAzajL6+Rz+Rv5TQbBgvaBXGCBcK3yUGZC5NvNxVkDWuqxeUZCoQtQn5oirxM+zI7O3Zr/Jic3ZlTOUm5K7L4+cl553SKIvyZGcmmU+q2hWp9RZWirtyvfL35DfL4uS7ZQj8uny5gIDuGFvUzgovlHcKwwsrC58Ozt59oEivSJJUdscpznL5zwqDi/+YS4+lz+3dZ7lvMXz7s1nz9+2AFmQsaB1ofXCkoU9iyIW7V5MXZyz+PclrkvWLnm1NGVpS4lZyaKS7m8ivqkv1S6VlV7/1v/brcvwZeJl7cs9lm9a/qlMUHa+3LW8ovzDCv6K89+5fVf53dDKzJXtq7xWbVlNXC1ZfW1N0Jrda/XWFq/tXjdpXeN61vqy9a82zNxwrmJ8xdaN1I2KjV2V0ZXNm2w2rd70oUpUdbU6pHpfjWnN8po3mwWbL20J3tKw1Wxr+db334u/v7EtYltjrV1txXbi9sLtD3ck7zjzg88PdTtNdpbv/LhLsqtrd/zuU3XedXV7TPesqkfrFfW9e6ft7fgx9MfmBpeGbfuY+8p/Aj8pfnryc/rP1/ZH7W894HOg4RfbX2oOMg6WNSKNcxr7m0RNXc2pzZ2HJh5qbfFvOfjr2F93HbY8XH3E8Miqo9SjJUeHjhUfGzguPd53IutEd+vM1lsnp5y8cmryqfbTUafP/hb+28kz7DPHzgacPXzO79yh8z7nmy54XWhs82w7+Lvn7wfbvdobL3pfbO7w7WjpnNB59FLQpROXQy//doV75cLVmKud15Ku3bg+7XrXDcGNxzdzbz7/o/CPwVuLbhNul93RvVNx1/Ru7b8c/7Wvy6vryL3Qe233E+7f6uZ3P30gf/Chp+Qh/WHFI4tHdY/dHx/uDe/teDL1Sc9T6dPBvtI/9f6seebw7Je/gv9q65/S3/Nc9nzoxYqXxi93vRr/qnUgbuDu67zXg2/K3hq/3f3O592Z9ynvHw3O/kD6UPnR8WPLp6hPt4fyhoakPBlPtRXA4EAzMwF4sQsAeircO3QAQJ2qPuepBFGfTVUI/CesPguqxAuAXcEAJC0CIBruUbbAYQsxDd6VW/XEYIB6eIwMjcgzPdzVXDR44iG8HRp6aQYAqQWAj7KhocHNQ0Mfd8BkbwJwPF99vlQKEZ4NvndUovY2Kvha/g1r/H5YlrDTnAAAD8NpVFh0WE1MOmNvbS5hZG9iZS54bXAAAAAAADw/eHBhY2tldCBiZWdpbj0i77u/IiBpZD0iVzVNME1wQ2VoaUh6cmVTek5UY3prYzlkIj8+Cjx4OnhtcG1ldGEgeG1sbnM6eD0iYWRvYmU6bnM6bWV0YS8iIHg6eG1wdGs9IlhNUCBDb3JlIDQuNC4wLUV4aXYyIj4KIDxyZGY6UkRGIHhtbG5zOnJkZj0iaHR0cDovL3d3dy53My5vcmcvMTk5OS8wMi8yMi1yZGYtc3ludGF4LW5zIyI+CiAgPHJkZjpEZXNjcmlwdGlvbiByZGY6YWJvdXQ9IiIKICAgIHhtbG5zOmlwdGNFeHQ9Imh0dHA6Ly9pcHRjLm9yZy9zdGQvSXB0YzR4bXBFeHQvMjAwOC0wMi0yOS8iCiAgICB4bWxuczp4bXBNTT0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wL21tLyIKICAgIHhtbG5zOnN0RXZ0PSJodHRwOi8vbnMuYWRvYmUuY29tL3hhcC8xLjAvc1R5cGUvUmVzb3VyY2VFdmVudCMiCiAgICB4bWxuczpwbHVzPSJodHRwOi8vbnMudXNlcGx1cy5vcmcvbGRmL3htcC8xLjAvIgogICAgeG1sbnM6R0lNUD0iaHR0cDovL3d3dy5naW1wLm9yZy94bXAvIgogICAgeG1sbnM6ZGM9Imh0dHA6Ly9wdXJsLm9yZy9kYy9lbGVtZW50cy8xLjEvIgogICAgeG1sbnM6ZXhpZj0iaHR0cDovL25zLmFkb2JlLmNvbS9leGlmLzEuMC8iCiAgICB4bWxuczp4bXA9Imh0dHA6Ly9ucy5hZG9iZS5jb20veGFwLzEuMC8iCiAgIHhtcE1NOkRvY3VtZW50SUQ9ImdpbXA6ZG9jaWQ6Z2ltcDoxMGIyNjljZS02ZTc0LTQ4YzMtYmU1Ny00ZjBjNTIxZmMzYzgiCiAgIHhtcE1NOkluc3RhbmNlSUQ9InhtcC5paWQ6ZGMxYjY2NzYtNjZkYi00NzMwLTllNTYtNmQ3M2ZkZGQ4NDNlIgogICB4bXBNTTpPcmlnaW5hbERvY3VtZW50SUQ9InhtcC5kaWQ6YzcyODVhNGMtYmExNC00MmEyLWFkYWMtNTMyOTI1ZDI1OGE1IgogICBHSU1QOkFQST0iMi4wIgogICBHSU1QOlBsYXRmb3JtPSJNYWMgT1MiCiAgIEdJTVA6VGltZVN0YW1wPSIxNTU2Mjg4NTMwODQxNzM4IgogICBHSU1QOlZlcnNpb249IjIuMTAuOCIKICAgZGM6Rm9ybWF0PSJpbWFnZS9wbmciCiAgIGV4aWY6UGl4ZWxYRGltZW5zaW9uPSI4NTAiCiAgIGV4aWY6UGl4ZWxZRGltZW5zaW9uPSI4MTQiCiAgIHhtcDpDcmVhdG9yVG9vbD0iR0lNUCAyLjEwIj4KICAgPGlwdGNFeHQ6TG9jYXRpb25DcmVhdGVkPgogICAgPHJkZjpCYWcvPgogICA8L2lwdGNFeHQ6TG9jYXRpb25DcmVhdGVkPgogICA8aXB0Y0V4dDpMb2NhdGlvblNob3duPgogICAgPHJkZjpCYWcvPgogICA8L2lwdGNFeHQ6TG9jYXRpb25TaG93bj4KICAgPGlwdGNFeHQ6QXJ0d29ya09yT2JqZWN0PgogICAgPHJkZjpCYWcvPgogICA8L2lwdGNFeHQ6QXJ0d29ya09yT2JqZWN0PgogICA8aXB0Y0V4dDpSZWdpc3RyeUlkPgogICAgPHJkZjpCYWcvPgogICA8L2lwdGNFeHQ6UmVnaXN0cnlJZD4KICAgPHhtcE1NOkhpc3Rvcnk+CiAgICA8cmRmOlNlcT4KICAgICA8cmRmOmxpCiAgICAgIHN0RXZ0OmFjdGlvbj0ic2F2ZWQiCiAgICAgIHN0RXZ0OmNoYW5nZWQ9Ii8iCiAgICAgIHN0RXZ0Omluc3RhbmNlSUQ9InhtcC5paWQ6YTllNjZiN2YtMDFmZi00YzYwLWEwNzctNmRkNTk3M2E2NDVlIgogICAgICBzdEV2dDpzb2Z0d2FyZUFnZW50PSJHaW1wIDIuMTAgKE1hYyBPUykiCiAgICAgIHN0RXZ0OndoZW49IjIwMTktMDQtMjZUMDc6MjI6MTAtMDc6MDAiLz4KICAgIDwvcmRmOlNlcT4KICAgPC94bXBNTTpIaXN0b3J5PgogICA8cGx1czpJbWFnZVN1cHBsaWVyPgogICAgPHJkZjpTZXEvPgogICA8L3BsdXM6SW1hZ2VTdXBwbGllcj4KICAgPHBsdXM6SW1hZ2VDcmVhdG9yPgogICAgPHJkZjpTZXEvPgogICA8L3BsdXM6SW1hZ2VDcmVhdG9yPgogICA8cGx1czpDb3B5cmlnaHRPd25lcj4KICAgIDxyZGY6U2VxLz4KICAgPC9wbHVzOkNvcHlyaWdodE93bmVyPgogICA8cGx1czpMaWNlbnNvcj4KICAgIDxyZGY6U2VxLz4KICAgPC9wbHVzOkxpY2Vuc29yPgogIDwvcmRmOkRlc2NyaXB0aW9uPgogPC9yZGY6UkRGPgo8L3g6eG1wbWV0YT4KICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgIAo8P3hwYWNrZXQgZW5kPSJ3Ij8+cAu/FAAAAAlwSFlzAAAWJQAAFiUBSVIk8AAAAAd0SU1FB+MEGg4WCmDzo3QAAABnSURBVBjTTY9BEgMxDMIk+v8HN84MPaSb9ujBIEAo6A5lBboDToSVwg50IkwKE/R7ApO2K8gToBN7bOvPQZloJ9R1vNiVcuA3tCvVfV5sJz2FfiAneIVeEI9g3emX9g4+de8Y1BcAHzu6VXGuT2W6AAAAAElFTkSuQmCC);
+                        background-image: url({ images["top-fade"] });
                         background-repeat: repeat-x;
                     }}
 
@@ -1246,54 +2224,70 @@ function updateBuffers() {{
                         margin-top: -52px;
                         width: 100%;
                         height: 52px;
-                        background-image: url(data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAA0CAYAAABLolKXAAAC+3pUWHRSYXcgcHJvZmlsZSB0eXBlIGV4aWYAAHjarZVbzu0mDIXfGUWHgG2MzXAIF6kz6PC7IOzbf3aP1KpBAWKMMf4MCeOvP2f4Yz3FY0hqnkvOEU8qqXBFx+P93C3FtOt4vh7thzxIOgMMkaCV+zOPo18h19cEO/p0fcqDtWPHj6HHisegrJUZnaPnx5DwLafzHcqZV9Pbds6bW9xbpn68/PGdDMHoCnvCgYeQRNS+VhF4IEUq2oSaJUMpiqGvGFly/h67ENP34D17P2IX65HLZyjC7ezy+0eMjpz0e+x2hN49otfKHwPX2CF+PW+xm7P7nOPeXU0ZkcrhbOqxld2D4oVQyp6WUQyvom+7FBTHFhuIddC8UFqgQoxoT0rUqdKksdtGDS4mHmxomRvLlrkYF24bSlqFJhvw9CAONg3UBGJ++kJ73bLXa+RYuRM0mWCMMOOXEr4J/0t5GppzpS5R9BOxtADzCjjcWORWDS0AoXliqju+u4S3vIlvYAWGdIfZscEar9vEpfTKLdmcBXoa0yMhyfoxAF+wtsIZEhCImUQpUzRmI0IcHXwqPGdJfIEAqXKnMMFGcBKMndfamGO0dVn5FuNqAQiVjKPi6wABVkqK/LHkyKGqoimoalZT16I1S05Zc86W1x1VTSyZWjYzt2LVxZOrZzd3L14LF8EVpiUXC8VLKbVi0QrTFbMrNGq9+JIrXXrlyy6/ylUb0qelpi03a95Kq527dBz/nruF7r30OmgglUYaOvKw4aOMOpFrU2aaOvO06bPM+qRG59h+UKMf5H5PjQ61RSxtPXtRg9jsYYLWdaKLGYhxIhC3RQAJzYtZdEqJF7nFLBbGoVAGNdIFp9MiBoJpEOukJ7sXud9yC5r+FTf+J3Jhofs/yIWF7pD7ldsXar3uP4psQOsUrphGmbjYoDDXb2UlOiKvlOAx/k6xoatLlNkrbhn8xahgZA1Sdnj/0MrZQ12/Lujfc1G111xac5f5so0sq6ctD+1nG94EAsdL+Bsatrw946KHkQAADElpQ0NQSUNDIFBST0ZJTEUAAHiclVcHWFPJFp5bUklogQhICb2JUqRLCaFFEJAq2AhJIKHEkBBE7MqyCq5dREBd0VURF3d1BWStqGtjEeyu5aGIirIuFmyovEkBXfd7733vfN/c++fMOf8pmXvvDAA6NTypNBfVBSBPUiCLjwhhTUlNY5G6AQLMABkYAx0eXy5lx8VFAyjD97/L62vQGsplFyXXP+f/q+gJhHI+AEgcxBkCOT8P4l8AwEv4UlkBAEQfqLeeXSBV4mkQG8hgghBLlThLjUuUOEONK1U2ifEciPcCQKbxeLIsALSboZ5VyM+CPNo3IHaVCMQSAHTIEAfyRTwBxJEQj8nLm6XE0A44ZHzBk/U3zowRTh4vawSra1EJOVQsl+by5vyf7fjfkperGI5hBwdNJIuMV9YM+3YjZ1aUEtMg7pNkxMRCrA/xW7FAZQ8xShUpIpPU9qgpX86BPQNMiF0FvNAoiE0hDpfkxkRr9BmZ4nAuxHCFoEXiAm6ixneZUB6WoOGskc2Kjx3GmTIOW+PbwJOp4irtTylyktga/hsiIXeY/1WxKDFFnTNGLRQnx0CsDTFTnpMQpbbBbIpFnJhhG5kiXpm/DcR+QklEiJofm5EpC4/X2Mvy5MP1YstEYm6MBlcViBIjNTx7+TxV/kYQNwsl7KRhHqF8SvRwLQJhaJi6dqxDKEnS1It1SQtC4jW+L6S5cRp7nCrMjVDqrSA2lRcmaHzxwAK4INX8eIy0IC5RnSeekc2bGKfOBy8C0YADQgELKODIALNANhC39zX1wV/qmXDAAzKQBYTARaMZ9khRzUjgNQEUgz8hEgL5iF+IalYICqH+44hWfXUBmarZQpVHDngIcR6IArnwt0LlJRmJlgweQI34H9H5MNdcOJRz/9SxoSZao1EM87J0hi2JYcRQYiQxnOiIm+CBuD8eDa/BcLjjPrjvcLaf7QkPCZ2E+4SrhC7CzZniJbKv6mGBSaALRgjX1JzxZc24HWT1xEPwAMgPuXEmbgJc8PEwEhsPgrE9oZajyVxZ/dfcf6vhi65r7CiuFJQyihJMcfjaU9tJ23OERdnTLzukzjVjpK+ckZmv43O+6LQA3qO+tsSWYQewM9gJ7Bx2GGsCLOwY1oy1YUeUeGQVPVCtouFo8ap8ciCP+B/xeJqYyk7KXetde10/qOcKhEXK9yPgzJLOkYmzRAUsNnzzC1lcCX/sGJa7q5svAMrviPo19ZKp+j4gzPOfdfnHAfAtg8qszzqeNQCHHgLAeP1ZZ/0CPh6rATjSwVfICtU6XHkhACrQgU+UMTAH1sAB1uMOvIA/CAZhYCKIBYkgFcyAXRbB9SwDs8E8sBiUgnKwGmwAVWAr2A52gx/BftAEDoMT4DdwAXSAq+AWXD094CnoB6/BIIIgJISOMBBjxAKxRZwRd8QHCUTCkGgkHklF0pEsRIIokHnIUqQcWYtUIduQOuRn5BByAjmHdCI3kXtIL/ICeY9iKA01QM1QO3Qc6oOy0Sg0EZ2OZqH5aDFagq5EK9FadC/aiJ5AL6BX0S70KTqAAUwLY2KWmAvmg3GwWCwNy8Rk2AKsDKvAarEGrAX+z5exLqwPe4cTcQbOwl3gCo7Ek3A+no8vwFfgVfhuvBE/hV/G7+H9+CcCnWBKcCb4EbiEKYQswmxCKaGCsJNwkHAaPk09hNdEIpFJtCd6w6cxlZhNnEtcQdxM3Ec8TuwkdhMHSCSSMcmZFECKJfFIBaRS0ibSXtIx0iVSD+ktWYtsQXYnh5PTyBLyEnIFeQ/5KPkS+RF5kKJLsaX4UWIpAsocyirKDkoL5SKlhzJI1aPaUwOoidRs6mJqJbWBepp6m/pSS0vLSstXa7KWWGuRVqXWT1pnte5pvaPp05xoHNo0moK2kraLdpx2k/aSTqfb0YPpafQC+kp6Hf0k/S79rTZDe6w2V1ugvVC7WrtR+5L2Mx2Kjq0OW2eGTrFOhc4BnYs6fboUXTtdji5Pd4Fute4h3eu6A3oMPTe9WL08vRV6e/TO6T3WJ+nb6YfpC/RL9Lfrn9TvZmAMawaHwWcsZexgnGb0GBAN7A24BtkG5QY/GrQb9BvqG443TDYsMqw2PGLYxcSYdkwuM5e5irmfeY35fpTZKPYo4ajloxpGXRr1xmi0UbCR0KjMaJ/RVaP3xizjMOMc4zXGTcZ3THATJ5PJJrNNtpicNukbbTDafzR/dNno/aP/MEVNnUzjTeeabjdtMx0wMzeLMJOabTI7adZnzjQPNs82X29+1LzXgmERaCG2WG9xzOIJy5DFZuWyKlmnWP2WppaRlgrLbZbtloNW9lZJVkus9lndsaZa+1hnWq+3brXut7GwmWQzz6be5g9biq2Prch2o+0Z2zd29nYpdt/aNdk9tjey59oX29fb33agOwQ55DvUOlxxJDr6OOY4bnbscEKdPJ1ETtVOF51RZy9nsfNm584xhDG+YyRjasdcd6G5sF0KXepd7o1ljo0eu2Rs09hn42zGpY1bM+7MuE+unq65rjtcb7npu010W+LW4vbC3cmd717tfsWD7hHusdCj2eP5eOfxwvFbxt/wZHhO8vzWs9Xzo5e3l8yrwavX28Y73bvG+7qPgU+czwqfs74E3xDfhb6Hfd/5efkV+O33+8vfxT/Hf4//4wn2E4QTdkzoDrAK4AVsC+gKZAWmB34f2BVkGcQLqg26H2wdLAjeGfyI7cjOZu9lPwtxDZGFHAx5w/HjzOccD8VCI0LLQtvD9MOSwqrC7oZbhWeF14f3R3hGzI04HkmIjIpcE3mda8blc+u4/RO9J86feCqKFpUQVRV1P9opWhbdMgmdNHHSukm3Y2xjJDFNsSCWG7su9k6cfVx+3K+TiZPjJldPfhjvFj8v/kwCI2Fmwp6E14khiasSbyU5JCmSWpN1kqcl1yW/SQlNWZvSNWXclPlTLqSapIpTm9NIaclpO9MGpoZN3TC1Z5rntNJp16bbTy+afm6GyYzcGUdm6szkzTyQTkhPSd+T/oEXy6vlDWRwM2oy+vkc/kb+U0GwYL2gVxggXCt8lBmQuTbzcVZA1rqsXlGQqELUJ+aIq8TPsyOzt2a/yYnN2ZUzlJuSuy+PnJeed0iiL8mRnJplPqtoVqfUWVoq7cr3y9+Q3y+Lku2UI/Lp8uYCA7hhb1M4KL5R3CsMLKwufDs7efaBIr0iSVHbHKc5y+c8Kg4v/mEuPpc/t3We5bzF8+7NZ8/ftgBZkLGgdaH1wpKFPYsiFu1eTF2cs/j3Ja5L1i55tTRlaUuJWcmiku5vIr6pL9UulZVe/9b/263L8GXiZe3LPZZvWv6pTFB2vty1vKL8wwr+ivPfuX1X+d3QysyV7au8Vm1ZTVwtWX1tTdCa3Wv11hav7V43aV3jetb6svWvNszccK5ifMXWjdSNio1dldGVzZtsNq3e9KFKVHW1OqR6X41pzfKaN5sFmy9tCd7SsNVsa/nW99+Lv7+xLWJbY61dbcV24vbC7Q93JO8484PPD3U7TXaW7/y4S7Kra3f87lN13nV1e0z3rKpH6xX1vXun7e34MfTH5gaXhm37mPvKfwI/KX568nP6z9f2R+1vPeBzoOEX219qDjIOljUijXMa+5tETV3Nqc2dhyYeam3xbzn469hfdx22PFx9xPDIqqPUoyVHh44VHxs4Lj3edyLrRHfrzNZbJ6ecvHJq8qn201Gnz/4W/tvJM+wzx84GnD18zu/cofM+55sueF1obPNsO/i75+8H273aGy96X2zu8O1o6ZzQefRS0KUTl0Mv/3aFe+XC1ZirndeSrt24Pu161w3Bjcc3c28+/6Pwj8Fbi24Tbpfd0b1Tcdf0bu2/HP+1r8ur68i90Htt9xPu3+rmdz99IH/woafkIf1hxSOLR3WP3R8f7g3v7Xgy9UnPU+nTwb7SP/X+rHnm8OyXv4L/auuf0t/zXPZ86MWKl8Yvd70a/6p1IG7g7uu814Nvyt4av939zufdmfcp7x8Nzv5A+lD50fFjy6eoT7eH8oaGpDwZT7UVwOBAMzMBeLELAHoq3Dt0AECdqj7nqQRRn01VCPwnrD4LqsQLgF3BACQtAiAa7lG2wGELMQ3elVv1xGCAeniMDI3IMz3c1Vw0eOIhvB0aemkGAKkFgI+yoaHBzUNDH3fAZG8CcDxffb5UChGeDb53VKL2Nir4Wv4Na/x+WJaw05wAABCnaVRYdFhNTDpjb20uYWRvYmUueG1wAAAAAAA8P3hwYWNrZXQgYmVnaW49Iu+7vyIgaWQ9Ilc1TTBNcENlaGlIenJlU3pOVGN6a2M5ZCI/Pgo8eDp4bXBtZXRhIHhtbG5zOng9ImFkb2JlOm5zOm1ldGEvIiB4OnhtcHRrPSJYTVAgQ29yZSA0LjQuMC1FeGl2MiI+CiA8cmRmOlJERiB4bWxuczpyZGY9Imh0dHA6Ly93d3cudzMub3JnLzE5OTkvMDIvMjItcmRmLXN5bnRheC1ucyMiPgogIDxyZGY6RGVzY3JpcHRpb24gcmRmOmFib3V0PSIiCiAgICB4bWxuczppcHRjRXh0PSJodHRwOi8vaXB0Yy5vcmcvc3RkL0lwdGM0eG1wRXh0LzIwMDgtMDItMjkvIgogICAgeG1sbnM6eG1wTU09Imh0dHA6Ly9ucy5hZG9iZS5jb20veGFwLzEuMC9tbS8iCiAgICB4bWxuczpzdEV2dD0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wL3NUeXBlL1Jlc291cmNlRXZlbnQjIgogICAgeG1sbnM6cGx1cz0iaHR0cDovL25zLnVzZXBsdXMub3JnL2xkZi94bXAvMS4wLyIKICAgIHhtbG5zOkdJTVA9Imh0dHA6Ly93d3cuZ2ltcC5vcmcveG1wLyIKICAgIHhtbG5zOmRjPSJodHRwOi8vcHVybC5vcmcvZGMvZWxlbWVudHMvMS4xLyIKICAgIHhtbG5zOmV4aWY9Imh0dHA6Ly9ucy5hZG9iZS5jb20vZXhpZi8xLjAvIgogICAgeG1sbnM6eG1wPSJodHRwOi8vbnMuYWRvYmUuY29tL3hhcC8xLjAvIgogICB4bXBNTTpEb2N1bWVudElEPSJnaW1wOmRvY2lkOmdpbXA6MTBiMjY5Y2UtNmU3NC00OGMzLWJlNTctNGYwYzUyMWZjM2M4IgogICB4bXBNTTpJbnN0YW5jZUlEPSJ4bXAuaWlkOmJhNTFjNTA1LTMwMzgtNDJmNS04Y2FhLTFhNDRkN2RmYmVlOCIKICAgeG1wTU06T3JpZ2luYWxEb2N1bWVudElEPSJ4bXAuZGlkOmM3Mjg1YTRjLWJhMTQtNDJhMi1hZGFjLTUzMjkyNWQyNThhNSIKICAgR0lNUDpBUEk9IjIuMCIKICAgR0lNUDpQbGF0Zm9ybT0iTWFjIE9TIgogICBHSU1QOlRpbWVTdGFtcD0iMTU1NjI5MDI2NTkxMzA4MiIKICAgR0lNUDpWZXJzaW9uPSIyLjEwLjgiCiAgIGRjOkZvcm1hdD0iaW1hZ2UvcG5nIgogICBleGlmOlBpeGVsWERpbWVuc2lvbj0iODUwIgogICBleGlmOlBpeGVsWURpbWVuc2lvbj0iODE0IgogICB4bXA6Q3JlYXRvclRvb2w9IkdJTVAgMi4xMCI+CiAgIDxpcHRjRXh0OkxvY2F0aW9uQ3JlYXRlZD4KICAgIDxyZGY6QmFnLz4KICAgPC9pcHRjRXh0OkxvY2F0aW9uQ3JlYXRlZD4KICAgPGlwdGNFeHQ6TG9jYXRpb25TaG93bj4KICAgIDxyZGY6QmFnLz4KICAgPC9pcHRjRXh0OkxvY2F0aW9uU2hvd24+CiAgIDxpcHRjRXh0OkFydHdvcmtPck9iamVjdD4KICAgIDxyZGY6QmFnLz4KICAgPC9pcHRjRXh0OkFydHdvcmtPck9iamVjdD4KICAgPGlwdGNFeHQ6UmVnaXN0cnlJZD4KICAgIDxyZGY6QmFnLz4KICAgPC9pcHRjRXh0OlJlZ2lzdHJ5SWQ+CiAgIDx4bXBNTTpIaXN0b3J5PgogICAgPHJkZjpTZXE+CiAgICAgPHJkZjpsaQogICAgICBzdEV2dDphY3Rpb249InNhdmVkIgogICAgICBzdEV2dDpjaGFuZ2VkPSIvIgogICAgICBzdEV2dDppbnN0YW5jZUlEPSJ4bXAuaWlkOmE5ZTY2YjdmLTAxZmYtNGM2MC1hMDc3LTZkZDU5NzNhNjQ1ZSIKICAgICAgc3RFdnQ6c29mdHdhcmVBZ2VudD0iR2ltcCAyLjEwIChNYWMgT1MpIgogICAgICBzdEV2dDp3aGVuPSIyMDE5LTA0LTI2VDA3OjIyOjEwLTA3OjAwIi8+CiAgICAgPHJkZjpsaQogICAgICBzdEV2dDphY3Rpb249InNhdmVkIgogICAgICBzdEV2dDpjaGFuZ2VkPSIvIgogICAgICBzdEV2dDppbnN0YW5jZUlEPSJ4bXAuaWlkOjk1ZjYzMjBlLTc5NWUtNDc0Ny05Mzk5LTA4OGVkMWEwOTdkNiIKICAgICAgc3RFdnQ6c29mdHdhcmVBZ2VudD0iR2ltcCAyLjEwIChNYWMgT1MpIgogICAgICBzdEV2dDp3aGVuPSIyMDE5LTA0LTI2VDA3OjUxOjA1LTA3OjAwIi8+CiAgICA8L3JkZjpTZXE+CiAgIDwveG1wTU06SGlzdG9yeT4KICAgPHBsdXM6SW1hZ2VTdXBwbGllcj4KICAgIDxyZGY6U2VxLz4KICAgPC9wbHVzOkltYWdlU3VwcGxpZXI+CiAgIDxwbHVzOkltYWdlQ3JlYXRvcj4KICAgIDxyZGY6U2VxLz4KICAgPC9wbHVzOkltYWdlQ3JlYXRvcj4KICAgPHBsdXM6Q29weXJpZ2h0T3duZXI+CiAgICA8cmRmOlNlcS8+CiAgIDwvcGx1czpDb3B5cmlnaHRPd25lcj4KICAgPHBsdXM6TGljZW5zb3I+CiAgICA8cmRmOlNlcS8+CiAgIDwvcGx1czpMaWNlbnNvcj4KICA8L3JkZjpEZXNjcmlwdGlvbj4KIDwvcmRmOlJERj4KPC94OnhtcG1ldGE+CiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAKPD94cGFja2V0IGVuZD0idyI/Plse1x4AAAAJcEhZcwAAFiUAABYlAUlSJPAAAAAHdElNRQfjBBoOMwUYv24CAAAAaklEQVQY00WPQRICMQzDJNOU//+XGXPoFq5xLCUAoL4CnRQm4ASYUCbYd6yT2hXqnGVhUt2RzhPYCWWl3KBenu0KuB+RTORA96O0Oz0oJvSKTk3WmSH7iPR2D/TX+D8jrBT2ORxcoB+EfgHQ4ChWY5o7QwAAAABJRU5ErkJggg==);
+                        background-image: url({ images["bottom-fade"] });
                         background-repeat: repeat-x;
                     }}
 
-                </style>
-                </head><body onload="onLoad();">
-
-<div id="top-fade"></div>
-<div id="bottom-fade"></div>
+"""
 
-<div id="transport">
-    <div class="controls">
-        <div class="nav">
-<a class="play">Play</a>
-<a class="pause">Pause</a>
-<a class="prev">Prev</a>
-<a class="next">Next</a>
-</div>
-<div class="sliderTrack">&nbsp;</div>
-<div class="slider">&nbsp;</div>
-<div class="status">
-Track:
-<span class="track">--</span>/<span class="tracks">--</span>
-Time:
-<span class="time">00:00</span>/<span class="totalTime">00:00</span>
-</div>
-</div>&nbsp;
+    def print_footer(self, track_count, track_info, div_info):
+        # pylint: disable=missing-function-docstring
+        # the player and other tools read this as data, rather than running
+        # it as script
+        track_data = json.dumps({
+            "tracks": track_count,
+            "trackList": self.timing_table(track_info),
+            "allDivs": self.timing_table(div_info),
+            "cues": self.cue_table(self.cues),
+            "virtual": self.options.virtual or self.chunks is not None,
+            "chunks": self.chunk_table(),
+            "keyPrefix": self.source_file_name,
+            "audioOffset": self.json_seconds(self.options.audio_offset),
+            "reloadUrl": self.options.live_reload,
+            "syncUrl": self.options.sync,
+        }, separators=(",", ":")).replace("</", "<\\/")
+
+        # the recording is only referenced, so it is fetched and streamed by
+        # the browser, and can be swapped without rebuilding
+        audio = ""
+        if self.options.audio is not None:
+            audio = (f'<audio id="audio" preload="auto" '
+                f'src="{html.escape(self.options.audio)}"></audio>')
+
+        self.sink.writeline(f"""
+<div class="scroll-buffer">&nbsp;</div>
 </div>
 
-<div class='libretto'>
-<div class="scroll-buffer">&nbsp;</div>
-                """)
+{ audio }
 
-        self.lines_since_blank = 9999
-
-        for track in libretto.tracks:
-            total_time += track.length
-            self.print_track_lines(track)
-        print("""
-<div class="scroll-buffer">&nbsp;</div>
-</div>
+<script type="application/json" id="track-data">
+{ track_data }
+</script>
 
 </body></html>
         """)
 
     def print_track_lines(self, track):
         # pylint: disable=missing-function-docstring
-        print(f"<div id='{track.track_number}' class='track'>")
+        self.current_div = self.div_count
+        self.div_count += 1
+
+        # virtual tracks ship their markup in an inert template, and are
+        # sized from their line count until the player materializes them.
+        # chunked tracks are the same, but their templates are fetched.
+        if self.chunks is not None:
+            self.page_sink.writeline(f"<div id='{track.track_number}' " +
+                f"class='track virtual' style='--lines: {len(track.lines)}'>" +
+                "</div>")
+            self.sink.writeline(
+                f"<template data-track='{track.track_number}'>")
+        elif self.options.virtual:
+            self.sink.writeline(f"<div id='{track.track_number}' " +
+                f"class='track virtual' style='--lines: {len(track.lines)}'>" +
+                "<template>")
+        else:
+            self.sink.writeline(
+                f"<div id='{track.track_number}' class='track'>")
 
         for line in track.lines:
             self.lines_since_blank += 1
@@ -1330,31 +2324,611 @@ Time:
                 self.enqueue_line(line)
 
         self.emit_queue()
-        print("</div>")
+        if self.chunks is not None:
+            self.sink.writeline("</template>")
+        elif self.options.virtual:
+            self.sink.writeline("</template></div>")
+        else:
+            self.sink.writeline("</div>")
 
         for subtrack in track.subtracks:
             self.print_track_lines(subtrack)
 
-def usage():
+class PageAssets:
+    # pylint: disable=missing-class-docstring
+    IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir, "img")
+    IMAGES = ("top-fade", "bottom-fade")
+
+    def __init__(self, minify=False):
+        self.files = {}
+
+        # the stylesheet refers to the images by name, so they come first
+        images = {}
+        for image in self.IMAGES:
+            images[image] = self.add(image, "png", self.read_image(image))
+
+        style = Libretto2Html.style_source(images)
+        script = Libretto2Html.script_source()
+        if minify:
+            style = Minifier.style(style)
+            script = Minifier.script(script)
+
+        self.style = self.add("libretto", "css", style.encode("utf-8"))
+        self.script = self.add("libretto", "js", script.encode("utf-8"))
+
+    @classmethod
+    def image_path(cls, image):
+        # pylint: disable=missing-function-docstring
+        return os.path.join(cls.IMAGE_DIR, image + ".png")
+
+    @classmethod
+    def read_image(cls, image):
+        # pylint: disable=missing-function-docstring
+        with open(cls.image_path(image), "rb") as opened_file:
+            return opened_file.read()
+
+    @classmethod
+    def image_data_urls(cls):
+        # pylint: disable=missing-function-docstring
+        return {image: "data:image/png;base64," +
+            base64.b64encode(cls.read_image(image)).decode("ascii")
+            for image in cls.IMAGES}
+
+    def add(self, stem, extension, data):
+        # pylint: disable=missing-function-docstring
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{extension}"
+        self.files[name] = data
+        return name
+
+    def write(self, directory, compress=False):
+        # pylint: disable=missing-function-docstring
+        # a name already on disk has the same content, so it's left alone
+        for name, data in self.files.items():
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                self.write_file(path, data)
+
+            # images are compressed already
+            if compress and not name.endswith(".png"):
+                for suffix, compressed in compress_data(data).items():
+                    if not os.path.exists(path + suffix):
+                        self.write_file(path + suffix, compressed)
+
+    @classmethod
+    def write_file(cls, path, data):
+        # pylint: disable=missing-function-docstring
+        # moved into place, so pages converted in parallel never see a
+        # partial asset
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as opened_file:
+            opened_file.write(data)
+        os.replace(temp_path, path)
+
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+def compress_data(data):
     # pylint: disable=missing-function-docstring
-    print(f"usage: {BIN} <libretto_file>")
+    compressed = {".gz": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        compressed[".br"] = brotli.compress(data)
 
-def main(argv):
+    return compressed
+
+def update_compressed(path, compress):
     # pylint: disable=missing-function-docstring
-    if len(argv) < 1:
-        usage()
-        return 1
+    # a static server would send a stale sibling in place of the new
+    # output, so they're rewritten or removed with every build
+    compressed = {}
+    if compress:
+        with open(path, "rb") as opened_file:
+            compressed = compress_data(opened_file.read())
+
+    for suffix in COMPRESSED_SUFFIXES:
+        if suffix in compressed:
+            with open(path + suffix, "wb") as opened_file:
+                opened_file.write(compressed[suffix])
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+class ChunkFiles:
+    # pylint: disable=missing-class-docstring
+    # chunks are named after their page, and fetched from next to it
+    SUFFIX = ".parts"
+
+    def __init__(self, output):
+        self.output = output
+        self.directory, name = os.path.split(output)
+        self.stem = os.path.splitext(name)[0]
+        self.paths = []
+        self.opened_file = None
 
-    file = argv[0]
-    loader = LibrettoLoader()
-    libretto = loader.load(file)
+    def name(self, index):
+        # pylint: disable=missing-function-docstring
+        return f"{self.stem}.part{index + 1}.html"
+
+    def start(self, index):
+        # pylint: disable=missing-function-docstring
+        self.close()
+        path = os.path.join(self.directory, self.name(index))
+        self.paths.append(path)
+        self.opened_file = open(path, "w")
+        return self.opened_file
+
+    def close(self):
+        # pylint: disable=missing-function-docstring
+        if self.opened_file is not None:
+            self.opened_file.close()
+            self.opened_file = None
+
+    def manifest_path(self):
+        # pylint: disable=missing-function-docstring
+        return self.output + self.SUFFIX
+
+    def recorded(self):
+        # pylint: disable=missing-function-docstring
+        try:
+            with open(self.manifest_path()) as opened_file:
+                names = json.load(opened_file)
+        except (OSError, ValueError):
+            return []
+
+        # only plain names next to the page, whatever the manifest says
+        return [name for name in names if isinstance(name, str) and
+            name == os.path.basename(name) and name not in ("", os.curdir,
+                os.pardir)]
+
+    def remove_stale(self):
+        # pylint: disable=missing-function-docstring
+        # a rebuild with fewer chunks (or none) leaves the old ones behind.
+        # only the chunks the last build recorded are removed, since another
+        # page's output can have a name just like a chunk's
+        written = {os.path.basename(path) for path in self.paths}
+        for name in self.recorded():
+            if name in written:
+                continue
+            for suffix in ("",) + COMPRESSED_SUFFIXES:
+                path = os.path.join(self.directory, name + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if written:
+            with open(self.manifest_path(), "w") as opened_file:
+                json.dump(sorted(written), opened_file)
+        elif os.path.exists(self.manifest_path()):
+            os.remove(self.manifest_path())
+
+class ConversionResult:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    def __init__(self, source, output):
+        self.source = source
+        self.output = output
+        self.cached = False
+        self.error = False
+        self.error_line_number = 0
+        self.error_line = None
+        self.error_message = None
+        self.stats = None
+
+    def describe_error(self):
+        # pylint: disable=missing-function-docstring
+        if self.error_line_number > 0:
+            return (f"Error at line {self.error_line_number}" +
+                f"[{self.error_message}]:{self.error_line}")
+
+        return f"Error [{self.error_message}]"
+
+def open_output(file):
+    # pylint: disable=missing-function-docstring
+    if file is None:
+        return contextlib.nullcontext(sys.stdout)
+
+    return open(file, "w")
+
+def generator_files():
+    # pylint: disable=missing-function-docstring
+    # everything that shapes the output: the page and player, the parser,
+    # the minifier and the images. stats and the build cache itself only
+    # watch or skip conversions, so they're left out
+    return [__file__, inspect.getfile(LibrettoLoader),
+        inspect.getfile(Minifier)] + \
+        [PageAssets.image_path(image) for image in PageAssets.IMAGES]
+
+def make_build_cache(force=False):
+    # pylint: disable=missing-function-docstring
+    return BuildCache(generator_files(), force)
+
+def convert(source, output, cache=None, parse_cache=None, options=None,
+    hooks=None, loader=None):
+    # pylint: disable=missing-function-docstring, too-many-arguments
+    # hooks turn on stats for the conversion, and are handed its result
+    stats = ConversionStats() if hooks is not None else None
+    with timed(stats, "other"):
+        result = run_conversion(source, output, cache, parse_cache, options,
+            stats, loader)
+
+    if stats is not None and not result.cached:
+        result.stats = stats.to_data()
+    if hooks is not None:
+        hooks.conversion_finished(result)
+
+    return result
+
+def run_conversion(source, output, cache, parse_cache, options, stats,
+    loader=None):
+    # pylint: disable=missing-function-docstring, too-many-arguments
+    result = ConversionResult(source, output)
+    options = options if options is not None else OutputOptions()
+    loader = loader if loader is not None else make_loader(parse_cache)
+
+    # stdin and stdout can't be compared against an earlier build
+    if source == "-" or output is None:
+        cache = None
+
+    try:
+        # assets are shared, so they're written even if the page is current
+        assets = None
+        if options.external_assets:
+            with timed(stats, "assets"):
+                assets = PageAssets(options.minify)
+                assets.write(os.path.dirname(output)
+                    if output is not None else os.curdir, options.compress)
+
+        if cache is not None:
+            with timed(stats, "cache"):
+                source_hash = BuildCache.hash_file(source)
+                current = cache.is_current(source, output, source_hash,
+                    options.to_data())
+            if current:
+                result.cached = True
+                return result
+
+        # a build without chunks still clears away the ones it recorded last
+        # time, but only a chunked build writes any
+        chunks = ChunkFiles(output) if output is not None else None
+        with open_source(source) as opened_file, \
+            open_output(output) as opened_output:
+            printer = Libretto2Html(source, OutputSink(opened_output),
+                options, chunks if options.chunked else None, stats)
+            try:
+                with timed(stats, "parse"):
+                    tracks = load_tracks(loader, source, opened_file)
+                if stats is not None:
+                    tracks = stats.timed_tracks(tracks)
+                printer.print_tracks(tracks)
+            finally:
+                if chunks is not None:
+                    chunks.close()
+
+        if chunks is not None:
+            with timed(stats, "compress"):
+                chunks.remove_stale()
+                for path in [output] + chunks.paths:
+                    update_compressed(path, options.compress)
+    except (OSError, UnicodeDecodeError) as error:
+        result.error = True
+        result.error_message = str(error)
+        return result
 
     if loader.error:
-        print(f"Error at line {loader.error_line_number}" +
-            f"[{loader.error_message}]:{loader.error_line}")
+        result.error = True
+        result.error_line_number = loader.error_line_number
+        result.error_message = loader.error_message
+        result.error_line = loader.error_line
+
+    # never cache a failed build, so its errors are reported on every run
+    if cache is not None:
+        with timed(stats, "cache"):
+            if result.error:
+                cache.invalidate(output)
+            else:
+                cache.store(source, output, source_hash, options.to_data(),
+                    output_files(output, chunks, assets))
+
+    return result
+
+def output_files(output, chunks, assets):
+    # pylint: disable=missing-function-docstring
+    # everything a page was written with besides itself, so a build only
+    # counts as current while all of it is still there
+    files = list(chunks.paths)
+    if chunks.paths:
+        files.append(chunks.manifest_path())
+    if assets is not None:
+        files.extend(os.path.join(os.path.dirname(output), name)
+            for name in assets.files)
+
+    return files + [path + suffix for path in [output] + files
+        for suffix in COMPRESSED_SUFFIXES if os.path.exists(path + suffix)]
+
+def convert_job(job):
+    # pylint: disable=missing-function-docstring
+    # hooks stay in the calling process, so workers only collect the stats
+    source, output, cache, parse_cache, options, collect_stats = job
+    return convert(source, output, cache, parse_cache, options,
+        ConversionHooks() if collect_stats else None)
+
+def expand_sources(sources, pattern):
+    # pylint: disable=missing-function-docstring
+    expanded = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            expanded.extend(sorted(glob.glob(os.path.join(source, pattern))))
+        elif glob.has_magic(source):
+            expanded.extend(sorted(glob.glob(source)))
+        else:
+            expanded.append(source)
+
+    return expanded
+
+def output_path(source, output_dir):
+    # pylint: disable=missing-function-docstring
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(output_dir, stem + ".html")
+
+def unique_sources(sources):
+    # pylint: disable=missing-function-docstring
+    # a source can be named twice, say by its directory and by a pattern,
+    # but it's only converted once
+    seen = set()
+    unique = []
+    for source in sources:
+        key = os.path.realpath(source)
+        if key not in seen:
+            seen.add(key)
+            unique.append(source)
+
+    return unique
+
+def duplicate_outputs(sources, output_dir):
+    # pylint: disable=missing-function-docstring
+    outputs = {}
+    for source in unique_sources(sources):
+        outputs.setdefault(output_path(source, output_dir), []).append(source)
+
+    return {output: named for output, named in outputs.items()
+        if len(named) > 1}
+
+def describe_duplicates(duplicates):
+    # pylint: disable=missing-function-docstring
+    return "\n".join(f"{output} would be written by each of "
+        f"{', '.join(named)}" for output, named in duplicates.items())
+
+def convert_batch(sources, output_dir, jobs=None, cache=None,
+    parse_cache=None, options=None, hooks=None):
+    # pylint: disable=missing-function-docstring, too-many-arguments
+    # sources with the same name would overwrite each other's output, or
+    # race to write it, so the batch is refused before anything is written
+    sources = unique_sources(sources)
+    duplicates = duplicate_outputs(sources, output_dir)
+    if duplicates:
+        raise ValueError(describe_duplicates(duplicates))
+
+    os.makedirs(output_dir, exist_ok=True)
+    work = [(source, output_path(source, output_dir), cache, parse_cache,
+        options, hooks is not None) for source in sources]
+
+    # a single worker runs in process, which keeps tracebacks readable
+    if jobs == 1:
+        results = [convert_job(job) for job in work]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs) as executor:
+            results = list(executor.map(convert_job, work))
+
+    # workers only see a copy of the cache, so count in this process
+    if cache is not None:
+        for result in results:
+            cache.count(result.cached)
+
+    if hooks is not None:
+        for result in results:
+            hooks.conversion_finished(result)
+
+    return results
+
+def report_batch(results, cache=None):
+    # pylint: disable=missing-function-docstring
+    failures = 0
+
+    for result in results:
+        if result.error:
+            failures += 1
+            print(f"{result.source}: {result.describe_error()}", file=sys.stderr)
 
-    printer = Libretto2Html(file)
-    printer.print(libretto)
+    print(f"Converted {len(results) - failures} of {len(results)} files")
+    if cache is not None:
+        print(f"Cache: {cache.hits} up to date, {cache.misses} rebuilt")
+
+    return failures
+
+def parse_args(argv):
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(prog=BIN,
+        description="Convert libretto source files into autoscrolling html.")
+    parser.add_argument("sources", nargs="+",
+        help="libretto source file, or - for stdin, optionally followed by "
+            "an html output file. With --output-dir, any number of source "
+            "files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir",
+        help="convert every source into an html file in this directory")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+        help="number of worker processes for --output-dir "
+            "(default: one per cpu)")
+    parser.add_argument("--pattern", default="*.txt",
+        help="glob used to find sources in directories (default: *.txt)")
+    parser.add_argument("--force", action="store_true",
+        help="rebuild outputs even if their sources are unchanged")
+    parser.add_argument("--no-cache", action="store_true",
+        help="don't read or write build cache records")
+    parser.add_argument("--parse-cache", metavar="DIR",
+        help="reuse parsed libretti saved in this directory")
+    parser.add_argument("--virtual", action="store_true",
+        help="only build the page for tracks near the playback position, "
+            "for very long libretti")
+    parser.add_argument("--chunked", action="store_true",
+        help="like --virtual, but write the tracks of each scene to a "
+            "separate file that the player fetches as playback nears it")
+    parser.add_argument("--external-assets", action="store_true",
+        help="write the player script, styles and images as shared files "
+            "next to the html, instead of into every page")
+    parser.add_argument("--minify", action="store_true",
+        help="leave indentation, blank lines and comments out of the html, "
+            "styles and script")
+    parser.add_argument("--compress", action="store_true",
+        help="also write gzip (and brotli, when installed) compressed "
+            "copies of each output, for serving precompressed")
+    parser.add_argument("--watch", action="store_true",
+        help="after converting, keep running and convert sources again "
+            "whenever they change")
+    parser.add_argument("--debounce", metavar="SECONDS", type=float,
+        default=0.02,
+        help="with --watch, how long a source has to stop changing before "
+            "it is converted (default: 0.02)")
+    parser.add_argument("--stats", nargs="?", const="text",
+        choices=["text", "json"],
+        help="print the time spent in each stage of every conversion, with "
+            "line counts and peak memory, to stderr as text or json lines")
+    parser.add_argument("--profile", metavar="FILE",
+        help="run under cProfile, save the profile to this file and print "
+            "the most expensive calls. Implies --jobs 1")
+    parser.add_argument("--audio", metavar="FILE",
+        help="follow this recording while it plays, rather than a clock. "
+            "The path is used as is, so make it relative to the html")
+    parser.add_argument("--audio-offset", metavar="SECONDS", type=float,
+        default=0,
+        help="time in the recording where the libretto starts (default: 0)")
+    parser.add_argument("--sync", metavar="URL",
+        help="follow the position shared in a room of a sync hub, given as "
+            "http://<hub>:<port>/<room>. The page opened with #conduct on "
+            "the end of its address leads the others")
+
+    args = parser.parse_args(argv)
+
+    if args.output_dir is None and len(args.sources) > 2:
+        parser.error("multiple sources require --output-dir")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.compress and args.output_dir is None and len(args.sources) < 2:
+        parser.error("--compress requires an html output file")
+    if args.chunked and args.output_dir is None and len(args.sources) < 2:
+        parser.error("--chunked requires an html output file")
+    if args.watch and args.output_dir is None and len(args.sources) < 2:
+        parser.error("--watch requires an html output file")
+    if args.watch and "-" in args.sources:
+        parser.error("--watch can't read from stdin")
+    if args.watch and args.parse_cache is not None:
+        parser.error("--watch keeps each parse in memory, so it can't be "
+            "used with --parse-cache")
+
+    return args
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    args = parse_args(argv)
+    if args.profile is None:
+        return run(args)
+
+    # workers would be profiled in their own processes, if at all
+    args.jobs = 1
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(run, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+            pstats.SortKey.CUMULATIVE).print_stats(25)
+
+def run(args):
+    # pylint: disable=missing-function-docstring
+    cache = None if args.no_cache else make_build_cache(args.force)
+    hooks = StatsReporter(args.stats) if args.stats is not None else None
+    options = OutputOptions(virtual=args.virtual,
+        external_assets=args.external_assets, minify=args.minify,
+        compress=args.compress, audio=args.audio,
+        audio_offset=args.audio_offset, chunked=args.chunked,
+        sync=args.sync)
+
+    if args.output_dir is not None:
+        sources = expand_sources(args.sources, args.pattern)
+        try:
+            results = convert_batch(sources, args.output_dir, args.jobs,
+                cache, args.parse_cache, options, hooks)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        failures = report_batch(results, cache)
+        if args.watch:
+            return watch(args, cache, options, hooks)
+        return 1 if failures > 0 else 0
+
+    file = args.sources[0]
+    output_file = args.sources[1] if len(args.sources) > 1 else None
+    result = convert(file, output_file, cache, args.parse_cache, options,
+        hooks)
+
+    if result.error:
+        print(result.describe_error(), file=sys.stderr)
+
+    if args.watch:
+        return watch(args, cache, options, hooks)
+
+    return 0
+
+def watch(args, cache, options, hooks):
+    # pylint: disable=missing-function-docstring
+    # everything stays loaded between conversions, and each source keeps
+    # its parse, so a change only costs parsing the tracks around the edit
+    # and rendering the page again
+    loaders = {}
+
+    def list_sources():
+        if args.output_dir is not None:
+            return unique_sources(expand_sources(args.sources, args.pattern))
+        return [args.sources[0]]
+
+    def rebuild(source):
+        output = (output_path(source, args.output_dir)
+            if args.output_dir is not None else args.sources[1])
+
+        # a source can turn up with the same name as one already converted
+        if args.output_dir is not None:
+            duplicates = duplicate_outputs(list_sources(), args.output_dir)
+            if output in duplicates:
+                print(describe_duplicates({output: duplicates[output]}),
+                    file=sys.stderr, flush=True)
+                return
+
+        loader = loaders.setdefault(source, IncrementalLibrettoLoader())
+        start = time.perf_counter()
+        result = convert(source, output, cache, None, options, hooks,
+            loader)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if result.error:
+            print(f"{source}: {result.describe_error()}", file=sys.stderr,
+                flush=True)
+        elif result.cached:
+            print(f"{source}: unchanged", flush=True)
+        else:
+            print(f"{source}: converted to {output} in {elapsed:.0f} ms",
+                flush=True)
+
+    # parsed up front, so even the first edit is only parsed around it
+    for source in list_sources():
+        loader = loaders.setdefault(source, IncrementalLibrettoLoader())
+        try:
+            loader.load(source)
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    watcher = SourceWatcher(list_sources, debounce=args.debounce)
+    print("Watching for changes, press Ctrl-C to stop", flush=True)
+    try:
+        watcher.run(rebuild)
+    except KeyboardInterrupt:
+        pass
 
     return 0
 
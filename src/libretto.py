@@ -1,11 +1,20 @@
 # pylint: disable=missing-module-docstring
 
 from __future__ import print_function
+import argparse
+import array
+import bisect
+import contextlib
 import datetime
+import gc
+import hashlib
+import json
 import re
 import sys
 import os
 
+from src.build_cache import BuildCache
+
 BIN = None
 
 class OutVal:
@@ -69,15 +78,158 @@ class ParseMode:
     INSCENE = 3
     INLYRIC = 4
 
+class LineClassifier:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+
+    # each parse mode gets a single alternation, tried in the same order as
+    # the original search cascade, and every alternation ends in a catch-all,
+    # so a line is matched exactly once and the winning group names the kind
+    SKIP = r"(?P<skip>$)"
+    BLANK = r"(?P<blank>$)"
+    END_BLOCK = r"(?P<end_block>$)"
+    SCENE = r"(?P<scene>[A-Z0-9 ]+$|[A-Z0-9 ]+:.*$)"
+    TRACK = (r"(?P<track>\[(?P<track_number>\d+),(?P<track_minutes>\d+):"
+        r"(?P<track_seconds>\d+(?:\.\d+)?)\](?P<track_rest>.*))")
+    SUBTRACK = (r"(?P<subtrack>\[(?P<subtrack_minutes>\d+):"
+        r"(?P<subtrack_seconds>\d+(?:\.\d+)?)\](?P<subtrack_rest>.*))")
+    CHARACTER = r"(?P<character>(?P<character_name>[^:]+):$)"
+    CHARACTER_EMOTE = (r"(?P<character_emote>(?P<character_emote_name>[^:]+): "
+        r"\[(?P<character_emote_text>.*)\]$)")
+    EMOTE = r"(?P<emote>\[(?P<emote_text>.*)\]$)"
+    MALFORMED_EMOTE = r"(?P<malformed_emote>\[[^]]*$)"
+    STAGING = r"(?P<staging>.{41,})"
+    LYRIC = r"(?P<lyric>.*)"
+    SDETAILS = r"(?P<sdetails>.*)"
+    UNEXPECTED = r"(?P<unexpected>.*)"
+
+    patterns = {
+        ParseMode.BEGIN: re.compile("|".join([
+            SKIP, TRACK, UNEXPECTED])),
+        ParseMode.INTRACK: re.compile("|".join([
+            SCENE, BLANK, TRACK, SUBTRACK, CHARACTER, CHARACTER_EMOTE, EMOTE,
+            MALFORMED_EMOTE, STAGING, LYRIC])),
+        ParseMode.INSCENE: re.compile("|".join([
+            END_BLOCK, SDETAILS])),
+        ParseMode.INLYRIC: re.compile("|".join([
+            END_BLOCK, TRACK, SUBTRACK, EMOTE, LYRIC])),
+    }
+
+    # a cue marker, e.g. {1:23.5}, can start any line to time it against
+    # the start of its track
+    CUE = re.compile(r"\{(\d+):(\d+(?:\.\d+)?)\}\s*")
+
+    @classmethod
+    def split_cue(cls, line):
+        # pylint: disable=missing-function-docstring
+        if not line.startswith("{"):
+            return None, line
+
+        match = cls.CUE.match(line)
+        if match is None:
+            return None, line
+
+        cue = int(match.group(1)) * 60 + float(match.group(2))
+        return cue, line[match.end():]
+
+    @classmethod
+    def classify(cls, parse_mode, line):
+        # pylint: disable=missing-function-docstring
+        pattern = cls.patterns.get(parse_mode)
+        if pattern is None:
+            return None
+
+        return pattern.match(line)
+
 class Line:
     # pylint: disable=missing-class-docstring, too-few-public-methods
-    def __init__(self, line_type, text=None, subtext=None):
+    __slots__ = ("type", "text", "subtext", "cue")
+
+    def __init__(self, line_type, text=None, subtext=None, cue=None):
         self.type = line_type
         self.text = text
         self.subtext = subtext
+        self.cue = cue
+
+class StringTable:
+    # pylint: disable=missing-class-docstring
+    def __init__(self):
+        # index 0 stands in for missing text
+        self.strings = [None]
+        self.indices = {}
+
+    def add(self, text):
+        # pylint: disable=missing-function-docstring
+        if text is None:
+            return 0
+
+        if self.indices is None:
+            self.indices = {string: index
+                for index, string in enumerate(self.strings) if index > 0}
+
+        index = self.indices.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.indices[text] = index
+            self.strings.append(text)
+
+        return index
+
+    def get(self, index):
+        # pylint: disable=missing-function-docstring
+        return self.strings[index]
+
+    def freeze(self):
+        # pylint: disable=missing-function-docstring
+        # drop the lookup once nothing else will be added, as it costs about
+        # as much as the strings themselves
+        self.indices = None
+
+class TrackLines:
+    # pylint: disable=missing-class-docstring
+    def __init__(self, strings=None, lines=()):
+        self.strings = strings if strings is not None else StringTable()
+        self.types = array.array("B")
+        self.texts = array.array("I")
+        self.subtexts = array.array("I")
+        # few lines have cues, so they're kept by index
+        self.cues = {}
+
+        for line in lines:
+            self.append(line)
+
+    def append(self, line):
+        # pylint: disable=missing-function-docstring
+        if line.cue is not None:
+            self.cues[len(self.types)] = line.cue
+
+        self.types.append(line.type)
+        self.texts.append(self.strings.add(line.text))
+        self.subtexts.append(self.strings.add(line.subtext))
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        strings = self.strings.strings
+        if index < 0:
+            index += len(self.types)
+
+        return Line(self.types[index], strings[self.texts[index]],
+            strings[self.subtexts[index]], self.cues.get(index))
+
+    def __iter__(self):
+        # lines are rebuilt on the fly, so only one is alive at a time
+        strings = self.strings.strings
+        cues = self.cues
+        for index, (line_type, text, subtext) in enumerate(zip(self.types,
+            self.texts, self.subtexts)):
+            yield Line(line_type, strings[text], strings[subtext],
+                cues.get(index))
 
 class Track:
     # pylint: disable=missing-class-docstring
+    __slots__ = ("track_number", "length", "lines", "subtracks", "parent")
+
     def __init__(self, track_number=0, minutes=0, seconds=0):
         self.track_number = track_number
         self.length = datetime.timedelta(minutes=minutes, seconds=seconds)
@@ -98,9 +250,18 @@ class Track:
         track.parent = self
         self.subtracks.append(track)
 
+    def compact(self, strings=None):
+        # pylint: disable=missing-function-docstring
+        if strings is None:
+            strings = StringTable()
+
+        self.lines = TrackLines(strings, self.lines)
+        for subtrack in self.subtracks:
+            subtrack.compact(strings)
+
 class LibrettoLoader:
     # pylint: disable=missing-class-docstring, too-many-instance-attributes
-    def __init__(self):
+    def __init__(self, use_classifier=True):
         self.filename = None
         self.libretto = None
         self.parse_mode = None
@@ -112,12 +273,53 @@ class LibrettoLoader:
         self.error_line = None
         self.error_message = None
         self.line_number = 0
+        self.cue = None
+        self.use_classifier = use_classifier
+
+        self.line_dispatch_table = {
+            "skip": self._on_skip,
+            "blank": self._on_blank,
+            "end_block": self._on_end_block,
+            "scene": self._on_scene,
+            "track": self._on_track,
+            "subtrack": self._on_subtrack,
+            "character": self._on_character,
+            "character_emote": self._on_character_emote,
+            "emote": self._on_emote,
+            "malformed_emote": self._on_malformed_emote,
+            "staging": self._on_staging,
+            "lyric": self._on_lyric,
+            "sdetails": self._on_sdetails,
+            "unexpected": self._on_unexpected,
+        }
 
     def load(self, filename):
         # pylint: disable=missing-function-docstring
         self.filename = filename
         return self._do_load()
 
+    def iter_tracks(self, fileobj):
+        # pylint: disable=missing-function-docstring
+        self._reset_parse_state()
+        self.tracks = []
+
+        for line in fileobj:
+            self.line_number += 1
+
+            # trim any whitespace
+            line = line.strip()
+            end = self._process_line(line)
+
+            # a new top level track closes every track before it
+            while len(self.tracks) > 1:
+                yield self.tracks.pop(0)
+
+            if end:
+                break
+
+        while len(self.tracks) > 0:
+            yield self.tracks.pop(0)
+
     def _reset_parse_state(self):
         # pylint: disable=missing-function-docstring
         self.parse_mode = ParseMode.BEGIN
@@ -128,18 +330,10 @@ class LibrettoLoader:
 
     def _do_load(self):
         # pylint: disable=missing-function-docstring
-        self._reset_parse_state()
-
         with open(self.filename) as opened_file:
-            for line in opened_file:
-                self.line_number += 1
-
-                # trim any whitespace
-                line = line.strip()
-                end = self._process_line(line)
-                if end:
-                    break
+            tracks = list(self.iter_tracks(opened_file))
 
+        self.tracks = tracks
         self.libretto = Libretto(self.tracks)
         return self.libretto
 
@@ -149,32 +343,32 @@ class LibrettoLoader:
             self.parse_mode = ParseMode.INTRACK
             return self._process_blank()
 
-        self.current_track.add_line(Line(LineType.SDETAILS, line))
+        self.current_track.add_line(Line(LineType.SDETAILS, line, cue=self.cue))
         return self.error
 
 
     def _process_scene(self, text):
         self.parse_mode = ParseMode.INSCENE
-        line = Line(LineType.SCENE, text)
+        line = Line(LineType.SCENE, text, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
 
     def _process_staging(self, text):
-        line = Line(LineType.STAGING, text)
+        line = Line(LineType.STAGING, text, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
 
     def _process_blank(self):
-        line = Line(LineType.BLANK)
+        line = Line(LineType.BLANK, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
 
     def _process_character(self, name, emote=None):
         self.parse_mode = ParseMode.INLYRIC
-        line = Line(LineType.CHARACTER, name, emote)
+        line = Line(LineType.CHARACTER, name, emote, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
@@ -225,17 +419,16 @@ class LibrettoLoader:
 
     def _process_trackline(self, track, minutes, seconds, line):
         track_number = int(track)
-        track = Track(track_number, int(minutes), int(seconds))
+        track = Track(track_number, int(minutes), float(seconds))
         self.track = track_number
         self.tracks.append(track)
         self.current_track = track
 
         # if we found the track mid lyric, stay in lyric mode
-        if self.parse_mode == ParseMode.INLYRIC:
-            return self._process_inlyric(line)
+        if self.parse_mode != ParseMode.INLYRIC:
+            self.parse_mode = ParseMode.INTRACK
 
-        self.parse_mode = ParseMode.INTRACK
-        return self._process_intrack(line)
+        return self._process_line(line)
 
     def _process_subtrackline(self, minutes, seconds, line):
         # addd this subtrack, but if the current track is already a subtrack,
@@ -245,17 +438,16 @@ class LibrettoLoader:
 
         subtrack_id = len(self.current_track.subtracks)
         track = Track(f"{self.current_track.track_number}.{subtrack_id}",
-            int(minutes), int(seconds))
+            int(minutes), float(seconds))
 
         self.current_track.add_subtrack(track)
         self.current_track = track
 
         # if we found the track mid lyric, stay in lyric mode
-        if self.parse_mode == ParseMode.INLYRIC:
-            return self._process_inlyric(line)
+        if self.parse_mode != ParseMode.INLYRIC:
+            self.parse_mode = ParseMode.INTRACK
 
-        self.parse_mode = ParseMode.INTRACK
-        return self._process_intrack(line)
+        return self._process_line(line)
 
     def _process_begin(self, line):
         outval = OutVal()
@@ -277,7 +469,7 @@ class LibrettoLoader:
         # pylint: disable=missing-function-docstring
         match_out_value = OutVal()
         does_match = SearchConditional.search(match_out_value,
-            r"^\[(\d+),(\d+):(\d+)\](.*)", line)
+            r"^\[(\d+),(\d+):(\d+(?:\.\d+)?)\](.*)", line)
         if does_match:
             match = match_out_value.value
             outval.value = self._process_trackline(match.group(1),
@@ -289,7 +481,7 @@ class LibrettoLoader:
         # pylint: disable=missing-function-docstring
         match_out_value = OutVal()
         does_match = SearchConditional.search(match_out_value,
-            r"^\[(\d+):(\d+)\](.*)", line)
+            r"^\[(\d+):(\d+(?:\.\d+)?)\](.*)", line)
         if does_match:
             match = match_out_value.value
             outval.value = self._process_subtrackline(match.group(1),
@@ -315,14 +507,14 @@ class LibrettoLoader:
 
     def _process_emote(self, text):
         self.parse_mode = ParseMode.INLYRIC
-        line = Line(LineType.EMOTE, text)
+        line = Line(LineType.EMOTE, text, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
 
     def _process_lyric(self, text):
         self.parse_mode = ParseMode.INLYRIC
-        line = Line(LineType.LYRIC, text)
+        line = Line(LineType.LYRIC, text, cue=self.cue)
         self.current_track.add_line(line)
 
         return self.error
@@ -355,7 +547,79 @@ class LibrettoLoader:
         self.error_line_number = line_number
         self.error_line = line
 
+    def _on_skip(self, _match):
+        return self.error
+
+    def _on_blank(self, _match):
+        return self._process_blank()
+
+    def _on_end_block(self, _match):
+        self.parse_mode = ParseMode.INTRACK
+        return self._process_blank()
+
+    def _on_scene(self, match):
+        return self._process_scene(match.string)
+
+    def _on_track(self, match):
+        return self._process_trackline(match.group("track_number"),
+            match.group("track_minutes"), match.group("track_seconds"),
+            match.group("track_rest").strip())
+
+    def _on_subtrack(self, match):
+        return self._process_subtrackline(match.group("subtrack_minutes"),
+            match.group("subtrack_seconds"),
+            match.group("subtrack_rest").strip())
+
+    def _on_character(self, match):
+        return self._process_character(match.group("character_name"))
+
+    def _on_character_emote(self, match):
+        return self._process_character(match.group("character_emote_name"),
+            match.group("character_emote_text"))
+
+    def _on_emote(self, match):
+        return self._process_emote(match.group("emote_text"))
+
+    def _on_malformed_emote(self, match):
+        self._set_error("malformed emote", self.line_number, match.string)
+        return self.error
+
+    def _on_staging(self, match):
+        return self._process_staging(match.string)
+
+    def _on_lyric(self, match):
+        return self._process_lyric(match.string)
+
+    def _on_sdetails(self, match):
+        self.current_track.add_line(Line(LineType.SDETAILS, match.string,
+            cue=self.cue))
+        return self.error
+
+    def _on_unexpected(self, match):
+        self._set_error("unexpected input looking for track",
+            self.line_number, match.string)
+        return self.error
+
+    def _classify_line(self, line):
+        match = LineClassifier.classify(self.parse_mode, line)
+        if match is None:
+            return True
+
+        return self.line_dispatch_table[match.lastgroup](match)
+
     def _process_line(self, line):
+        # a cue is split off first, so both parsers see the same line
+        if line.startswith("{"):
+            self.cue, line = LineClassifier.split_cue(line)
+        else:
+            self.cue = None
+
+        if self.use_classifier:
+            return self._classify_line(line)
+
+        return self._search_line(line)
+
+    def _search_line(self, line):
         result = None
 
         if self.parse_mode == ParseMode.BEGIN:
@@ -377,15 +641,22 @@ class LibrettoPrinter:
         self.total_time = datetime.timedelta()
 
     def print(self, libretto):
+        # pylint: disable=missing-function-docstring
+        self.print_tracks(libretto.tracks)
+
+    def print_tracks(self, tracks):
         # pylint: disable=missing-function-docstring
         self.total_time = datetime.timedelta()
 
-        for track in libretto.tracks:
+        # only keep the summary, so tracks can be released as they print
+        summary = []
+        for track in tracks:
             self.print_track(track)
+            summary.append((track.track_number, track.length))
 
-        for track in libretto.tracks:
-            print(f"Track {track.track_number}, ({track.length})")
-        print(f"Tracks: {len(libretto.tracks)}")
+        for track_number, length in summary:
+            print(f"Track {track_number}, ({length})")
+        print(f"Tracks: {len(summary)}")
         print(f"Total time: {self.total_time}")
 
     def print_track(self, track):
@@ -398,6 +669,9 @@ class LibrettoPrinter:
 
         for track_line in track.lines:
             type_str = LineType.to_str(track_line.type)
+            if track_line.cue is not None:
+                cue = datetime.timedelta(seconds=track_line.cue)
+                type_str = f"{type_str} at {cue}"
 
             if track_line.text is None:
                 print(f"[{type_str}]")
@@ -414,26 +688,388 @@ class Libretto:
     def __init__(self, tracks):
         self.tracks = tracks
 
-def usage():
+    def compact(self):
+        # pylint: disable=missing-function-docstring
+        # every track shares one string table, so repeated names and text
+        # are only stored once
+        strings = StringTable()
+        for track in self.tracks:
+            track.compact(strings)
+
+        strings.freeze()
+        return self
+
+class LibrettoSerializer:
+    # pylint: disable=missing-class-docstring
+    FORMAT = "libretto"
+    VERSION = 2
+
+    # the first line is a json header, so it can be checked without reading
+    # the tracks, and the second line is the track tree as nested lists:
+    # [track_number, seconds, [[type, text, subtext(, cue)], ...],
+    #     [subtrack, ...]]
+
+    @classmethod
+    def track_to_data(cls, track):
+        # pylint: disable=missing-function-docstring
+        return [
+            track.track_number,
+            track.length.total_seconds(),
+            [[line.type, line.text, line.subtext] if line.cue is None else
+                [line.type, line.text, line.subtext, line.cue]
+                for line in track.lines],
+            [cls.track_to_data(subtrack) for subtrack in track.subtracks],
+        ]
+
+    @classmethod
+    def track_from_data(cls, data):
+        # pylint: disable=missing-function-docstring
+        track_number, seconds, lines, subtracks = data
+        track = Track(track_number, seconds=seconds)
+        track.lines = [Line(*line) for line in lines]
+
+        for subtrack in subtracks:
+            track.add_subtrack(cls.track_from_data(subtrack))
+
+        return track
+
+    @classmethod
+    def save(cls, libretto, fileobj, header=None):
+        # pylint: disable=missing-function-docstring
+        full_header = dict(header or {})
+        full_header["format"] = cls.FORMAT
+        full_header["version"] = cls.VERSION
+
+        json.dump(full_header, fileobj, separators=(",", ":"))
+        fileobj.write("\n")
+        json.dump([cls.track_to_data(track) for track in libretto.tracks],
+            fileobj, separators=(",", ":"))
+
+    @classmethod
+    def read_header(cls, fileobj):
+        # pylint: disable=missing-function-docstring
+        header = json.loads(fileobj.readline())
+
+        if (not isinstance(header, dict) or
+            header.get("format") != cls.FORMAT or
+            header.get("version") != cls.VERSION):
+            raise ValueError("unsupported libretto format")
+
+        return header
+
+    @classmethod
+    def read_libretto(cls, fileobj):
+        # pylint: disable=missing-function-docstring
+        # nothing allocated here is garbage yet, so skip the collector passes
+        # that a burst of new objects would otherwise trigger
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return Libretto([cls.track_from_data(track)
+                for track in json.load(fileobj)])
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    @classmethod
+    def load(cls, fileobj):
+        # pylint: disable=missing-function-docstring
+        cls.read_header(fileobj)
+        return cls.read_libretto(fileobj)
+
+class CachedLibrettoLoader(LibrettoLoader):
+    # pylint: disable=missing-class-docstring
+    SUFFIX = ".parsed"
+    parser_fingerprint = None
+
+    def __init__(self, cache_dir=None, use_classifier=True):
+        super().__init__(use_classifier)
+        self.cache_dir = cache_dir
+        self.cached = False
+        self.source_hash = None
+
+    @classmethod
+    def get_parser_fingerprint(cls):
+        # pylint: disable=missing-function-docstring
+        if cls.parser_fingerprint is None:
+            cls.parser_fingerprint = BuildCache.hash_files([__file__])
+
+        return cls.parser_fingerprint
+
+    def cache_path(self, filename):
+        # pylint: disable=missing-function-docstring
+        if self.cache_dir is None:
+            return filename + self.SUFFIX
+
+        # sources from different directories may share a name
+        full_path = os.path.abspath(filename)
+        key = hashlib.sha256(full_path.encode("utf-8")).hexdigest()[:16]
+        name = f"{os.path.basename(filename)}.{key}{self.SUFFIX}"
+        return os.path.join(self.cache_dir, name)
+
+    def load(self, filename):
+        # pylint: disable=missing-function-docstring
+        with open(filename) as opened_file:
+            return self.load_opened(filename, opened_file)
+
+    def load_opened(self, filename, opened_file):
+        # pylint: disable=missing-function-docstring
+        self.filename = filename
+        self._reset_parse_state()
+
+        stat = os.fstat(opened_file.fileno())
+        self.source_hash = None
+
+        self.libretto = self._read_cache(filename, stat)
+        self.cached = self.libretto is not None
+
+        if not self.cached:
+            source_hash = self._get_source_hash(filename)
+            self.libretto = Libretto(list(self.iter_tracks(opened_file)))
+
+            # never cache a failed parse, so its error is reported every time
+            if not self.error:
+                self._write_cache(filename, stat, source_hash)
+
+        self.tracks = self.libretto.tracks
+        return self.libretto
+
+    def _get_source_hash(self, filename):
+        if self.source_hash is None:
+            self.source_hash = BuildCache.hash_file(filename)
+
+        return self.source_hash
+
+    def _read_cache(self, filename, stat):
+        try:
+            with open(self.cache_path(filename)) as opened_file:
+                header = LibrettoSerializer.read_header(opened_file)
+                if header.get("parser") != self.get_parser_fingerprint():
+                    return None
+
+                # an untouched source is trusted without hashing it again
+                unchanged = (header.get("source_mtime_ns") == stat.st_mtime_ns
+                    and header.get("source_size") == stat.st_size)
+                if (not unchanged and header.get("source_hash") !=
+                    self._get_source_hash(filename)):
+                    return None
+
+                return LibrettoSerializer.read_libretto(opened_file)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _write_cache(self, filename, stat, source_hash):
+        path = self.cache_path(filename)
+        header = {
+            "parser": self.get_parser_fingerprint(),
+            "source_hash": source_hash,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_size": stat.st_size,
+        }
+
+        # write beside the final path and swap it in, so concurrent
+        # readers never see a partial cache file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w") as opened_file:
+                LibrettoSerializer.save(self.libretto, opened_file, header)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+class IncrementalLibrettoLoader(LibrettoLoader):
+    # pylint: disable=missing-class-docstring
+    # the only parser state that carries across a top level track header is
+    # the parse mode, since the header replaces the current track and
+    # subtracks are numbered within their track. the mode before each header
+    # is kept as a checkpoint, and an edit is parsed again from the last
+    # header before it, until a header after it is reached in the same mode
+    # as before, where the earlier tracks take over again.
+    def __init__(self, use_classifier=True):
+        super().__init__(use_classifier)
+        self.lines = []
+        self.starts = []
+        self.modes = []
+        self.parsed_lines = 0
+
+    def load(self, filename):
+        # pylint: disable=missing-function-docstring
+        self.filename = filename
+        with open(filename) as opened_file:
+            return self.load_opened(opened_file)
+
+    def load_opened(self, opened_file):
+        # pylint: disable=missing-function-docstring
+        return self.update_lines(opened_file.readlines())
+
+    def update_lines(self, lines):
+        # pylint: disable=missing-function-docstring
+        # the edit is whatever lies between the lines the old and new text
+        # start and end with
+        lines = [line.strip() for line in lines]
+        old_lines = self.lines
+
+        limit = min(len(old_lines), len(lines))
+        first = 0
+        while first < limit and old_lines[first] == lines[first]:
+            first += 1
+
+        last = 0
+        while last < limit - first and \
+            old_lines[-1 - last] == lines[-1 - last]:
+            last += 1
+
+        if self.libretto is not None and first == len(old_lines) == len(lines):
+            self.parsed_lines = 0
+            return self.libretto
+
+        return self.update(first, len(old_lines) - first - last,
+            lines[first:len(lines) - last])
+
+    def update(self, first, count, lines):
+        # pylint: disable=missing-function-docstring
+        # replaces count lines from the first (counted from 0) with lines
+        old = (self.tracks, self.starts, self.modes, self.error,
+            self.error_message, self.error_line_number, self.error_line)
+
+        lines = [line.strip() for line in lines]
+        self.lines[first:first + count] = lines
+        delta = len(lines) - count
+
+        # the last header up to the edit sees the same state as before, but
+        # an edited header might not be one any more, and then its lines
+        # belong to the track before it
+        restart = bisect.bisect_right(self.starts, first) - 1
+        while restart >= 0 and self.starts[restart] >= first and \
+            not self._opens_track(self.modes[restart],
+                self.lines[self.starts[restart]]):
+            restart -= 1
+
+        if restart < 0:
+            self._restart(ParseMode.BEGIN, [], [], [])
+            start = 0
+        else:
+            start = self.starts[restart]
+            self._restart(self.modes[restart], self.tracks[:restart],
+                self.starts[:restart], self.modes[:restart])
+
+        self._parse_from(start, first + len(lines), delta, old)
+        self.libretto = Libretto(self.tracks)
+        return self.libretto
+
+    @classmethod
+    def _opens_track(cls, parse_mode, line):
+        _, line = LineClassifier.split_cue(line)
+        match = LineClassifier.classify(parse_mode, line)
+        return match is not None and match.lastgroup == "track"
+
+    def _restart(self, parse_mode, tracks, starts, modes):
+        self._reset_parse_state()
+        self.parse_mode = parse_mode
+        self.tracks = tracks
+        self.starts = starts
+        self.modes = modes
+        self.error_message = None
+        self.error_line_number = 0
+        self.error_line = None
+
+    def _parse_from(self, start, converge_from, delta, old):
+        # pylint: disable=too-many-arguments
+        self.parsed_lines = 0
+        for index in range(start, len(self.lines)):
+            parse_mode = self.parse_mode
+            track_count = len(self.tracks)
+            self.line_number = index + 1
+            self.parsed_lines += 1
+            end = self._process_line(self.lines[index])
+
+            if len(self.tracks) > track_count:
+                if not end and index >= converge_from and \
+                    self._converge(index - delta, parse_mode, delta, old):
+                    return
+
+                self.starts.append(index)
+                self.modes.append(parse_mode)
+
+            if end:
+                break
+
+    def _converge(self, old_start, parse_mode, delta, old):
+        # pylint: disable=too-many-arguments
+        tracks, starts, modes, error, error_message, error_line_number, \
+            error_line = old
+
+        reuse = bisect.bisect_left(starts, old_start)
+        if reuse == len(starts) or starts[reuse] != old_start or \
+            modes[reuse] != parse_mode:
+            return False
+
+        # the header just parsed is the first of the reused tracks
+        self.tracks.pop()
+        self.tracks.extend(tracks[reuse:])
+        self.starts.extend(start + delta for start in starts[reuse:])
+        self.modes.extend(modes[reuse:])
+
+        # an error would have ended the earlier parse in its last track
+        self.error = error
+        if error:
+            self.error_message = error_message
+            self.error_line_number = error_line_number + delta
+            self.error_line = error_line
+
+        return True
+
+def open_source(file):
+    # pylint: disable=missing-function-docstring
+    # leave stdin open for the caller
+    if file == "-":
+        return contextlib.nullcontext(sys.stdin)
+
+    return open(file)
+
+def load_tracks(loader, file, opened_file):
+    # pylint: disable=missing-function-docstring
+    if isinstance(loader, CachedLibrettoLoader) and file != "-":
+        return loader.load_opened(file, opened_file).tracks
+
+    if isinstance(loader, IncrementalLibrettoLoader):
+        return loader.load_opened(opened_file).tracks
+
+    return loader.iter_tracks(opened_file)
+
+def make_loader(parse_cache=None):
     # pylint: disable=missing-function-docstring
-    print(f"usage: {BIN} <libretto_file>")
+    if parse_cache is None:
+        return LibrettoLoader()
+
+    os.makedirs(parse_cache, exist_ok=True)
+    return CachedLibrettoLoader(parse_cache)
+
+def parse_args(argv):
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(prog=BIN,
+        description="Print the parsed structure of a libretto source file.")
+    parser.add_argument("source", help="libretto source file, or - for stdin")
+    parser.add_argument("--parse-cache", metavar="DIR",
+        help="reuse parsed libretti saved in this directory")
+
+    return parser.parse_args(argv)
 
 def main(argv):
     # pylint: disable=missing-function-docstring
-    if len(argv) < 1:
-        usage()
-        return 1
+    args = parse_args(argv)
 
-    file = argv[0]
-    loader = LibrettoLoader()
-    libretto = loader.load(file)
+    file = args.source
+    loader = make_loader(args.parse_cache)
+
+    with open_source(file) as opened_file:
+        printer = LibrettoPrinter()
+        printer.print_tracks(load_tracks(loader, file, opened_file))
 
     if loader.error:
         print(f"Error at line {loader.error_line_number}" +
-            f"[{loader.error_message}]:{loader.error_line}")
-
-    printer = LibrettoPrinter()
-    printer.print(libretto)
+            f"[{loader.error_message}]:{loader.error_line}", file=sys.stderr)
 
     return 0
 
@@ -0,0 +1,100 @@
+# pylint: disable=missing-module-docstring
+
+import re
+
+class Minifier:
+    # pylint: disable=missing-class-docstring
+    # the generated script leaves out semicolons in places, so newlines are
+    # kept and only indentation, blank lines and comments are removed
+    SCRIPT_HIDING = ("<!--", "-->")
+    SCRIPT_TOKEN = re.compile(r"""[^"'`/]+|"(?:[^"\\\n]|\\.)*"|"""
+        r"""'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`|//[^\n]*|"""
+        r"""/\*.*?(?:\*/|\Z)|.""", re.DOTALL)
+    SCRIPT_REGEX = re.compile(
+        r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/")
+    SCRIPT_REGEX_AFTER = re.compile(
+        r"(?:^|[(,=:[!&|?{};]|\b(?:return|typeof|case|do|else|in|of))$")
+    CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+    CSS_SPACE = re.compile(r"\s+")
+    CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+    CSS_COLON = re.compile(r":\s+")
+
+    @classmethod
+    def markup(cls, text):
+        # pylint: disable=missing-function-docstring
+        # whitespace at the ends of a line collapses in html anyway
+        lines = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line and line not in cls.SCRIPT_HIDING:
+                lines.append(line)
+
+        return "\n".join(lines)
+
+    @classmethod
+    def script(cls, text):
+        # pylint: disable=missing-function-docstring
+        lines = []
+        for line in cls.script_code(text).splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+
+        return "\n".join(lines)
+
+    @classmethod
+    def script_code(cls, text):
+        # pylint: disable=missing-function-docstring
+        # strings and regular expressions are passed over whole, so a // or
+        # /* inside one isn't taken for a comment. a slash starts a regular
+        # expression wherever a value is expected, and divides anywhere else
+        pieces = []
+        before = ""
+        position = 0
+        while position < len(text):
+            token = cls.SCRIPT_TOKEN.match(text, position).group()
+            if token == "/" and cls.SCRIPT_REGEX_AFTER.search(before):
+                literal = cls.SCRIPT_REGEX.match(text, position)
+                token = literal.group() if literal else token
+            position += len(token)
+
+            # a comment across lines still ends one, for the missing
+            # semicolons' sake
+            if token.startswith("//"):
+                continue
+            if token.startswith("/*"):
+                token = "\n" if "\n" in token else " "
+
+            pieces.append(token)
+            before = token.rstrip() or before
+
+        return "".join(pieces)
+
+    @classmethod
+    def style(cls, text):
+        # pylint: disable=missing-function-docstring
+        text = cls.CSS_COMMENT.sub("", text)
+        text = cls.CSS_SPACE.sub(" ", text)
+        text = cls.CSS_PUNCTUATION.sub(r"\1", text)
+        text = cls.CSS_COLON.sub(":", text)
+
+        return text.replace(";}", "}").strip()
+
+class MinifyingSink:
+    # pylint: disable=missing-class-docstring
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write(self, text):
+        # pylint: disable=missing-function-docstring
+        text = Minifier.markup(text)
+        if text:
+            self.sink.writeline(text)
+
+    def writeline(self, text):
+        # pylint: disable=missing-function-docstring
+        self.write(text)
+
+    def flush(self):
+        # pylint: disable=missing-function-docstring
+        self.sink.flush()
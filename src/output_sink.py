@@ -0,0 +1,36 @@
+# pylint: disable=missing-module-docstring
+
+class OutputSink:
+    # pylint: disable=missing-class-docstring
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        # pylint: disable=missing-function-docstring
+        self.parts.append(text)
+        self.size += len(text)
+
+        # a chunk size of None holds everything for a single write on flush
+        if self.chunk_size is not None and self.size >= self.chunk_size:
+            self._write_parts()
+
+    def writeline(self, text=""):
+        # pylint: disable=missing-function-docstring
+        self.write(text)
+        self.write("\n")
+
+    def flush(self):
+        # pylint: disable=missing-function-docstring
+        self._write_parts()
+        self.stream.flush()
+
+    def _write_parts(self):
+        if len(self.parts) > 0:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
@@ -0,0 +1,380 @@
+# pylint: disable=missing-module-docstring
+
+import argparse
+import collections
+import hashlib
+import html
+import http.server
+import io
+import mimetypes
+import os
+import sys
+import threading
+import urllib.parse
+
+from src.libretto import IncrementalLibrettoLoader
+from src.lib2html import ConversionResult
+from src.lib2html import Libretto2Html
+from src.lib2html import OutputOptions
+from src.lib2html import PageAssets
+from src.lib2html import duplicate_outputs
+from src.lib2html import expand_sources
+from src.lib2html import output_path
+from src.lib2html import unique_sources
+from src.output_sink import OutputSink
+from src.watch import SourceWatcher
+
+BIN = None
+
+class RenderedPage:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    def __init__(self, body, error=None):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.error = error
+
+class RenderCache:
+    # pylint: disable=missing-class-docstring
+    # pages are keyed by their source and its stat signature, so an edit
+    # simply misses, and the stale page ages out with the rest
+    def __init__(self, size):
+        self.size = size
+        self.pages = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        # pylint: disable=missing-function-docstring
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+            return page
+
+    def put(self, key, page):
+        # pylint: disable=missing-function-docstring
+        with self.lock:
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.size:
+                self.pages.popitem(last=False)
+
+class PreviewServer(http.server.ThreadingHTTPServer):
+    # pylint: disable=missing-class-docstring, too-many-instance-attributes
+    daemon_threads = True
+
+    def __init__(self, address, sources, pattern="*.txt", options=None,
+        cache_size=16):
+        # pylint: disable=too-many-arguments
+        super().__init__(address, PreviewHandler)
+        self.source_patterns = sources
+        self.pattern = pattern
+
+        # pages share the script, styles and images, so they're only sent
+        # once and then cached by the browser. they're linked from the root,
+        # since pages with the same name are served from below it
+        options = options if options is not None else OutputOptions()
+        self.options = options.to_data()
+        self.options["external_assets"] = True
+        self.options["asset_path"] = "/"
+        self.assets = PageAssets(options.minify)
+
+        self.cache = RenderCache(cache_size)
+        self.loaders = {}
+        self.render_lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.versions = {}
+        self.pages = {}
+        self.quiet = False
+        self.scan()
+
+    def scan(self):
+        # pylint: disable=missing-function-docstring
+        sources = unique_sources(expand_sources(self.source_patterns,
+            self.pattern))
+
+        # sources with the same name are told apart by their paths, from
+        # where those first differ
+        pages = {}
+        duplicates = duplicate_outputs(sources, "")
+        for source in sources:
+            name = output_path(source, "")
+            if name in duplicates:
+                root = os.path.commonpath([os.path.abspath(named)
+                    for named in duplicates[name]])
+                name = os.path.splitext(os.path.relpath(
+                    os.path.abspath(source), root))[0] + ".html"
+                name = name.replace(os.sep, "/")
+            pages[name] = source
+
+        self.pages = pages
+        return sources
+
+    def find_page(self, name):
+        # pylint: disable=missing-function-docstring
+        # sources can turn up after the server starts
+        if name not in self.pages:
+            self.scan()
+
+        return self.pages.get(name)
+
+    def render(self, name, source):
+        # pylint: disable=missing-function-docstring
+        # the page carries the version it was rendered from, so a change
+        # before its event stream opens still reloads it. the version is
+        # read first, so a change during the render errs toward a reload
+        version = self.version(source)
+        key = (source, SourceWatcher.signature(source), version)
+        page = self.cache.get(key)
+        if page is not None:
+            return page
+
+        reload_url = (f"/events/{urllib.parse.quote(name)}?" +
+            urllib.parse.urlencode({"v": version}))
+
+        # each source keeps its parse, so only the tracks around an edit
+        # are parsed again
+        with self.render_lock:
+            loader = self.loaders.setdefault(source,
+                IncrementalLibrettoLoader())
+            with open(source) as opened_file:
+                libretto = loader.load_opened(opened_file)
+
+            if loader.error:
+                result = ConversionResult(source, None)
+                result.error_line_number = loader.error_line_number
+                result.error_message = loader.error_message
+                result.error_line = loader.error_line
+                page = RenderedPage(self.error_page(source,
+                    result.describe_error(), reload_url),
+                    result.describe_error())
+            else:
+                stream = io.StringIO()
+                options = OutputOptions(**dict(self.options,
+                    live_reload=reload_url))
+                Libretto2Html(source, OutputSink(stream), options).print(
+                    libretto)
+                page = RenderedPage(stream.getvalue().encode("utf-8"))
+
+        self.cache.put(key, page)
+        return page
+
+    @classmethod
+    def error_page(cls, source, error, reload_url):
+        # pylint: disable=missing-function-docstring
+        # the error page reloads too, so fixing the source brings the
+        # libretto back
+        return f"""<html><head><title>{html.escape(source)}</title></head>
+<body><pre>{html.escape(source)}: {html.escape(error)}</pre>
+<script>
+new EventSource("{reload_url}").addEventListener("reload", function(event) {{
+    window.location.reload();
+}});
+</script>
+</body></html>
+""".encode("utf-8")
+
+    def index_page(self):
+        # pylint: disable=missing-function-docstring
+        self.scan()
+        links = "\n".join(f'<li><a href="{urllib.parse.quote(name)}">'
+            f"{html.escape(name)}</a> ({html.escape(source)})</li>"
+            for name, source in sorted(self.pages.items()))
+        return f"""<html><head><title>Libretti</title></head>
+<body><ul>
+{links}
+</ul></body></html>
+""".encode("utf-8")
+
+    def notify(self, source):
+        # pylint: disable=missing-function-docstring
+        with self.changed:
+            self.versions[source] = self.versions.get(source, 0) + 1
+            self.changed.notify_all()
+
+    def version(self, source):
+        # pylint: disable=missing-function-docstring
+        with self.changed:
+            return self.versions.get(source, 0)
+
+    def wait_for_change(self, source, version, timeout):
+        # pylint: disable=missing-function-docstring
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: self.versions.get(source, 0) != version, timeout)
+
+    def start_watching(self, debounce=0.02):
+        # pylint: disable=missing-function-docstring
+        watcher = SourceWatcher(self.scan, debounce=debounce)
+        thread = threading.Thread(target=watcher.run, args=(self.notify,),
+            daemon=True)
+        thread.start()
+        return thread
+
+class PreviewHandler(http.server.BaseHTTPRequestHandler):
+    # pylint: disable=missing-class-docstring
+    KEEP_ALIVE_SECONDS = 15
+
+    def log_message(self, format, *args):
+        # pylint: disable=redefined-builtin
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        # pylint: disable=missing-function-docstring, invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        name = urllib.parse.unquote(url.path.lstrip("/"))
+
+        if name == "":
+            self.send_body(self.server.index_page(), "text/html")
+        elif name in self.server.assets.files:
+            self.send_asset(name)
+        elif name.startswith("events/"):
+            query = urllib.parse.parse_qs(url.query)
+            self.send_events(name[len("events/"):], query.get("v", [None])[0])
+        else:
+            source = self.server.find_page(name)
+            if source is None:
+                self.send_error(404)
+            else:
+                self.send_page(name, source)
+
+    def send_body(self, body, content_type, status=200, headers=None):
+        # pylint: disable=missing-function-docstring
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self, etag):
+        # pylint: disable=missing-function-docstring
+        if self.headers.get("If-None-Match") != etag:
+            return False
+
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def send_asset(self, name):
+        # pylint: disable=missing-function-docstring
+        # asset names carry a hash of their content, so they never change
+        etag = f'"{name}"'
+        if self.not_modified(etag):
+            return
+
+        content_type = mimetypes.guess_type(name)[0] or \
+            "application/octet-stream"
+        self.send_body(self.server.assets.files[name], content_type,
+            headers={"ETag": etag,
+                "Cache-Control": "public, max-age=31536000, immutable"})
+
+    def send_page(self, name, source):
+        # pylint: disable=missing-function-docstring
+        try:
+            page = self.server.render(name, source)
+        except (OSError, UnicodeDecodeError) as error:
+            self.send_error(500, explain=str(error))
+            return
+
+        # pages are checked with the server every time, which costs nothing
+        # more than a stat while the source is unchanged
+        if self.not_modified(page.etag):
+            return
+
+        self.send_body(page.body, "text/html; charset=utf-8",
+            headers={"ETag": page.etag, "Cache-Control": "no-cache"})
+
+    def send_events(self, name, rendered=None):
+        # pylint: disable=missing-function-docstring
+        source = self.server.find_page(name)
+        if source is None:
+            self.send_error(404)
+            return
+
+        # without the page's version, only changes from now on are reported
+        try:
+            version = int(rendered)
+        except (TypeError, ValueError):
+            version = self.server.version(source)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # comments keep the connection from looking idle, and a reload
+        # ends it, since the page that asked for it goes away
+        try:
+            while True:
+                if self.server.wait_for_change(source, version,
+                    self.KEEP_ALIVE_SECONDS):
+                    self.wfile.write(b"event: reload\ndata: \n\n")
+                    self.wfile.flush()
+                    return
+
+                self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def parse_args(argv):
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(prog=BIN,
+        description="Serve libretti as autoscrolling html, rendered on "
+            "demand, and reload open pages when their sources change.")
+    parser.add_argument("sources", nargs="*", default=[os.curdir],
+        help="libretto source files, directories or glob patterns "
+            "(default: the current directory)")
+    parser.add_argument("--host", default="127.0.0.1",
+        help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("-p", "--port", type=int, default=8000,
+        help="port to listen on (default: 8000)")
+    parser.add_argument("--pattern", default="*.txt",
+        help="glob used to find sources in directories (default: *.txt)")
+    parser.add_argument("--cache-size", type=int, default=16,
+        help="number of rendered pages to keep in memory (default: 16)")
+    parser.add_argument("--virtual", action="store_true",
+        help="only build the page for tracks near the playback position, "
+            "for very long libretti")
+    parser.add_argument("--minify", action="store_true",
+        help="leave indentation, blank lines and comments out of the html, "
+            "styles and script")
+    parser.add_argument("--sync", metavar="URL",
+        help="follow the position shared in a room of a sync hub, as with "
+            "the converter")
+
+    args = parser.parse_args(argv)
+
+    if args.cache_size < 1:
+        parser.error("--cache-size must be at least 1")
+
+    return args
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    args = parse_args(argv)
+    options = OutputOptions(virtual=args.virtual, minify=args.minify,
+        sync=args.sync)
+
+    server = PreviewServer((args.host, args.port), args.sources, args.pattern,
+        options, args.cache_size)
+    server.start_watching()
+
+    host, port = server.server_address[:2]
+    print(f"Serving {len(server.pages)} libretti at http://{host}:{port}/, "
+        "press Ctrl-C to stop", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+if __name__ == '__main__':
+    BIN = os.path.basename(sys.argv[0])
+    sys.exit(main(sys.argv[1:]))
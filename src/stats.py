@@ -0,0 +1,174 @@
+# pylint: disable=missing-module-docstring
+
+import contextlib
+import json
+import sys
+import time
+
+from src.libretto import LineType
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class ConversionStats:
+    # pylint: disable=missing-class-docstring
+    # stages nest (the loader runs inside the render loop, and writes
+    # happen everywhere), so time is only counted against the innermost
+    # stage, and the stages add up to the wall time
+    def __init__(self):
+        self.stages = {}
+        self.stack = []
+        self.tracks = 0
+        self.lines = 0
+        self.line_types = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # pylint: disable=missing-function-docstring
+        now = time.perf_counter()
+        if self.stack:
+            self.add_time(self.stack[-1][0], now - self.stack[-1][1])
+
+        self.stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.add_time(name, now - self.stack.pop()[1])
+            if self.stack:
+                self.stack[-1][1] = now
+
+    def add_time(self, name, seconds):
+        # pylint: disable=missing-function-docstring
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def timed_tracks(self, tracks):
+        # pylint: disable=missing-function-docstring
+        # tracks are parsed as they're asked for, so each one is timed as it
+        # comes out of the loader
+        iterator = iter(tracks)
+        while True:
+            with self.stage("parse"):
+                track = next(iterator, None)
+                if track is None:
+                    return
+                self.count_track(track)
+
+            yield track
+
+    def count_track(self, track):
+        # pylint: disable=missing-function-docstring
+        self.tracks += 1
+        self.count_lines(track)
+
+    def count_lines(self, track):
+        # pylint: disable=missing-function-docstring
+        for line in track.lines:
+            self.lines += 1
+            name = LineType.to_str(line.type)
+            self.line_types[name] = self.line_types.get(name, 0) + 1
+
+        for subtrack in track.subtracks:
+            self.count_lines(subtrack)
+
+    @classmethod
+    def peak_rss(cls):
+        # pylint: disable=missing-function-docstring
+        # this is the peak for the whole process, which includes any earlier
+        # conversions it ran
+        if resource is None:
+            return None
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def to_data(self):
+        # pylint: disable=missing-function-docstring
+        seconds = sum(self.stages.values())
+        return {
+            "seconds": seconds,
+            "stages": dict(self.stages),
+            "tracks": self.tracks,
+            "lines": self.lines,
+            "lines_per_second": self.lines / seconds if seconds > 0 else None,
+            "line_types": dict(self.line_types),
+            "peak_rss_bytes": self.peak_rss(),
+        }
+
+def timed(stats, name):
+    # pylint: disable=missing-function-docstring
+    if stats is None:
+        return contextlib.nullcontext()
+
+    return stats.stage(name)
+
+class TimingSink:
+    # pylint: disable=missing-class-docstring
+    def __init__(self, sink, stats):
+        self.sink = sink
+        self.stats = stats
+
+    def write(self, text):
+        # pylint: disable=missing-function-docstring
+        with self.stats.stage("write"):
+            self.sink.write(text)
+
+    def writeline(self, text):
+        # pylint: disable=missing-function-docstring
+        with self.stats.stage("write"):
+            self.sink.writeline(text)
+
+    def flush(self):
+        # pylint: disable=missing-function-docstring
+        with self.stats.stage("write"):
+            self.sink.flush()
+
+class ConversionHooks:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    # passing hooks to a conversion turns on its stats, and the result is
+    # handed back here with them as json ready data in result.stats (or
+    # None when the output was already up to date)
+    def conversion_finished(self, result):
+        # pylint: disable=missing-function-docstring
+        pass
+
+class StatsReporter(ConversionHooks):
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    def __init__(self, output_format="text", stream=None):
+        self.output_format = output_format
+        self.stream = stream if stream is not None else sys.stderr
+
+    def conversion_finished(self, result):
+        # pylint: disable=missing-function-docstring
+        if result.stats is None:
+            return
+
+        if self.output_format == "json":
+            data = {"source": result.source, "output": result.output}
+            data.update(result.stats)
+            print(json.dumps(data), file=self.stream)
+        else:
+            self.print_text(result.source, result.stats)
+
+    def print_text(self, source, stats):
+        # pylint: disable=missing-function-docstring
+        seconds = stats["seconds"]
+        rate = stats["lines_per_second"] or 0
+        print(f"{source}: {stats['tracks']} tracks, {stats['lines']} lines "
+            f"in {seconds:.4f}s ({rate:,.0f} lines/s)", file=self.stream)
+
+        for name, stage_seconds in sorted(stats["stages"].items(),
+            key=lambda item: item[1], reverse=True):
+            share = 100 * stage_seconds / seconds if seconds > 0 else 0
+            print(f"  {name:<10}{stage_seconds:9.4f}s {share:5.1f}%",
+                file=self.stream)
+
+        print("  lines:    " + ", ".join(f"{name} {count}"
+            for name, count in sorted(stats["line_types"].items())),
+            file=self.stream)
+
+        if stats["peak_rss_bytes"] is not None:
+            print(f"  peak rss: {stats['peak_rss_bytes'] / 1024 / 1024:.1f} "
+                "MiB", file=self.stream)
@@ -0,0 +1,242 @@
+# pylint: disable=missing-module-docstring
+
+import argparse
+import asyncio
+import contextlib
+import http
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+BIN = None
+
+class SyncRoom:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    # followers only ever need the latest state, so rather than queueing
+    # every message, each one waits for the version to move on, and a slow
+    # follower just skips the states it missed
+    def __init__(self):
+        self.state = None
+        self.version = 0
+        self.changed = asyncio.Event()
+        self.followers = 0
+
+    def publish(self, state):
+        # pylint: disable=missing-function-docstring
+        self.state = state
+        self.version += 1
+
+        changed = self.changed
+        self.changed = asyncio.Event()
+        changed.set()
+
+class SyncHub:
+    # pylint: disable=missing-class-docstring
+    KEEP_ALIVE_SECONDS = 15
+    MAX_BODY = 4096
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.rooms = {}
+
+    def now(self):
+        # pylint: disable=missing-function-docstring
+        # in milliseconds, like the pages' own clocks
+        return self.clock() * 1000
+
+    def room(self, name):
+        # pylint: disable=missing-function-docstring
+        return self.rooms.setdefault(name, SyncRoom())
+
+    @classmethod
+    def is_number(cls, value):
+        # pylint: disable=missing-function-docstring
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def publish(self, name, data):
+        # pylint: disable=missing-function-docstring
+        state = json.loads(data)
+        if not isinstance(state, dict):
+            raise ValueError("expected a state object")
+
+        # the conductor stamps the state with the hub's clock, which covers
+        # its own trip here, and followers add the time since then
+        ticks = state.get("ticks")
+        playing = state.get("playing")
+        stamp = state.get("at", self.now())
+        if not self.is_number(ticks) or not self.is_number(stamp):
+            raise ValueError("expected numeric ticks and at")
+        if not isinstance(playing, bool):
+            raise ValueError("expected playing to be true or false")
+
+        state = {"ticks": float(ticks), "playing": playing, "at": float(stamp)}
+        self.room(name).publish(state)
+        return state
+
+    async def serve(self, host, port):
+        # pylint: disable=missing-function-docstring
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        # pylint: disable=missing-function-docstring
+        try:
+            request = await self.read_request(reader)
+            if request is not None:
+                await self.respond(reader, writer, *request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @classmethod
+    async def read_request(cls, reader):
+        # pylint: disable=missing-function-docstring
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            return None
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            header, _, value = line.partition(":")
+            headers[header.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+
+        body = None
+        if 0 <= length <= cls.MAX_BODY:
+            body = await reader.readexactly(length)
+
+        method, target, _ = request_line
+        path = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+        return method, path.strip("/"), body
+
+    async def respond(self, reader, writer, method, path, body):
+        # pylint: disable=missing-function-docstring, too-many-arguments
+        room, _, action = path.rpartition("/")
+
+        if method == "OPTIONS":
+            await self.send(writer, http.HTTPStatus.NO_CONTENT)
+        elif method == "GET" and action == "time":
+            await self.send(writer, http.HTTPStatus.OK,
+                json.dumps({"now": self.now()}).encode("utf-8"),
+                "application/json")
+        elif method == "GET" and action == "events":
+            await self.stream(reader, writer, room)
+        elif method == "POST" and body is None:
+            await self.send(writer, http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        elif method == "POST":
+            try:
+                self.publish(path, body)
+            except ValueError as error:
+                await self.send(writer, http.HTTPStatus.BAD_REQUEST,
+                    str(error).encode("utf-8"), "text/plain")
+                return
+            await self.send(writer, http.HTTPStatus.NO_CONTENT)
+        else:
+            await self.send(writer, http.HTTPStatus.NOT_FOUND)
+
+    @classmethod
+    def headers(cls, status, headers):
+        # pylint: disable=missing-function-docstring
+        # pages are usually opened from files or another server, so any
+        # origin may listen and conduct
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers: Content-Type",
+            "Connection: close"]
+        lines.extend(f"{header}: {value}" for header, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def send(self, writer, status, body=b"", content_type=None):
+        # pylint: disable=missing-function-docstring
+        headers = {"Content-Length": len(body)}
+        if content_type is not None:
+            headers["Content-Type"] = content_type
+            headers["Cache-Control"] = "no-store"
+
+        writer.write(self.headers(status, headers) + body)
+        await writer.drain()
+
+    async def stream(self, reader, writer, name):
+        # pylint: disable=missing-function-docstring
+        room = self.room(name)
+        writer.write(self.headers(http.HTTPStatus.OK, {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-store"}))
+
+        # a follower sends nothing more, so the read only finishes when it
+        # goes away
+        gone = asyncio.ensure_future(reader.read(1))
+
+        # a new follower gets the current state straight away, then each
+        # change, with comments in between so idle connections stay open
+        room.followers += 1
+        version = None
+        try:
+            while not gone.done():
+                if room.state is not None and version != room.version:
+                    version = room.version
+                    writer.write(b"event: state\ndata: " +
+                        json.dumps(room.state).encode("utf-8") + b"\n\n")
+                    await writer.drain()
+                    continue
+
+                changed = asyncio.ensure_future(room.changed.wait())
+                done, _ = await asyncio.wait((changed, gone),
+                    timeout=self.KEEP_ALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+                if not done:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+        finally:
+            gone.cancel()
+            room.followers -= 1
+
+def parse_args(argv):
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(prog=BIN,
+        description="Share one playback position between many open "
+            "libretti. Pages converted with --sync <hub url>/<room> follow "
+            "the page in the room opened with #conduct.")
+    parser.add_argument("--host", default="0.0.0.0",
+        help="address to listen on (default: every address, so other "
+            "devices can connect)")
+    parser.add_argument("-p", "--port", type=int, default=8001,
+        help="port to listen on (default: 8001)")
+
+    return parser.parse_args(argv)
+
+async def run(args):
+    # pylint: disable=missing-function-docstring
+    hub = SyncHub()
+    server = await hub.serve(args.host, args.port)
+    port = server.sockets[0].getsockname()[1]
+    print(f"Sync hub listening on {args.host}:{port}, press Ctrl-C to stop",
+        flush=True)
+
+    async with server:
+        await server.serve_forever()
+
+def main(argv):
+    # pylint: disable=missing-function-docstring
+    args = parse_args(argv)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run(args))
+
+    return 0
+
+if __name__ == '__main__':
+    BIN = os.path.basename(sys.argv[0])
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+# pylint: disable=missing-module-docstring
+
+import os
+import time
+
+class SourceWatcher:
+    # pylint: disable=missing-class-docstring, too-many-instance-attributes
+    # sources are polled by their stat signature, which needs nothing beyond
+    # the standard library, and costs a stat call per source per poll
+    def __init__(self, list_sources, interval=0.02, debounce=0.02,
+        rescan=1.0, clock=time.monotonic, sleep=time.sleep):
+        # pylint: disable=too-many-arguments
+        self.list_sources = list_sources
+        self.interval = interval
+        self.debounce = debounce
+        self.rescan = rescan
+        self.clock = clock
+        self.sleep = sleep
+        self.sources = []
+        self.scanned = None
+        self.signatures = {}
+        self.pending = {}
+
+    @classmethod
+    def signature(cls, source):
+        # pylint: disable=missing-function-docstring
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        # pylint: disable=missing-function-docstring
+        # whatever is there to begin with counts as already built
+        self.scan(self.clock())
+        for source in self.sources:
+            self.signatures[source] = self.signature(source)
+
+    def scan(self, now):
+        # pylint: disable=missing-function-docstring
+        # patterns and directories can gain sources, which are built as soon
+        # as they're seen
+        self.sources = self.list_sources()
+        self.scanned = now
+
+    def poll(self):
+        # pylint: disable=missing-function-docstring
+        now = self.clock()
+        if now - self.scanned >= self.rescan:
+            self.scan(now)
+
+        for source in self.sources:
+            signature = self.signature(source)
+            if signature != self.signatures.get(source):
+                self.signatures[source] = signature
+                self.pending[source] = now
+
+        # an editor can save a file in several writes, so a source is only
+        # ready once it has stopped changing for the debounce time
+        ready = []
+        for source, changed in list(self.pending.items()):
+            if now - changed >= self.debounce:
+                del self.pending[source]
+                if self.signatures.get(source) is not None:
+                    ready.append(source)
+
+        return ready
+
+    def next_delay(self):
+        # pylint: disable=missing-function-docstring
+        # wake up as soon as a pending change has settled, rather than on
+        # the next regular poll
+        delay = self.interval
+        if self.pending:
+            settled = min(self.pending.values()) + self.debounce
+            delay = min(delay, max(0, settled - self.clock()))
+
+        return delay
+
+    def run(self, rebuild):
+        # pylint: disable=missing-function-docstring
+        self.start()
+        while True:
+            for source in self.poll():
+                rebuild(source)
+            self.sleep(self.next_delay())
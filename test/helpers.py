@@ -0,0 +1,28 @@
+# pylint: disable=missing-module-docstring
+
+def flatten(libretto):
+    # pylint: disable=missing-function-docstring
+    # everything a parse produces, in order, so two parses can be compared
+    result = []
+
+    def walk(track):
+        parent = None if track.parent is None else track.parent.track_number
+        result.append(("track", track.track_number, track.length, parent))
+        for line in track.lines:
+            result.append((line.type, line.text, line.subtext, line.cue))
+        for subtrack in track.subtracks:
+            walk(subtrack)
+
+    for track in libretto.tracks:
+        walk(track)
+
+    return result
+
+class FakeClock:
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    # stands in for time.monotonic, and only moves when a test sets now
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -6,6 +6,22 @@ import test.test_line_type
 import test.test_search_conditional
 import test.test_line
 import test.test_track
+import test.test_line_classifier
+import test.test_libretto_loader
+import test.test_output_sink
+import test.test_batch
+import test.test_build_cache
+import test.test_libretto_cache
+import test.test_track_lines
+import test.test_page_assets
+import test.test_minify
+import test.test_chunk_files
+import test.test_stats
+import test.test_watch
+import test.test_incremental_loader
+import test.test_serve
+import test.test_sync
+import test.test_player_script
 
 # initialize the test suite
 loader = unittest.TestLoader()
@@ -16,6 +32,22 @@ suite.addTests(loader.loadTestsFromModule(test.test_line_type))
 suite.addTests(loader.loadTestsFromModule(test.test_search_conditional))
 suite.addTests(loader.loadTestsFromModule(test.test_line))
 suite.addTests(loader.loadTestsFromModule(test.test_track))
+suite.addTests(loader.loadTestsFromModule(test.test_line_classifier))
+suite.addTests(loader.loadTestsFromModule(test.test_libretto_loader))
+suite.addTests(loader.loadTestsFromModule(test.test_output_sink))
+suite.addTests(loader.loadTestsFromModule(test.test_batch))
+suite.addTests(loader.loadTestsFromModule(test.test_build_cache))
+suite.addTests(loader.loadTestsFromModule(test.test_libretto_cache))
+suite.addTests(loader.loadTestsFromModule(test.test_track_lines))
+suite.addTests(loader.loadTestsFromModule(test.test_page_assets))
+suite.addTests(loader.loadTestsFromModule(test.test_minify))
+suite.addTests(loader.loadTestsFromModule(test.test_chunk_files))
+suite.addTests(loader.loadTestsFromModule(test.test_stats))
+suite.addTests(loader.loadTestsFromModule(test.test_watch))
+suite.addTests(loader.loadTestsFromModule(test.test_incremental_loader))
+suite.addTests(loader.loadTestsFromModule(test.test_serve))
+suite.addTests(loader.loadTestsFromModule(test.test_sync))
+suite.addTests(loader.loadTestsFromModule(test.test_player_script))
 
 # initialize a runner, pass it your suite and run it
 runner = unittest.TextTestRunner(verbosity=3)
@@ -0,0 +1,90 @@
+# pylint: disable=missing-module-docstring
+
+import os
+import tempfile
+import unittest
+from src.lib2html import convert_batch
+from src.lib2html import expand_sources
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n"
+BAD = "not a track\n"
+
+class TestBatch(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.temp_dir.name, "src")
+        self.output_dir = os.path.join(self.temp_dir.name, "out")
+        os.makedirs(self.source_dir)
+
+        for name, text in [("good.txt", GOOD), ("bad.txt", BAD),
+            ("other.txt", GOOD), ("ignored.md", GOOD)]:
+            with open(os.path.join(self.source_dir, name), "w") as opened_file:
+                opened_file.write(text)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_expand_sources(self):
+        # pylint: disable=missing-function-docstring
+        sources = expand_sources([self.source_dir], "*.txt")
+        names = [os.path.basename(source) for source in sources]
+
+        assert names == ["bad.txt", "good.txt", "other.txt"], "unexpected sources"
+
+        sources = expand_sources([os.path.join(self.source_dir, "*.md")], "*.txt")
+
+        assert len(sources) == 1, "glob patterns should be expanded"
+
+    def check_results(self, results):
+        # pylint: disable=missing-function-docstring
+        by_name = {os.path.basename(result.source): result for result in results}
+
+        assert len(results) == 4, "every source should have a result"
+        assert not by_name["good.txt"].error, "unexpected error"
+        assert by_name["bad.txt"].error, "expected a parse error"
+        assert by_name["bad.txt"].error_line_number == 1, "unexpected error line"
+        assert by_name["missing.txt"].error, "expected a missing file error"
+        assert os.path.exists(os.path.join(self.output_dir, "other.html")), \
+            "batch should continue past errors"
+
+    def test_convert_batch_in_process(self):
+        # pylint: disable=missing-function-docstring
+        sources = expand_sources([self.source_dir], "*.txt")
+        sources.append(os.path.join(self.source_dir, "missing.txt"))
+
+        self.check_results(convert_batch(sources, self.output_dir, jobs=1))
+
+    def test_convert_batch_process_pool(self):
+        # pylint: disable=missing-function-docstring
+        sources = expand_sources([self.source_dir], "*.txt")
+        sources.append(os.path.join(self.source_dir, "missing.txt"))
+
+        self.check_results(convert_batch(sources, self.output_dir, jobs=2))
+
+    def test_duplicate_names_are_refused(self):
+        # pylint: disable=missing-function-docstring
+        other_dir = os.path.join(self.temp_dir.name, "other")
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, "good.txt"), "w") as opened_file:
+            opened_file.write(GOOD)
+
+        sources = expand_sources([self.source_dir, other_dir], "*.txt")
+        with self.assertRaises(ValueError) as raised:
+            convert_batch(sources, self.output_dir, jobs=2)
+
+        assert "good.html" in str(raised.exception), "expected the clash"
+        assert not os.path.exists(self.output_dir), "nothing should be written"
+
+    def test_repeated_sources_are_converted_once(self):
+        # pylint: disable=missing-function-docstring
+        sources = [os.path.join(self.source_dir, "good.txt")] + \
+            expand_sources([self.source_dir], "good.*")
+        results = convert_batch(sources, self.output_dir, jobs=1)
+
+        assert len(results) == 1, "expected a single conversion"
+
+if __name__ == '__main__':
+    unittest.main()
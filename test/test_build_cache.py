@@ -0,0 +1,135 @@
+# pylint: disable=missing-module-docstring
+
+import inspect
+import os
+import tempfile
+import unittest
+from src.build_cache import BuildCache
+from src.lib2html import OutputOptions
+from src.lib2html import convert
+from src.lib2html import generator_files
+from src.lib2html import make_build_cache
+from src.minify import Minifier
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n"
+
+class TestBuildCache(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.output = os.path.join(self.temp_dir.name, "work.html")
+        self.write_source(GOOD)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_source(self, text):
+        # pylint: disable=missing-function-docstring
+        with open(self.source, "w") as opened_file:
+            opened_file.write(text)
+
+    def test_unchanged_source_is_cached(self):
+        # pylint: disable=missing-function-docstring
+        cache = make_build_cache()
+
+        assert not convert(self.source, self.output, cache).cached, \
+            "first build should not be cached"
+        assert convert(self.source, self.output, cache).cached, \
+            "second build should be cached"
+
+    def test_changed_source_is_rebuilt(self):
+        # pylint: disable=missing-function-docstring
+        cache = make_build_cache()
+        convert(self.source, self.output, cache)
+        self.write_source(GOOD + "Another lyric\n")
+
+        assert not convert(self.source, self.output, cache).cached, \
+            "changed source should be rebuilt"
+
+    def test_missing_output_is_rebuilt(self):
+        # pylint: disable=missing-function-docstring
+        cache = make_build_cache()
+        convert(self.source, self.output, cache)
+        os.remove(self.output)
+
+        assert not convert(self.source, self.output, cache).cached, \
+            "missing output should be rebuilt"
+
+    def test_missing_parts_are_rebuilt(self):
+        # pylint: disable=missing-function-docstring
+        self.write_source("[1,1:00]\nACT ONE\nSteve:\nA lyric\n\n"
+            "[2,0:30]\nACT TWO\nKobun:\nA reply\n")
+        options = OutputOptions(chunked=True, compress=True)
+        cache = make_build_cache()
+        convert(self.source, self.output, cache, None, options)
+
+        for name in ("work.part2.html", "work.part1.html.gz", "work.html.gz"):
+            path = os.path.join(self.temp_dir.name, name)
+            os.remove(path)
+
+            assert not convert(self.source, self.output, cache, None,
+                options).cached, f"a missing {name} should be rebuilt"
+            assert os.path.exists(path), f"expected {name} to be rewritten"
+            assert convert(self.source, self.output, cache, None,
+                options).cached, "a complete build should be cached"
+
+    def test_generator_change_is_rebuilt(self):
+        # pylint: disable=missing-function-docstring
+        convert(self.source, self.output, make_build_cache())
+        cache = make_build_cache()
+        cache.fingerprint = "different generator"
+
+        assert not convert(self.source, self.output, cache).cached, \
+            "new generator should rebuild"
+
+    def test_generator_covers_the_minifier(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        files = [os.path.realpath(file) for file in generator_files()]
+
+        assert os.path.realpath(inspect.getfile(Minifier)) in files, \
+            "minified output depends on the minifier"
+
+    def test_changed_options_are_rebuilt(self):
+        # pylint: disable=missing-function-docstring
+        cache = make_build_cache()
+        convert(self.source, self.output, cache)
+
+        assert not convert(self.source, self.output, cache, None,
+            OutputOptions(virtual=True)).cached, "new options should rebuild"
+        assert convert(self.source, self.output, cache, None,
+            OutputOptions(virtual=True)).cached, "same options should be cached"
+
+    def test_force(self):
+        # pylint: disable=missing-function-docstring
+        convert(self.source, self.output, make_build_cache())
+
+        assert not convert(self.source, self.output, make_build_cache(True)).cached, \
+            "force should rebuild"
+
+    def test_errors_are_not_cached(self):
+        # pylint: disable=missing-function-docstring
+        cache = make_build_cache()
+        self.write_source("not a track\n")
+        convert(self.source, self.output, cache)
+        result = convert(self.source, self.output, cache)
+
+        assert not result.cached, "failed builds should be rebuilt"
+        assert result.error, "error should be reported again"
+        assert not os.path.exists(cache.record_path(self.output)), \
+            "failed builds should have no record"
+
+    def test_counters(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        cache = BuildCache([])
+        cache.count(True)
+        cache.count(False)
+        cache.count(False)
+
+        assert cache.hits == 1, "unexpected hits"
+        assert cache.misses == 2, "unexpected misses"
+
+if __name__ == '__main__':
+    unittest.main()
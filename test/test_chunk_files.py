@@ -0,0 +1,128 @@
+# pylint: disable=missing-module-docstring
+
+import json
+import os
+import tempfile
+import unittest
+from src.lib2html import OutputOptions
+from src.lib2html import convert
+
+SCENES = """[1,1:00]
+ACT ONE
+Steve:
+A lyric
+
+[2,0:30]
+Steve:
+Another lyric
+
+[3,0:45]
+ACT TWO
+Kobun:
+A reply
+"""
+
+class TestChunkFiles(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.output = os.path.join(self.temp_dir.name, "work.html")
+
+        with open(self.source, "w") as opened_file:
+            opened_file.write(SCENES)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_file(self, name):
+        # pylint: disable=missing-function-docstring
+        with open(os.path.join(self.temp_dir.name, name)) as opened_file:
+            return opened_file.read()
+
+    def read_track_data(self):
+        # pylint: disable=missing-function-docstring
+        html = self.read_file("work.html")
+        start = html.index('<script type="application/json" id="track-data">')
+        start = html.index("\n", start) + 1
+        return html, json.loads(html[start:html.index("</script>", start)])
+
+    def test_chunks_split_at_scenes(self):
+        # pylint: disable=missing-function-docstring
+        result = convert(self.source, self.output, None, None,
+            OutputOptions(chunked=True))
+        html, data = self.read_track_data()
+
+        assert not result.error, "unexpected error"
+        assert data["chunks"] == {"files": ["work.part1.html",
+            "work.part2.html"], "starts": [0, 2]}, "unexpected chunks"
+        assert data["virtual"], "chunked tracks are virtual"
+        assert data["trackList"]["starts"] == [0, 60, 90, 135], \
+            "timing should stay global"
+        assert "<div id='3' class='track virtual' style='--lines: 4'></div>" \
+            in html, "expected an empty placeholder"
+        assert "A reply" not in html, "lyrics should be left to the chunks"
+
+        first = self.read_file("work.part1.html")
+        second = self.read_file("work.part2.html")
+        assert "<template data-track='1'>" in first and \
+            "<template data-track='2'>" in first, "expected the first act"
+        assert "<template data-track='3'>" in second and \
+            "A reply" in second, "expected the second act"
+
+    def test_stale_chunks_are_removed(self):
+        # pylint: disable=missing-function-docstring
+        convert(self.source, self.output, None, None,
+            OutputOptions(chunked=True, compress=True))
+        second = os.path.join(self.temp_dir.name, "work.part2.html")
+
+        assert os.path.exists(second + ".gz"), "expected compressed chunks"
+
+        # one scene now, so the second chunk isn't written again
+        with open(self.source, "w") as opened_file:
+            opened_file.write(SCENES.replace("ACT TWO\n", ""))
+        convert(self.source, self.output, None, None,
+            OutputOptions(chunked=True, compress=True))
+
+        assert not os.path.exists(second), "stale chunk should be removed"
+        assert not os.path.exists(second + ".gz"), \
+            "stale compressed chunk should be removed"
+
+        convert(self.source, self.output)
+        _, data = self.read_track_data()
+
+        assert data["chunks"] is None, "unexpected chunks"
+        assert not os.path.exists(
+            os.path.join(self.temp_dir.name, "work.part1.html")), \
+            "chunks should be removed once unused"
+        assert not os.path.exists(self.output + ".parts"), \
+            "the chunk list should go with the chunks"
+
+    def test_sibling_pages_survive(self):
+        # pylint: disable=missing-function-docstring
+        # a page of its own, which only looks like one of work's chunks
+        sibling_source = os.path.join(self.temp_dir.name, "work.part2.txt")
+        sibling = os.path.join(self.temp_dir.name, "work.part2.html")
+        with open(sibling_source, "w") as opened_file:
+            opened_file.write(SCENES)
+
+        convert(sibling_source, sibling)
+        convert(self.source, self.output)
+
+        assert os.path.exists(sibling), "a plain build should leave it alone"
+
+        with open(self.source, "w") as opened_file:
+            opened_file.write(SCENES.replace("ACT TWO\n", ""))
+        convert(self.source, self.output, None, None,
+            OutputOptions(chunked=True))
+        convert(self.source, self.output)
+
+        assert os.path.exists(sibling), "only recorded chunks are removed"
+        assert not os.path.exists(
+            os.path.join(self.temp_dir.name, "work.part1.html")), \
+            "the recorded chunk should be removed"
+
+if __name__ == '__main__':
+    unittest.main()
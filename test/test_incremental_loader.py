@@ -0,0 +1,110 @@
+# pylint: disable=missing-module-docstring
+
+import io
+import unittest
+from src.libretto import IncrementalLibrettoLoader
+from src.libretto import Libretto
+from src.libretto import LibrettoLoader
+from test.helpers import flatten
+
+SAMPLE = """[1,2:03]
+PROLOGUE
+The stage
+
+Steve:
+A lyric
+[00:40]
+More lyric
+
+[2,1:00]
+Kobun:
+A reply
+
+[3,0:30]
+Woz: [with above]
+Another lyric
+
+[4,1:15]
+Laurene:
+The last lyric
+""".split("\n")
+
+def full_parse(lines):
+    # pylint: disable=missing-function-docstring
+    loader = LibrettoLoader()
+    text = "".join(line + "\n" for line in lines)
+    tracks = list(loader.iter_tracks(io.StringIO(text)))
+    return loader, Libretto(tracks)
+
+class TestIncrementalLoader(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        self.loader = IncrementalLibrettoLoader()
+        self.loader.update_lines(SAMPLE)
+
+    def check(self, lines):
+        # pylint: disable=missing-function-docstring
+        libretto = self.loader.update_lines(lines)
+        expected_loader, expected = full_parse(lines)
+
+        assert flatten(libretto) == flatten(expected), \
+            "expected the same tracks as a full parse"
+        assert self.loader.error == expected_loader.error, \
+            "expected the same error state as a full parse"
+        if expected_loader.error:
+            assert self.loader.error_line_number == \
+                expected_loader.error_line_number, "unexpected error line"
+
+    def test_timing_edit_parses_one_track(self):
+        # pylint: disable=missing-function-docstring
+        lines = list(SAMPLE)
+        lines[lines.index("[3,0:30]")] = "[3,0:45]"
+        old_tracks = self.loader.tracks
+
+        self.check(lines)
+
+        assert self.loader.parsed_lines <= 5, "expected a single track parsed"
+        assert self.loader.tracks[3] is old_tracks[3], \
+            "later tracks should be reused"
+        assert self.loader.tracks[0] is old_tracks[0], \
+            "earlier tracks should be kept"
+
+    def test_inserted_lines_shift_checkpoints(self):
+        # pylint: disable=missing-function-docstring
+        lines = list(SAMPLE)
+        lines[10:10] = ["[5,0:10]", "Steve:", "A new track", ""]
+        self.check(lines)
+
+        lines = list(lines)
+        lines[lines.index("[4,1:15]")] = "[4,1:20]"
+        self.check(lines)
+
+        assert self.loader.parsed_lines <= 4, "expected a single track parsed"
+
+    def test_edit_changing_the_mode(self):
+        # pylint: disable=missing-function-docstring
+        # a scene block without its closing blank swallows the next header
+        lines = list(SAMPLE)
+        lines[lines.index("A reply") + 1] = "SCENE TWO"
+        self.check(lines)
+
+        lines = list(SAMPLE)
+        del lines[lines.index("[2,1:00]")]
+        self.check(lines)
+
+    def test_errors_are_found_and_cleared(self):
+        # pylint: disable=missing-function-docstring
+        lines = list(SAMPLE)
+        lines[lines.index("Kobun:")] = "[broken emote"
+        self.check(lines)
+
+        assert self.loader.error, "expected an error"
+
+        self.check(SAMPLE)
+
+        assert not self.loader.error, "the error should be cleared"
+        assert len(self.loader.tracks) == 4, "expected every track again"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# pylint: disable=missing-module-docstring
+
+import io
+import os
+import tempfile
+import unittest
+from src.libretto import CachedLibrettoLoader
+from src.libretto import LibrettoLoader
+from src.libretto import LibrettoSerializer
+from test.helpers import flatten
+
+SAMPLE = """[1,2:03]
+PROLOGUE
+A garage
+
+Steve: [with above]
+{0:10.5} First lyric
+[01:30.25]
+[aside]
+[2,1:00]
+Woz:
+Second lyric
+"""
+
+class TestLibrettoCache(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        os.makedirs(self.cache_dir)
+        self.write_source(SAMPLE)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_source(self, text):
+        # pylint: disable=missing-function-docstring
+        with open(self.source, "w") as opened_file:
+            opened_file.write(text)
+
+    def test_round_trip(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        libretto = LibrettoLoader().load(self.source)
+        stream = io.StringIO()
+        LibrettoSerializer.save(libretto, stream, {"extra": 1})
+        stream.seek(0)
+
+        header = LibrettoSerializer.read_header(stream)
+        loaded = LibrettoSerializer.read_libretto(stream)
+
+        assert header["extra"] == 1, "header should be preserved"
+        assert flatten(loaded) == flatten(libretto), "round trip mismatch"
+
+    def test_version_mismatch(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = io.StringIO('{"format":"libretto","version":0}\n[]')
+
+        with self.assertRaises(ValueError):
+            LibrettoSerializer.load(stream)
+
+    def test_cached_load(self):
+        # pylint: disable=missing-function-docstring
+        expected = flatten(LibrettoLoader().load(self.source))
+
+        first = CachedLibrettoLoader(self.cache_dir)
+        libretto = first.load(self.source)
+
+        assert not first.cached, "first load should parse"
+        assert flatten(libretto) == expected, "parsed libretto mismatch"
+
+        second = CachedLibrettoLoader(self.cache_dir)
+        libretto = second.load(self.source)
+
+        assert second.cached, "second load should use the cache"
+        assert flatten(libretto) == expected, "cached libretto mismatch"
+
+    def test_touched_source_matches_hash(self):
+        # pylint: disable=missing-function-docstring
+        CachedLibrettoLoader(self.cache_dir).load(self.source)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        loader = CachedLibrettoLoader(self.cache_dir)
+        loader.load(self.source)
+
+        assert loader.cached, "unchanged content should still be cached"
+
+    def test_changed_source(self):
+        # pylint: disable=missing-function-docstring
+        CachedLibrettoLoader(self.cache_dir).load(self.source)
+        self.write_source(SAMPLE + "Third lyric\n")
+
+        loader = CachedLibrettoLoader(self.cache_dir)
+        libretto = loader.load(self.source)
+
+        assert not loader.cached, "changed source should be parsed"
+        assert libretto.tracks[1].lines[-1].text == "Third lyric", \
+            "expected the new line"
+
+    def test_errors_are_not_cached(self):
+        # pylint: disable=missing-function-docstring
+        self.write_source("not a track\n")
+        loader = CachedLibrettoLoader(self.cache_dir)
+        loader.load(self.source)
+
+        assert loader.error, "expected an error"
+        assert not os.path.exists(loader.cache_path(self.source)), \
+            "failed parses should not be cached"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# pylint: disable=missing-module-docstring
+
+import io
+import unittest
+from src.libretto import LibrettoLoader
+from src.libretto import LineType
+
+SAMPLE = """[1,2:03]
+Steve:
+First lyric
+[00:30]
+Second lyric
+
+[2,1:00]
+Third lyric
+[3,0:45]
+Fourth lyric
+"""
+
+class TestLibrettoLoader(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def test_iter_tracks(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        loader = LibrettoLoader()
+        tracks = list(loader.iter_tracks(io.StringIO(SAMPLE)))
+
+        assert [track.track_number for track in tracks] == [1, 2, 3], \
+            "unexpected tracks"
+        assert len(tracks[0].subtracks) == 1, "subtrack should stay with its parent"
+        assert tracks[0].subtracks[0].lines[1].type == LineType.LYRIC, \
+            "unexpected subtrack line"
+        assert not loader.error, "unexpected error"
+
+    def test_cues_and_fractional_seconds(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = ("[1,2:03.5]\nSteve:\n{0:10.25} First lyric\n[1:00.5]\n"
+            "{1:02}[aside]\n{bad} lyric\n")
+
+        for use_classifier in [True, False]:
+            loader = LibrettoLoader(use_classifier)
+            track = list(loader.iter_tracks(io.StringIO(text)))[0]
+            subtrack = track.subtracks[0]
+
+            assert not loader.error, "unexpected error"
+            assert track.length.total_seconds() == 123.5, "unexpected length"
+            assert subtrack.length.total_seconds() == 60.5, "unexpected start"
+            assert track.lines[2].text == "First lyric", "cue should be removed"
+            assert track.lines[2].cue == 10.25, "unexpected cue"
+            assert track.lines[1].cue is None, "only cued lines have cues"
+            assert subtrack.lines[1].type == LineType.EMOTE, \
+                "cued lines should be classified without the cue"
+            assert subtrack.lines[1].cue == 62, "unexpected subtrack cue"
+            assert subtrack.lines[2].text == "{bad} lyric", \
+                "malformed cues should be left as text"
+
+    def test_iter_tracks_is_lazy(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        consumed = []
+
+        def source():
+            for line in io.StringIO(SAMPLE):
+                consumed.append(line)
+                yield line
+
+        loader = LibrettoLoader()
+        tracks = loader.iter_tracks(source())
+        first = next(tracks)
+
+        assert first.track_number == 1, "unexpected first track"
+        assert len(consumed) == 7, "track should be yielded when the next header closes it"
+
+    def test_iter_tracks_stops_on_error(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        loader = LibrettoLoader()
+        tracks = list(loader.iter_tracks(io.StringIO("garbage\n" + SAMPLE)))
+
+        assert len(tracks) == 0, "no tracks before the error"
+        assert loader.error, "expected an error"
+        assert loader.error_line_number == 1, "unexpected error line"
+
+if __name__ == '__main__':
+    unittest.main()
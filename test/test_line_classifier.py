@@ -0,0 +1,93 @@
+# pylint: disable=missing-module-docstring
+
+import os
+import tempfile
+import unittest
+from src.libretto import LibrettoLoader
+from src.libretto import LineClassifier
+from src.libretto import ParseMode
+from test.helpers import flatten
+
+SAMPLE = """
+[1,2:03]
+PROLOGUE: A garage
+Los Altos, 1965
+
+Somewhere a long stretch of staging text that wraps around the page.
+
+Steve:
+Some lyric
+[does something]
+STEVE: IN LYRIC MODE
+[01:30] Mid lyric subtrack
+
+Woz: [with above]
+Another lyric
+[2,4:05]Lyric on the track line
+Steve: [aside]
+[00:10]
+[trailing emote]
+"""
+
+def load(text, use_classifier):
+    # pylint: disable=missing-function-docstring
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(handle, "w") as opened_file:
+        opened_file.write(text)
+
+    try:
+        loader = LibrettoLoader(use_classifier=use_classifier)
+        libretto = loader.load(filename)
+    finally:
+        os.remove(filename)
+
+    return loader, libretto
+
+class TestLineClassifier(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def test_classify_intrack(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        def kind(line):
+            return LineClassifier.classify(ParseMode.INTRACK, line).lastgroup
+
+        assert kind("PROLOGUE: A garage") == "scene", "expected scene"
+        assert kind("") == "blank", "expected blank"
+        assert kind("[1,2:03] rest") == "track", "expected track"
+        assert kind("[01:30]") == "subtrack", "expected subtrack"
+        assert kind("Steve:") == "character", "expected character"
+        assert kind("Steve: [aside]") == "character_emote", "expected character emote"
+        assert kind("[aside]") == "emote", "expected emote"
+        assert kind("[aside") == "malformed_emote", "expected malformed emote"
+        assert kind("x" * 41) == "staging", "expected staging"
+        assert kind("x" * 40) == "lyric", "expected lyric"
+
+    def test_classify_inlyric(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        def kind(line):
+            return LineClassifier.classify(ParseMode.INLYRIC, line).lastgroup
+
+        assert kind("") == "end_block", "expected end of block"
+        assert kind("STEVE:") == "lyric", "scenes are lyrics in lyric mode"
+        assert kind("[aside]") == "emote", "expected emote"
+
+    def test_matches_search_cascade(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        _, searched = load(SAMPLE, False)
+        _, classified = load(SAMPLE, True)
+
+        assert len(searched.tracks) == 2, "unexpected track count"
+        assert flatten(searched) == flatten(classified), "line streams differ"
+
+    def test_malformed_emote_error(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = "[1,2:03]\n\nSteve:\n\n[unclosed\n"
+        searcher, _ = load(text, False)
+        classifier, _ = load(text, True)
+
+        assert classifier.error, "expected an error"
+        assert classifier.error_message == searcher.error_message, "message mismatch"
+        assert classifier.error_line_number == 5, "unexpected error line"
+
+if __name__ == '__main__':
+    unittest.main()
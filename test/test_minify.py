@@ -0,0 +1,89 @@
+# pylint: disable=missing-module-docstring
+
+import gzip
+import os
+import tempfile
+import unittest
+from src.minify import Minifier
+from src.lib2html import OutputOptions
+from src.lib2html import convert
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n"
+
+class TestMinify(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def test_markup(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = "\n    <div>\n\n        <p>text</p>\n<!--\n-->\n    </div>\n"
+
+        assert Minifier.markup(text) == "<div>\n<p>text</p>\n</div>", \
+            "unexpected markup"
+
+    def test_script(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = "function a() {\n    //console.log(1);\n    var b = 1\n\n}\n"
+
+        assert Minifier.script(text) == "function a() {\nvar b = 1\n}", \
+            "comment lines should go, but line breaks should stay"
+
+    def test_script_trailing_comments(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = "var a = b / 2; // half\nvar c = 1 /* one\n two */\n" + \
+            "var d = \"http://e\"; /* f */ var g = /\\/+$/; // h\n"
+
+        assert Minifier.script(text) == "var a = b / 2;\nvar c = 1\n" + \
+            "var d = \"http://e\";   var g = /\\/+$/;", \
+            "comments should go, but not from strings or regular expressions"
+
+    def test_style(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        text = """
+            /* comment */
+            .a > div, .b {
+                margin: 0 auto;
+                height: calc(var(--lines) * 1em);
+            }
+            .c:not(.d) {
+                color: gray;
+            }
+        """
+
+        assert Minifier.style(text) == ".a>div,.b{margin:0 auto;" + \
+            "height:calc(var(--lines) * 1em)}.c:not(.d){color:gray}", \
+            "unexpected style"
+
+class TestCompressedOutput(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.output = os.path.join(self.temp_dir.name, "work.html")
+
+        with open(self.source, "w") as opened_file:
+            opened_file.write(GOOD)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_compressed_siblings(self):
+        # pylint: disable=missing-function-docstring
+        convert(self.source, self.output, None, None,
+            OutputOptions(minify=True, compress=True))
+
+        with open(self.output, "rb") as opened_file:
+            html = opened_file.read()
+        with gzip.open(self.output + ".gz") as opened_file:
+            assert opened_file.read() == html, "gzip copy should match"
+
+        assert b"//console.log" not in html, "comments should be removed"
+
+        convert(self.source, self.output)
+
+        assert not os.path.exists(self.output + ".gz"), \
+            "stale compressed copies should be removed"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# pylint: disable=missing-module-docstring
+
+import io
+import json
+import unittest
+from src.libretto import Line
+from src.libretto import LineType
+from src.libretto import Track
+from src.lib2html import Libretto2Html
+from src.lib2html import OutputOptions
+from src.output_sink import OutputSink
+
+class CountingStream(io.StringIO):
+    # pylint: disable=missing-class-docstring
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+class TestOutputSink(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def test_single_write(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        sink = OutputSink(stream, chunk_size=None)
+
+        for i in range(100):
+            sink.writeline(str(i))
+
+        assert stream.writes == 0, "nothing should be written before flush"
+
+        sink.flush()
+
+        assert stream.writes == 1, "expected a single write"
+        assert stream.getvalue() == "".join(f"{i}\n" for i in range(100)), \
+            "unexpected output"
+
+    def test_chunked_writes(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        sink = OutputSink(stream, chunk_size=10)
+
+        for _ in range(10):
+            sink.write("abcde")
+
+        assert stream.writes == 5, "expected a write per full chunk"
+
+        sink.flush()
+
+        assert stream.writes == 5, "nothing left to write"
+        assert stream.getvalue() == "abcde" * 10, "unexpected output"
+
+    def test_html_renders_into_sink(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        printer = Libretto2Html("test", OutputSink(stream, chunk_size=None))
+        printer.print_tracks([])
+
+        html = stream.getvalue()
+
+        assert stream.writes == 1, "expected a single write"
+        assert html.startswith("<html><head>"), "unexpected start"
+        assert "</body></html>" in html, "unexpected end"
+
+    def test_virtual_tracks_render_into_templates(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        printer = Libretto2Html("test", OutputSink(stream),
+            OutputOptions(virtual=True))
+        track = Track("1")
+        track.add_line(Line(LineType.LYRIC, "A lyric"))
+        track.add_line(Line(LineType.LYRIC, "Another"))
+        printer.print_tracks([track])
+
+        html = stream.getvalue()
+
+        assert "<div id='1' class='track virtual' style='--lines: 2'>" + \
+            "<template>" in html, "expected a placeholder track"
+        assert "</template></div>" in html, "expected the template to close"
+        assert '"virtual":true' in html, "expected the player to be told"
+
+    def test_timing_data(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        printer = Libretto2Html("test", OutputSink(stream))
+
+        first = Track("1", minutes=2, seconds=3)
+        first.add_subtrack(Track("1.0", seconds=0))
+        first.add_subtrack(Track("1.1", seconds=40))
+        printer.print_tracks([first, Track("2", seconds=30)])
+
+        html = stream.getvalue()
+        start = html.index('<script type="application/json" id="track-data">')
+        start = html.index("\n", start) + 1
+        data = json.loads(html[start:html.index("</script>", start)])
+
+        assert data["tracks"] == 2, "unexpected track count"
+        assert data["trackList"] == {"ids": ["1", "2"],
+            "starts": [0, 123, 153]}, "unexpected track timing"
+        assert data["allDivs"] == {"ids": ["1", "1.0", "1.1", "2"],
+            "starts": [0, 0, 40, 123, 153]}, "unexpected div timing"
+
+    def test_cue_table(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        printer = Libretto2Html("test", OutputSink(stream))
+
+        first = Track("1", seconds=60.5)
+        first.add_line(Line(LineType.LYRIC, "A lyric", cue=10.25))
+        second = Track("2", seconds=30)
+        second.add_subtrack(Track("2.0", seconds=10))
+        second.subtracks[0].add_line(Line(LineType.LYRIC, "Another", cue=12))
+        printer.print_tracks([first, second])
+
+        html = stream.getvalue()
+        start = html.index('<script type="application/json" id="track-data">')
+        start = html.index("\n", start) + 1
+        data = json.loads(html[start:html.index("</script>", start)])
+
+        assert data["trackList"]["starts"] == [0, 60.5, 90.5], \
+            "fractional seconds should be kept"
+        assert data["cues"] == {"divs": [0, 2], "times": [10.25, 72.5]}, \
+            "cues should be timed from the start of the libretto"
+        assert "<span class='cue' data-cue='1'></span>" in html, \
+            "expected a cue marker"
+
+    def test_audio_element(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stream = CountingStream()
+        printer = Libretto2Html("test", OutputSink(stream),
+            OutputOptions(audio="act 1 & 2.mp3", audio_offset=2.5))
+        printer.print_tracks([Track("1", seconds=30)])
+
+        html = stream.getvalue()
+        start = html.index('<script type="application/json" id="track-data">')
+        start = html.index("\n", start) + 1
+        data = json.loads(html[start:html.index("</script>", start)])
+
+        assert '<audio id="audio" preload="auto" src="act 1 &amp; 2.mp3">' \
+            in html, "expected an escaped audio element"
+        assert data["audioOffset"] == 2.5, "expected the audio offset"
+
+        stream = CountingStream()
+        Libretto2Html("test", OutputSink(stream)).print_tracks([])
+        assert "<audio" not in stream.getvalue(), "unexpected audio element"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# pylint: disable=missing-module-docstring
+
+import os
+import tempfile
+import unittest
+from src.lib2html import OutputOptions
+from src.lib2html import PageAssets
+from src.lib2html import convert
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n"
+
+class TestPageAssets(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.output = os.path.join(self.temp_dir.name, "work.html")
+
+        with open(self.source, "w") as opened_file:
+            opened_file.write(GOOD)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_output(self):
+        # pylint: disable=missing-function-docstring
+        with open(self.output) as opened_file:
+            return opened_file.read()
+
+    def test_names_follow_content(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        assets = PageAssets()
+
+        assert assets.script.startswith("libretto.") and \
+            assets.script.endswith(".js"), "unexpected script name"
+        assert assets.style in assets.files, "style should be written"
+        assert len(assets.files) == 4, "expected script, style and images"
+        assert PageAssets().files.keys() == assets.files.keys(), \
+            "names should be stable"
+
+        for name in assets.files:
+            if name.endswith(".png"):
+                assert name.encode("utf-8") in assets.files[assets.style], \
+                    "style should refer to the hashed images"
+
+    def test_external_assets(self):
+        # pylint: disable=missing-function-docstring
+        result = convert(self.source, self.output, None, None,
+            OutputOptions(external_assets=True))
+        assets = PageAssets()
+        html = self.read_output()
+
+        assert not result.error, "unexpected error"
+        assert f'src="{assets.script}"' in html, "expected a script reference"
+        assert f'href="{assets.style}"' in html, "expected a style reference"
+        assert "function Transport" not in html, "script should not be inlined"
+        assert "trackList" in html, "track data should stay in the page"
+
+        for name in assets.files:
+            assert os.path.exists(os.path.join(self.temp_dir.name, name)), \
+                f"expected {name} to be written"
+
+    def test_inline_assets(self):
+        # pylint: disable=missing-function-docstring
+        convert(self.source, self.output)
+        html = self.read_output()
+
+        assert "function Transport" in html, "script should be inlined"
+        assert "data:image/png;base64," in html, "images should be inlined"
+        assert len(os.listdir(self.temp_dir.name)) == 2, \
+            "no assets should be written"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# pylint: disable=missing-module-docstring
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import unittest
+from src.lib2html import Libretto2Html
+from src.lib2html import convert
+
+# the same track number twice, as a copy-pasted libretto can have
+REPEATED = "[1,1:00]\nSteve:\nA lyric\n\n[2,1:00]\nKobun:\nA reply\n\n" \
+    "[1,1:00]\nWoz:\nAn encore\n"
+
+NODE = shutil.which("node")
+
+@unittest.skipUnless(NODE, "the player script is run with node")
+class TestPlayerScript(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    @classmethod
+    def run_script(cls, expression):
+        # pylint: disable=missing-function-docstring
+        # the script only declares things until the page loads, so it can
+        # be run without a browser
+        script = Libretto2Html.script_source() + \
+            f"\nconsole.log(JSON.stringify({expression}));\n"
+        output = subprocess.run([NODE, "-e", script], capture_output=True,
+            text=True, check=True, timeout=30).stdout
+        return json.loads(output)
+
+    def test_repeated_ids_find_their_first_track(self):
+        # pylint: disable=missing-function-docstring
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "work.txt")
+            with open(source, "w") as opened_file:
+                opened_file.write(REPEATED)
+
+            output = os.path.join(temp_dir, "work.html")
+            convert(source, output)
+            with open(output) as opened_file:
+                page = opened_file.read()
+
+        track_data = re.search(r'id="track-data">(.*?)</script>', page,
+            re.S).group(1)
+        assert json.loads(track_data)["trackList"]["ids"] == \
+            ["1", "2", "1"], "expected the repeated id"
+
+        index = self.run_script(f"TrackInfo.indexById(TrackInfo.fromTable("
+            f"{track_data}.trackList))")
+        assert index == {"1": 0, "2": 1}, \
+            "a repeated id should find its first track"
+
+if __name__ == '__main__':
+    unittest.main()
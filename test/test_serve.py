@@ -0,0 +1,199 @@
+# pylint: disable=missing-module-docstring
+
+import http.client
+import os
+import re
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from src.lib2html import OutputOptions
+from src.serve import PreviewServer
+from src.serve import RenderCache
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n\n[2,1:00]\nKobun:\nA reply\n"
+
+class TestServe(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.write(GOOD)
+
+        self.server = PreviewServer(("127.0.0.1", 0), [self.temp_dir.name],
+            options=OutputOptions(minify=True))
+        self.server.quiet = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+            daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def write(self, text):
+        # pylint: disable=missing-function-docstring
+        with open(self.source, "w") as opened_file:
+            opened_file.write(text)
+
+    def get(self, path, headers=None):
+        # pylint: disable=missing-function-docstring
+        connection = http.client.HTTPConnection(
+            *self.server.server_address[:2], timeout=5)
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response, body
+
+    def test_page_and_assets(self):
+        # pylint: disable=missing-function-docstring
+        response, body = self.get("/")
+        assert b'href="work.html"' in body, "expected the source in the index"
+
+        response, page = self.get("/work.html")
+        assert response.status == 200, "expected the page"
+        assert b"A reply" in page, "expected the libretto"
+        assert b'"reloadUrl":"/events/work.html?v=0"' in \
+            page.replace(b" ", b""), "expected the reload url"
+        assert response.getheader("Cache-Control") == "no-cache", \
+            "pages should be revalidated"
+
+        etag = response.getheader("ETag")
+        response, _ = self.get("/work.html", {"If-None-Match": etag})
+        assert response.status == 304, "an unchanged page shouldn't be resent"
+
+        for name in self.server.assets.files:
+            assert name.encode("utf-8") in page or name.endswith(".png"), \
+                "the page should link the shared assets"
+            response, _ = self.get("/" + name)
+            assert response.status == 200, "expected the asset"
+            assert "immutable" in response.getheader("Cache-Control"), \
+                "assets should be cached for good"
+
+    def test_edits_are_rendered(self):
+        # pylint: disable=missing-function-docstring
+        response, _ = self.get("/work.html")
+        etag = response.getheader("ETag")
+
+        self.write(GOOD + "\n[3,0:30]\nWoz:\nAn addition\n")
+        response, body = self.get("/work.html", {"If-None-Match": etag})
+
+        assert response.status == 200, "an edit should render again"
+        assert b"An addition" in body, "expected the edit"
+
+        self.write(GOOD.replace("Kobun:", "[broken emote"))
+        response, body = self.get("/work.html")
+
+        assert b"Error at line" in body, "expected the parse error"
+        assert b"EventSource" in body, "the error page should reload too"
+
+    def test_same_names_are_told_apart(self):
+        # pylint: disable=missing-function-docstring
+        for name in ("a", "b"):
+            os.makedirs(os.path.join(self.temp_dir.name, name))
+            with open(os.path.join(self.temp_dir.name, name, "ring.txt"),
+                "w") as opened_file:
+                opened_file.write(GOOD.replace("A reply", f"Reply {name}"))
+        self.server.source_patterns = [self.temp_dir.name,
+            os.path.join(self.temp_dir.name, "*", "*.txt")]
+
+        _, body = self.get("/")
+        assert b'href="a/ring.html"' in body and \
+            b'href="b/ring.html"' in body, "expected both sources"
+
+        _, body = self.get("/b/ring.html")
+        assert b"Reply b" in body, "expected the second source"
+
+        _, body = self.get("/a/ring.html")
+        for name in (self.server.assets.script, self.server.assets.style):
+            assert f'"/{name}"'.encode("utf-8") in body, \
+                "assets should be linked from the root"
+            response, _ = self.get("/" + name)
+            assert response.status == 200, "expected the asset"
+
+    def test_renamed_pages_load_their_assets(self):
+        # pylint: disable=missing-function-docstring
+        for name in ("a", "b"):
+            directory = os.path.join(self.temp_dir.name, name, "act")
+            os.makedirs(directory)
+            with open(os.path.join(directory, "ring.txt"), "w") as opened_file:
+                opened_file.write(GOOD)
+        self.server.source_patterns = [
+            os.path.join(self.temp_dir.name, "*", "act", "*.txt")]
+
+        # resolved the way a browser would, from where each file was served
+        page = "/a/act/ring.html"
+        _, body = self.get(page)
+        links = re.findall(r'(?:src|href)="([^"]+\.(?:js|css))"',
+            body.decode("utf-8"))
+        assert len(links) == 2, "expected the script and stylesheet"
+
+        for link in links:
+            url = urllib.parse.urljoin(page, link)
+            response, asset = self.get(url)
+            assert response.status == 200, f"expected {url}"
+
+            for image in re.findall(r"url\(([^)]+)\)", asset.decode("utf-8")):
+                response, _ = self.get(urllib.parse.urljoin(url, image))
+                assert response.status == 200, f"expected {image}"
+
+    def test_missing_page(self):
+        # pylint: disable=missing-function-docstring
+        response, _ = self.get("/other.html")
+        assert response.status == 404, "expected not found"
+
+        response, _ = self.get("/events/other.html")
+        assert response.status == 404, "expected not found"
+
+    def test_reload_event(self):
+        # pylint: disable=missing-function-docstring
+        connection = http.client.HTTPConnection(
+            *self.server.server_address[:2], timeout=5)
+        connection.request("GET", "/events/work.html")
+        response = connection.getresponse()
+
+        assert response.getheader("Content-Type") == "text/event-stream", \
+            "expected an event stream"
+
+        self.server.notify(self.source)
+        assert response.readline() == b"event: reload\n", "expected a reload"
+        connection.close()
+
+    def test_changes_before_listening_reload(self):
+        # pylint: disable=missing-function-docstring
+        _, page = self.get("/work.html")
+        assert b"work.html?v=0" in page, "expected the rendered version"
+
+        # the source changes before the page's event stream opens
+        self.server.notify(self.source)
+
+        connection = http.client.HTTPConnection(
+            *self.server.server_address[:2], timeout=5)
+        connection.request("GET", "/events/work.html?v=0")
+        response = connection.getresponse()
+        assert response.readline() == b"event: reload\n", \
+            "the missed change should reload straight away"
+        connection.close()
+
+        _, page = self.get("/work.html")
+        assert b"work.html?v=1" in page, \
+            "the reloaded page should carry the new version"
+
+    def test_render_cache_is_lru(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        cache = RenderCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is None, "the least recent page should go"
+        assert cache.get("a") == 1 and cache.get("c") == 3, \
+            "recent pages should stay"
+
+if __name__ == '__main__':
+    unittest.main()
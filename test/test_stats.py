@@ -0,0 +1,98 @@
+# pylint: disable=missing-module-docstring
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from src.libretto import Line
+from src.libretto import LineType
+from src.libretto import Track
+from src.lib2html import convert
+from src.stats import ConversionHooks
+from src.stats import ConversionStats
+from src.stats import StatsReporter
+
+GOOD = "[1,2:03]\nSteve:\nA lyric\n\n[2,1:00]\nKobun:\nA reply\n"
+
+class RecordingHooks(ConversionHooks):
+    # pylint: disable=missing-class-docstring, too-few-public-methods
+    def __init__(self):
+        self.results = []
+
+    def conversion_finished(self, result):
+        self.results.append(result)
+
+class TestStats(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.output = os.path.join(self.temp_dir.name, "work.html")
+
+        with open(self.source, "w") as opened_file:
+            opened_file.write(GOOD)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_nested_stages(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        stats = ConversionStats()
+        with stats.stage("outer"):
+            with stats.stage("inner"):
+                pass
+            with stats.stage("inner"):
+                pass
+
+        data = stats.to_data()
+
+        assert set(data["stages"]) == {"outer", "inner"}, "unexpected stages"
+        assert abs(sum(data["stages"].values()) - data["seconds"]) < 1e-9, \
+            "stages should add up to the total"
+
+    def test_timed_tracks(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        track = Track("1")
+        track.add_line(Line(LineType.CHARACTER, "Steve"))
+        track.add_subtrack(Track("1.1"))
+        track.subtracks[0].add_line(Line(LineType.LYRIC, "A lyric"))
+
+        stats = ConversionStats()
+        tracks = list(stats.timed_tracks([track, Track("2")]))
+
+        assert len(tracks) == 2, "tracks should be passed through"
+        assert stats.tracks == 2 and stats.lines == 2, "unexpected counts"
+        assert stats.line_types == {"CHARACTER": 1, "LYRIC": 1}, \
+            "subtrack lines should be counted"
+        assert "parse" in stats.stages, "expected parse time"
+
+    def test_hooks_receive_stats(self):
+        # pylint: disable=missing-function-docstring
+        hooks = RecordingHooks()
+        result = convert(self.source, self.output, None, None, None, hooks)
+
+        assert hooks.results == [result], "expected the result"
+        assert result.stats["tracks"] == 2, "unexpected track count"
+        assert result.stats["line_types"]["LYRIC"] == 2, \
+            "unexpected lyric count"
+        for stage in ("parse", "header", "tracks", "footer", "write"):
+            assert stage in result.stats["stages"], f"expected {stage} time"
+
+        stream = io.StringIO()
+        StatsReporter("json", stream).conversion_finished(result)
+        data = json.loads(stream.getvalue())
+
+        assert data["source"] == self.source, "expected the source"
+        assert data["lines"] == result.stats["lines"], "expected the stats"
+
+    def test_no_stats_without_hooks(self):
+        # pylint: disable=missing-function-docstring
+        result = convert(self.source, self.output)
+
+        assert result.stats is None, "stats should be opt in"
+
+if __name__ == '__main__':
+    unittest.main()
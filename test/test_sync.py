@@ -0,0 +1,137 @@
+# pylint: disable=missing-module-docstring
+
+import asyncio
+import json
+import unittest
+from src.sync import SyncHub
+from test.helpers import FakeClock
+
+class TestSync(unittest.IsolatedAsyncioTestCase):
+    # pylint: disable=missing-class-docstring
+
+    async def asyncSetUp(self):
+        # pylint: disable=invalid-name
+        self.clock = FakeClock(10.0)
+        self.hub = SyncHub(self.clock)
+        self.server = await self.hub.serve("127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        # pylint: disable=invalid-name
+        for room in self.hub.rooms.values():
+            await self.wait_for(lambda room=room: room.followers == 0)
+        await asyncio.sleep(0.01)
+
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def request(self, method, path, body=b"", length=None):
+        # pylint: disable=missing-function-docstring
+        length = len(body) if length is None else length
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: hub\r\n"
+            f"Content-Length: {length}\r\n\r\n".encode("latin-1") + body)
+        response = await reader.read()
+        writer.close()
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), body
+
+    @classmethod
+    async def wait_for(cls, condition):
+        # pylint: disable=missing-function-docstring
+        for _ in range(100):
+            if condition():
+                return True
+            await asyncio.sleep(0.01)
+
+        return False
+
+    async def follow(self, path):
+        # pylint: disable=missing-function-docstring
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: hub\r\n\r\n".encode(
+            "latin-1"))
+        head = await reader.readuntil(b"\r\n\r\n")
+
+        assert b"text/event-stream" in head, "expected an event stream"
+        return reader, writer
+
+    @classmethod
+    async def next_state(cls, reader):
+        # pylint: disable=missing-function-docstring
+        event = await asyncio.wait_for(reader.readuntil(b"\n\n"), 5)
+        name, data = event.decode("utf-8").strip().split("\n")
+
+        assert name == "event: state", "expected a state event"
+        return json.loads(data[len("data: "):])
+
+    async def test_time(self):
+        # pylint: disable=missing-function-docstring
+        status, body = await self.request("GET", "/party/time")
+
+        assert status == 200, "expected the time"
+        assert json.loads(body) == {"now": 10000.0}, "expected milliseconds"
+
+    async def test_states_reach_followers(self):
+        # pylint: disable=missing-function-docstring
+        reader, writer = await self.follow("/party/events")
+        _, other_writer = await self.follow("/other/events")
+
+        status, _ = await self.request("POST", "/party",
+            b'{"ticks": 12.5, "playing": true, "at": 9990}')
+        assert status == 204, "expected the state to be taken"
+
+        state = await self.next_state(reader)
+        assert state == {"ticks": 12.5, "playing": True, "at": 9990.0}, \
+            "unexpected state"
+
+        # without a stamp, the state was current when it arrived
+        await self.request("POST", "/party", b'{"ticks": 3, "playing": false}')
+        state = await self.next_state(reader)
+        assert state["at"] == 10000.0, "expected the hub's time"
+
+        assert self.hub.rooms["party"].followers == 1, "expected one follower"
+        assert self.hub.rooms["other"].state is None, \
+            "rooms should be separate"
+
+        writer.close()
+        other_writer.close()
+
+        assert await self.wait_for(
+            lambda: self.hub.rooms["party"].followers == 0), \
+            "followers that go away should be noticed"
+
+    async def test_late_and_slow_followers_get_the_latest(self):
+        # pylint: disable=missing-function-docstring
+        self.hub.publish("party", '{"ticks": 1, "playing": true}')
+        reader, writer = await self.follow("/party/events")
+
+        state = await self.next_state(reader)
+        assert state["ticks"] == 1, "a late follower should get the state"
+
+        # two states before the follower runs again only send the last
+        self.hub.publish("party", '{"ticks": 2, "playing": true}')
+        self.hub.publish("party", '{"ticks": 3, "playing": true}')
+        state = await self.next_state(reader)
+        assert state["ticks"] == 3, "expected the latest state"
+
+        writer.close()
+
+    async def test_bad_requests(self):
+        # pylint: disable=missing-function-docstring
+        for body in (b"[]", b"{", b'{"ticks": "1", "playing": true}',
+            b'{"ticks": 1, "playing": 1}'):
+            status, _ = await self.request("POST", "/party", body)
+            assert status == 400, f"expected {body} to be refused"
+
+        status, _ = await self.request("POST", "/party", length=5000)
+        assert status == 413, "expected a large state to be refused"
+
+        status, _ = await self.request("GET", "/party")
+        assert status == 404, "expected not found"
+
+        assert self.hub.room("party").state is None, "nothing was published"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# pylint: disable=missing-module-docstring
+
+import unittest
+from src.libretto import Libretto
+from src.libretto import Line
+from src.libretto import LineType
+from src.libretto import StringTable
+from src.libretto import Track
+from src.libretto import TrackLines
+
+class TestTrackLines(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def test_string_table(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        strings = StringTable()
+        first = strings.add("Steve")
+        second = strings.add("Woz")
+
+        assert strings.add(None) == 0, "None should be index 0"
+        assert strings.add("Steve") == first, "strings should be shared"
+        assert strings.get(second) == "Woz", "unexpected string"
+
+        strings.freeze()
+
+        assert strings.add("Woz") == second, "frozen tables should still share"
+        assert strings.get(strings.add("Laurene")) == "Laurene", \
+            "frozen tables should still grow"
+
+    def test_iteration(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        lines = [
+            Line(LineType.CHARACTER, "Steve", "with above"),
+            Line(LineType.LYRIC, "A lyric", cue=12.5),
+            Line(LineType.BLANK),
+            Line(LineType.CHARACTER, "Steve"),
+        ]
+        track_lines = TrackLines(lines=lines)
+        stored = [(line.type, line.text, line.subtext, line.cue)
+            for line in track_lines]
+
+        assert len(track_lines) == 4, "unexpected length"
+        assert stored == [(line.type, line.text, line.subtext, line.cue)
+            for line in lines], "lines should iterate unchanged"
+        assert track_lines[1].cue == 12.5, "cues should be kept"
+        assert len(track_lines.cues) == 1, "only cued lines should be stored"
+        assert track_lines[-1].text == "Steve", "unexpected indexed line"
+        assert len(track_lines.strings.strings) == 4, "strings should be shared"
+
+    def test_compact_libretto(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        track = Track(1, 2, 3)
+        track.add_line(Line(LineType.CHARACTER, "Steve"))
+        subtrack = Track("1.0", 0, 30)
+        subtrack.add_line(Line(LineType.CHARACTER, "Steve"))
+        subtrack.add_line(Line(LineType.LYRIC, "A lyric"))
+        track.add_subtrack(subtrack)
+
+        libretto = Libretto([track]).compact()
+
+        assert isinstance(track.lines, TrackLines), "lines should be compacted"
+        assert track.lines.strings is subtrack.lines.strings, \
+            "tracks should share a string table"
+        assert [line.text for line in subtrack.lines] == ["Steve", "A lyric"], \
+            "unexpected subtrack lines"
+
+        track.add_line(Line(LineType.LYRIC, "Added later"))
+
+        assert libretto.tracks[0].lines[1].text == "Added later", \
+            "compacted tracks should still accept lines"
+
+    def test_slots(self):
+        # pylint: disable=missing-function-docstring, no-self-use
+        assert not hasattr(Line(LineType.BLANK), "__dict__"), "Line should use slots"
+        assert not hasattr(Track(), "__dict__"), "Track should use slots"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# pylint: disable=missing-module-docstring
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from src.lib2html import parse_args
+from src.watch import SourceWatcher
+from test.helpers import FakeClock
+
+class TestWatch(unittest.TestCase):
+    # pylint: disable=missing-class-docstring
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "work.txt")
+        self.other = os.path.join(self.temp_dir.name, "other.txt")
+        self.sources = [self.source]
+        self.clock = FakeClock()
+
+        self.write(self.source, "[1,2:03]\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @classmethod
+    def write(cls, path, text):
+        # pylint: disable=missing-function-docstring
+        with open(path, "a") as opened_file:
+            opened_file.write(text)
+
+    def make_watcher(self):
+        # pylint: disable=missing-function-docstring
+        watcher = SourceWatcher(lambda: list(self.sources), interval=0.1,
+            debounce=0.05, rescan=1.0, clock=self.clock)
+        watcher.start()
+        return watcher
+
+    def test_unchanged_sources_are_left_alone(self):
+        # pylint: disable=missing-function-docstring
+        watcher = self.make_watcher()
+        self.clock.now = 0.5
+
+        assert watcher.poll() == [], "nothing has changed"
+
+    def test_changes_are_debounced(self):
+        # pylint: disable=missing-function-docstring
+        watcher = self.make_watcher()
+
+        self.write(self.source, "Steve:\n")
+        assert watcher.poll() == [], "a change should wait to settle"
+        assert watcher.next_delay() == 0.05, "expected to wake when settled"
+
+        self.clock.now = 0.03
+        self.write(self.source, "A lyric\n")
+        assert watcher.poll() == [], "another save should restart the wait"
+
+        self.clock.now = 0.06
+        assert watcher.poll() == [], "the last save hasn't settled"
+
+        self.clock.now = 0.08
+        assert watcher.poll() == [self.source], "expected a rebuild"
+        assert watcher.poll() == [], "expected a single rebuild"
+
+    def test_new_and_removed_sources(self):
+        # pylint: disable=missing-function-docstring
+        watcher = self.make_watcher()
+
+        self.write(self.other, "[1,2:03]\n")
+        self.sources.append(self.other)
+        self.clock.now = 0.5
+        assert watcher.poll() == [], "sources are only rescanned now and then"
+
+        self.clock.now = 1.0
+        watcher.poll()
+        self.clock.now = 1.1
+        assert watcher.poll() == [self.other], "new sources should be built"
+
+        os.remove(self.source)
+        watcher.poll()
+        self.clock.now = 1.2
+        assert watcher.poll() == [], "removed sources can't be built"
+
+    def test_parse_cache_is_refused(self):
+        # pylint: disable=missing-function-docstring
+        output = os.path.join(self.temp_dir.name, "work.html")
+        with self.assertRaises(SystemExit), \
+            contextlib.redirect_stderr(io.StringIO()):
+            parse_args([self.source, output, "--watch",
+                "--parse-cache", self.temp_dir.name])
+
+        assert parse_args([self.source, output, "--watch"]).watch, \
+            "watch on its own is fine"
+
+if __name__ == '__main__':
+    unittest.main()